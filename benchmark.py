@@ -0,0 +1,272 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Make the core package importable when run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Import time budget of the GUI entry point (main.py), in milliseconds;
+# benchmark_startup fails above it
+STARTUP_BUDGET_MS = 300
+
+# Modules the GUI must only import on first use, not at startup
+STARTUP_DEFERRED_MODULES = ("core.flasher", "core.iso_handler", "psutil", "win32api", "win32file")
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS reports bytes
+        return peak / 1024 if sys.platform != "darwin" else peak / (1024 * 1024)
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def _legacy_copy(src, dst, size):
+    """The original 8 KiB read()/write() loop from ISOFlasher._extract_file"""
+    with open(src, 'rb') as iso_file, open(dst, 'wb') as output_file:
+        remaining = size
+        while remaining > 0:
+            chunk = iso_file.read(min(8192, remaining))
+            if not chunk:
+                break
+            output_file.write(chunk)
+            remaining -= len(chunk)
+
+
+def _extract_worker(method, src, dst):
+    """Copy src to dst with one method and print 'seconds peak_rss_mb'"""
+    from core.flasher import ISOFlasher
+
+    size = os.path.getsize(src)
+    start = time.perf_counter()
+
+    if method == "legacy":
+        _legacy_copy(src, dst, size)
+    else:
+        # Call the copy methods directly: _extract_file reports errors and
+        # carries on, and _copy_range would fall back to another method
+        flasher = ISOFlasher()
+        flasher._copy_method = method
+        with open(src, 'rb') as iso_file, open(dst, 'wb') as output_file:
+            if method == "readinto":
+                flasher._copy_range(iso_file, output_file, 0, size)
+            else:
+                flasher._copy_range_kernel(iso_file, output_file, 0, size)
+
+    # Any error above ends the worker with a traceback and a failed run
+    if os.path.getsize(dst) != size:
+        raise Exception(f"Copied {os.path.getsize(dst)} of {size} bytes")
+
+    print(f"{time.perf_counter() - start} {_peak_rss_mb()}")
+
+
+def benchmark_extract(size_mb=512):
+    """Compare MB/s and peak RSS of the file extraction copy paths"""
+    from core.flasher import COPY_METHODS
+
+    work_dir = tempfile.mkdtemp()
+    src = os.path.join(work_dir, "source.bin")
+    dst = os.path.join(work_dir, "dest.bin")
+
+    failed = False
+    try:
+        # Incompressible source so no filesystem can shortcut the copy
+        with open(src, 'wb') as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        print(f"Extracting a {size_mb} MB file")
+        for method in ["legacy"] + COPY_METHODS:
+            # Each method runs in a fresh process so peak RSS is its own
+            result = subprocess.run(
+                [sys.executable, __file__, "extract-worker", method, src, dst],
+                capture_output=True,
+                text=True
+            )
+            if result.returncode != 0:
+                print(f"{method:>16}: failed ({result.stderr.strip().splitlines()[-1]})")
+                failed = True
+                continue
+
+            seconds, peak_rss = (float(v) for v in result.stdout.split())
+            print(f"{method:>16}: {size_mb / seconds:8.1f} MB/s, peak RSS {peak_rss:6.1f} MB")
+            os.unlink(dst)
+
+    finally:
+        for path in (src, dst):
+            if os.path.exists(path):
+                os.unlink(path)
+        os.rmdir(work_dir)
+
+    return not failed
+
+
+def benchmark_raw_write(size_mb=512):
+    """Compare raw write throughput for different buffer ring sizes"""
+    from core.raw_writer import RawImageWriter
+
+    work_dir = tempfile.mkdtemp()
+    src = os.path.join(work_dir, "source.iso")
+    dst = os.path.join(work_dir, "target.img")
+
+    try:
+        with open(src, 'wb') as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        print(f"Raw writing a {size_mb} MB image")
+        for buffer_count in (1, 2, 4, 8):
+            writer = RawImageWriter(buffer_count=buffer_count)
+            writer.write(src, dst)
+            stats = writer.stats()
+            print(
+                f"{buffer_count:>3} buffers: {stats['throughput'] / 1e6:8.1f} MB/s "
+                f"(read stall {stats['reader_stall_time']:.2f}s, "
+                f"write stall {stats['writer_stall_time']:.2f}s)"
+            )
+
+    finally:
+        for path in (src, dst):
+            if os.path.exists(path):
+                os.unlink(path)
+        os.rmdir(work_dir)
+
+
+def _compress(src, dst, compression):
+    """Compress src into dst with a fast preset of the given format"""
+    import bz2
+    import gzip
+    import lzma
+    import shutil
+
+    if compression == "zstd":
+        import zstandard
+        with open(src, 'rb') as f_in, open(dst, 'wb') as f_out:
+            zstandard.ZstdCompressor(level=3).copy_stream(f_in, f_out)
+        return
+
+    openers = {
+        "xz": lambda path: lzma.open(path, 'wb', preset=1),
+        "gzip": lambda path: gzip.open(path, 'wb', compresslevel=6),
+        "bz2": lambda path: bz2.open(path, 'wb', compresslevel=9),
+    }
+    with open(src, 'rb') as f_in, openers[compression](dst) as f_out:
+        shutil.copyfileobj(f_in, f_out, 4 * 1024 * 1024)
+
+
+def benchmark_decompress(size_mb=256):
+    """Compare decompression throughput with raw write throughput of compressed images"""
+    from core.compressed_image import COMPRESSION_EXTENSIONS, open_image
+    from core.raw_writer import RawImageWriter
+
+    work_dir = tempfile.mkdtemp()
+    src = os.path.join(work_dir, "source.iso")
+    dst = os.path.join(work_dir, "target.img")
+    paths = [src, dst]
+
+    try:
+        # Half random, half zeros: roughly how installer images compress
+        with open(src, 'wb') as f:
+            for _ in range(size_mb // 2):
+                f.write(os.urandom(1024 * 1024))
+                f.write(bytes(1024 * 1024))
+
+        writer = RawImageWriter(fsync_policy="none")
+        writer.write(src, dst)
+        print(f"Raw writing a {size_mb} MB image: plain {writer.throughput / 1e6:8.1f} MB/s")
+
+        buffer = memoryview(bytearray(4 * 1024 * 1024))
+        for extension, compression in COMPRESSION_EXTENSIONS.items():
+            packed = src + extension
+            try:
+                _compress(src, packed, compression)
+            except ImportError:
+                print(f"{compression:>5}: skipped (module not installed)")
+                continue
+            paths.append(packed)
+
+            start = time.perf_counter()
+            with open_image(packed) as f:
+                while f.readinto(buffer):
+                    pass
+            decompress_rate = size_mb * 1024 * 1024 / (time.perf_counter() - start)
+
+            os.unlink(dst)
+            writer.write(packed, dst)
+            ratio = os.path.getsize(packed) / os.path.getsize(src)
+            print(
+                f"{compression:>5}: decompress {decompress_rate / 1e6:8.1f} MB/s, "
+                f"raw write {writer.throughput / 1e6:8.1f} MB/s (ratio {ratio:.2f})"
+            )
+
+    finally:
+        for path in paths:
+            if os.path.exists(path):
+                os.unlink(path)
+        os.rmdir(work_dir)
+
+
+def _import_times(module):
+    """{module: cumulative import microseconds} from python -X importtime in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise Exception(result.stderr.strip().splitlines()[-1])
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def benchmark_startup(runs=5, budget_ms=STARTUP_BUDGET_MS):
+    """Import time of the GUI entry point; fails above budget_ms or on an eager import
+
+    Takes the fastest of runs fresh interpreters, so the OS file cache is
+    warm, as it is for the PyInstaller build after its first start.
+    """
+    try:
+        samples = [_import_times("main") for _ in range(runs)]
+    except Exception as e:
+        print(f"Startup: could not import main ({e})")
+        return False
+
+    times = min(samples, key=lambda sample: sample["main"])
+    total_ms = times["main"] / 1000
+    print(f"Startup: importing main takes {total_ms:.1f} ms (budget {budget_ms} ms)")
+    for name, cumulative in sorted(times.items(), key=lambda item: -item[1])[1:6]:
+        print(f"    {name:<30} {cumulative / 1000:8.1f} ms")
+
+    eager = [name for name in STARTUP_DEFERRED_MODULES if name in times]
+    if eager:
+        print(f"Startup: imported too early: {', '.join(eager)}")
+    return total_ms <= budget_ms and not eager
+
+
+BENCHMARKS = {
+    "extract": benchmark_extract,
+    "raw-write": benchmark_raw_write,
+    "decompress": benchmark_decompress,
+    "startup": benchmark_startup,
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "extract-worker":
+        _extract_worker(*sys.argv[2:5])
+    else:
+        # Benchmarks return False when one of their runs failed or went over budget
+        failed = [name for name in sys.argv[1:] or BENCHMARKS if BENCHMARKS[name]() is False]
+        sys.exit(1 if failed else 0)
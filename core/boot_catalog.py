@@ -0,0 +1,203 @@
+import struct
+
+SECTOR_SIZE = 2048
+
+# Catalog sectors fetched in one read; catalogs rarely exceed one sector
+CATALOG_READ_SECTORS = 4
+
+ENTRY_SIZE = 32
+
+HEADER_VALIDATION = 0x01
+HEADER_SECTION = 0x90
+HEADER_FINAL_SECTION = 0x91
+ENTRY_EXTENSION = 0x44
+BOOT_INDICATOR = 0x88
+
+PLATFORM_X86 = 0x00
+PLATFORM_PPC = 0x01
+PLATFORM_MAC = 0x02
+PLATFORM_EFI = 0xEF
+
+PLATFORM_NAMES = {
+    PLATFORM_X86: "x86 BIOS",
+    PLATFORM_PPC: "PowerPC",
+    PLATFORM_MAC: "Mac",
+    PLATFORM_EFI: "UEFI",
+}
+
+EMULATION_NAMES = {
+    0: "no emulation",
+    1: "1.2 MB floppy",
+    2: "1.44 MB floppy",
+    3: "2.88 MB floppy",
+    4: "hard disk",
+}
+
+# Validation entry and boot entry layouts
+VALIDATION_ENTRY = struct.Struct('<BB2x24sHBB')
+BOOT_ENTRY = struct.Struct('<BBHBxHI')
+
+
+class BootEntry:
+    """One El Torito boot image"""
+
+    def __init__(self, platform_id, data):
+        indicator, media, load_segment, system_type, sector_count, lba = BOOT_ENTRY.unpack_from(data)
+
+        self.platform_id = platform_id
+        self.bootable = indicator == BOOT_INDICATOR
+        self.emulation = media & 0x0F
+        self.load_segment = load_segment
+        self.system_type = system_type
+        self.sector_count = sector_count
+        self.lba = lba
+
+    @property
+    def platform(self):
+        return PLATFORM_NAMES.get(self.platform_id, f"platform 0x{self.platform_id:02x}")
+
+    @property
+    def emulation_type(self):
+        return EMULATION_NAMES.get(self.emulation, f"emulation {self.emulation}")
+
+    @property
+    def size(self):
+        """Size of the boot image in bytes (counted in 512-byte virtual sectors)"""
+        return self.sector_count * 512
+
+    def to_dict(self):
+        return {
+            'platform': self.platform,
+            'platform_id': self.platform_id,
+            'bootable': self.bootable,
+            'emulation': self.emulation_type,
+            'lba': self.lba,
+            'size': self.size
+        }
+
+
+class BootInfo:
+    """Decoded El Torito catalog plus isohybrid MBR/GPT detection"""
+
+    def __init__(self):
+        self.entries = []
+        self.catalog_valid = False
+        self.hybrid_mbr = False
+        self.hybrid_gpt = False
+
+    @classmethod
+    def from_file(cls, iso_file, catalog_lba=None):
+        """Decode boot information from an open ISO file"""
+        info = cls()
+
+        # isohybrid images carry a real disk label in front of the ISO
+        iso_file.seek(0)
+        head = iso_file.read(1024)
+        info.hybrid_mbr = cls._has_mbr_partitions(head)
+        info.hybrid_gpt = head[512:520] == b'EFI PART'
+
+        if catalog_lba:
+            iso_file.seek(catalog_lba * SECTOR_SIZE)
+            info._parse_catalog(iso_file.read(CATALOG_READ_SECTORS * SECTOR_SIZE))
+
+        return info
+
+    @staticmethod
+    def _has_mbr_partitions(head):
+        """True if the first sector holds an MBR with at least one partition"""
+        if len(head) < 512 or head[510:512] != b'\x55\xAA':
+            return False
+        for offset in range(446, 510, 16):
+            # Partition type byte and sector count of each entry
+            if head[offset + 4] != 0 and struct.unpack_from('<I', head, offset + 12)[0] > 0:
+                return True
+        return False
+
+    def _parse_catalog(self, data):
+        """Walk the validation entry, default entry and section entries"""
+        if len(data) < 2 * ENTRY_SIZE:
+            return
+
+        header, platform_id, _, checksum, key1, key2 = VALIDATION_ENTRY.unpack_from(data)
+        if header != HEADER_VALIDATION or (key1, key2) != (0x55, 0xAA):
+            return
+        # All 16-bit words of the validation entry sum to zero
+        if sum(struct.unpack_from('<16H', data)) & 0xFFFF:
+            return
+
+        self.catalog_valid = True
+        self.entries.append(BootEntry(platform_id, data[ENTRY_SIZE:2 * ENTRY_SIZE]))
+
+        offset = 2 * ENTRY_SIZE
+        while offset + ENTRY_SIZE <= len(data):
+            header = data[offset]
+            if header not in (HEADER_SECTION, HEADER_FINAL_SECTION):
+                break
+
+            section_platform = data[offset + 1]
+            count = struct.unpack_from('<H', data, offset + 2)[0]
+            offset += ENTRY_SIZE
+
+            added = 0
+            while added < count and offset + ENTRY_SIZE <= len(data):
+                if data[offset] == ENTRY_EXTENSION:
+                    # Extension entries continue the previous section entry
+                    offset += ENTRY_SIZE
+                    continue
+                self.entries.append(BootEntry(section_platform, data[offset:offset + ENTRY_SIZE]))
+                offset += ENTRY_SIZE
+                added += 1
+
+            if header == HEADER_FINAL_SECTION:
+                break
+
+    @property
+    def bios(self):
+        """True if there is a bootable x86 BIOS image (or a hybrid MBR)"""
+        return self.hybrid_mbr or any(e.bootable and e.platform_id == PLATFORM_X86 for e in self.entries)
+
+    @property
+    def uefi(self):
+        """True if there is a bootable EFI system partition image"""
+        return self.hybrid_gpt or any(e.bootable and e.platform_id == PLATFORM_EFI for e in self.entries)
+
+    @property
+    def bootable(self):
+        return self.bios or self.uefi
+
+    @property
+    def hybrid(self):
+        """True if the image can be written block-for-block and boot as a disk"""
+        return self.hybrid_mbr or self.hybrid_gpt
+
+    def recommended_write_mode(self):
+        """Raw writes are fastest and most faithful for isohybrid images"""
+        return "raw" if self.hybrid else "copy"
+
+    def recommended_partition_scheme(self):
+        return "GPT" if self.uefi and not self.bios else "MBR"
+
+    def recommended_target_system(self):
+        if self.uefi and not self.bios:
+            return "UEFI"
+        if self.bios and not self.uefi:
+            return "BIOS (Legacy)"
+        return "BIOS or UEFI"
+
+    def recommended_file_system(self):
+        """FAT32 for anything that boots on UEFI; None leaves a BIOS-only drive's choice alone"""
+        return None if self.recommended_target_system() == "BIOS (Legacy)" else "FAT32"
+
+    def to_dict(self):
+        return {
+            'catalog_valid': self.catalog_valid,
+            'entries': [entry.to_dict() for entry in self.entries],
+            'bios': self.bios,
+            'uefi': self.uefi,
+            'hybrid_mbr': self.hybrid_mbr,
+            'hybrid_gpt': self.hybrid_gpt,
+            'write_mode': self.recommended_write_mode(),
+            'partition_scheme': self.recommended_partition_scheme(),
+            'target_system': self.recommended_target_system(),
+            'file_system': self.recommended_file_system()
+        }
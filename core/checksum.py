@@ -0,0 +1,96 @@
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+HASH_BUFFER_SIZE = 8 * 1024 * 1024
+
+# Digest length in hex characters -> algorithm, for bare hashes
+DIGEST_LENGTHS = {32: 'md5', 40: 'sha1', 64: 'sha256', 128: 'sha512'}
+
+# Sidecar files looked up next to an ISO, in order of preference.
+# {name} is the ISO file name.
+CHECKSUM_FILES = [
+    '{name}.sha256', '{name}.sha256sum', '{name}.sha512', '{name}.sha1', '{name}.md5',
+    'SHA256SUMS', 'sha256sum.txt', 'SHA512SUMS', 'SHA1SUMS', 'MD5SUMS', 'md5sum.txt', 'CHECKSUM',
+]
+
+# "<hash>  file", "<hash> *file" (GNU) and "SHA256 (file) = <hash>" (BSD)
+GNU_LINE = re.compile(r'^\\?([0-9a-fA-F]{32,128})\s+\*?(.+)$')
+BSD_LINE = re.compile(r'^(\w+)\s*\((.+)\)\s*=\s*([0-9a-fA-F]{32,128})$')
+
+def find_checksum_file(iso_path):
+    """Return the first checksum sidecar found next to iso_path, or None"""
+    directory, name = os.path.split(os.path.abspath(iso_path))
+    for pattern in CHECKSUM_FILES:
+        candidate = os.path.join(directory, pattern.format(name=name))
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def parse_checksum_file(checksum_path, iso_name):
+    """Return (algorithm, hex digest) for iso_name from a checksum file, or None"""
+    default_algorithm = None
+    lower = os.path.basename(checksum_path).lower()
+    for algorithm in ('sha256', 'sha512', 'sha1', 'md5'):
+        if algorithm in lower:
+            default_algorithm = algorithm
+            break
+
+    with open(checksum_path, 'r', encoding='utf-8', errors='ignore') as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    for line in lines:
+        match = BSD_LINE.match(line)
+        if match and os.path.basename(match.group(2)) == iso_name:
+            return match.group(1).lower().replace('-', ''), match.group(3).lower()
+
+        match = GNU_LINE.match(line)
+        if match and os.path.basename(match.group(2).strip()) == iso_name:
+            digest = match.group(1).lower()
+            return default_algorithm or DIGEST_LENGTHS.get(len(digest)), digest
+
+    # A .sha256/.md5 sidecar may hold nothing but the bare digest
+    if len(lines) == 1 and re.fullmatch(r'[0-9a-fA-F]{32,128}', lines[0]):
+        digest = lines[0].lower()
+        return default_algorithm or DIGEST_LENGTHS.get(len(digest)), digest
+
+    return None
+
+
+def hash_file(path, algorithms=('sha256',), buffer_size=HASH_BUFFER_SIZE, progress_callback=None):
+    """Hash a file with one or more algorithms in a single streaming pass
+
+    Returns {algorithm: hex digest}. Reading and hashing overlap: the next
+    buffer is filled while a worker thread hashes the previous one
+    (hashlib releases the GIL on large updates).
+    """
+    hashers = [hashlib.new(a) for a in algorithms]
+    buffers = [memoryview(bytearray(buffer_size)) for _ in range(2)]
+    total = os.path.getsize(path)
+    done = 0
+
+    def update(data):
+        for hasher in hashers:
+            hasher.update(data)
+
+    with open(path, 'rb', buffering=0) as f, ThreadPoolExecutor(max_workers=1) as executor:
+        pending = None
+        current = 0
+        while True:
+            read = f.readinto(buffers[current])
+            if pending is not None:
+                pending.result()
+            if not read:
+                break
+
+            pending = executor.submit(update, buffers[current][:read])
+            current ^= 1
+
+            done += read
+            if progress_callback and total:
+                progress_callback((done / total) * 100, f"Hashing {os.path.basename(path)}...")
+
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in zip(algorithms, hashers)}
+
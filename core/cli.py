@@ -0,0 +1,258 @@
+"""Flash from the command line, without the GUI
+
+    python -m core flash ubuntu.iso E --volume-name UBUNTU --verify sampled
+    python -m core flash image.img.xz E F G --mode raw --json
+    python -m core flash image.img \\\\.\\PhysicalDrive2 --mode raw --skip-zeros
+    python -m core flash win.iso E --checksum SHA256SUMS
+    python -m core batch jobs.json --json
+
+Targets are drive letters, or device/image file paths in raw mode. A batch
+manifest is a JSON list of jobs such as
+{"source": "a.iso", "targets": ["E"], "mode": "copy", "verify": "full"};
+options given on the command line are the defaults for every job. With
+--json, stdout is one JSON object per line: a "start" and a "result" per
+job with "progress" events in between.
+"""
+import argparse
+import contextlib
+import json
+import re
+import sys
+import time
+
+from core.progress import format_eta
+from core.raw_writer import FSYNC_POLICIES
+from core.verifier import VERIFY_MODES
+
+# Seconds between progress reports; a new phase is always reported
+PROGRESS_INTERVAL = 0.5
+
+# Job settings a manifest entry can give, with their command line defaults
+JOB_KEYS = ('source', 'targets', 'mode', 'verify', 'checksum', 'volume_name',
+            'partition_scheme', 'target_system', 'file_system')
+
+
+class ProgressPrinter:
+    """Structured progress callback printing JSON lines or a status line"""
+
+    structured = True
+
+    def __init__(self, json_lines, output, interval=PROGRESS_INTERVAL):
+        self.json_lines = json_lines
+        self.output = output
+        self.interval = interval
+        self.job = None
+        self._phase = None
+        self._last = 0.0
+
+    def start(self, number, job):
+        self.job = number
+        self._phase = None
+        if self.json_lines:
+            self.emit('start', source=job['source'], targets=job['targets'], mode=job['mode'])
+        else:
+            print(f"Flashing {job['source']} to {', '.join(job['targets'])} ({job['mode']})", file=sys.stderr)
+
+    def __call__(self, progress, status, **details):
+        now = time.monotonic()
+        phase = details.get('phase')
+        if phase == self._phase and now - self._last < self.interval:
+            return
+        self._phase = phase
+        self._last = now
+
+        if self.json_lines:
+            self.emit('progress', progress=round(progress, 2), status=status, **details)
+        else:
+            line = f"[{progress:5.1f}%] {status}"
+            if details.get('eta') is not None:
+                line += f" ({format_eta(details['eta'])} left)"
+            print(line, file=sys.stderr, flush=True)
+
+    def finish(self, results, elapsed):
+        failed = {target: error for target, error in results.items() if error}
+        if self.json_lines:
+            self.emit('result', ok=not failed, results=results, elapsed=round(elapsed, 3))
+            return
+        for target, error in failed.items():
+            print(f"{target}: failed: {error}", file=sys.stderr)
+        print(f"Flashed {len(results) - len(failed)} of {len(results)} targets in {elapsed:.1f} s", file=sys.stderr)
+
+    def emit(self, event, **fields):
+        print(json.dumps(dict(event=event, job=self.job, **fields)), file=self.output, flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m core", description="Lahiri ISO Flasher without the GUI")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    options = argparse.ArgumentParser(add_help=False)
+    job = options.add_argument_group("job defaults")
+    job.add_argument('--mode', choices=('copy', 'raw'), default='copy',
+                     help="copy files onto a formatted drive, or write the image block-for-block")
+    job.add_argument('--verify', choices=VERIFY_MODES, help="read the result back and compare it with the image")
+    job.add_argument('--checksum', nargs='?', const=True, metavar='FILE',
+                     help="check the image against a SHA256SUMS/.sha256/.md5 file before flashing "
+                          "(default: the one next to the image)")
+    job.add_argument('--volume-name', help="volume label (default: the ISO's volume name)")
+    job.add_argument('--partition-scheme', choices=('MBR', 'GPT'), default='MBR')
+    job.add_argument('--target-system', choices=('BIOS or UEFI', 'BIOS (Legacy)', 'UEFI'), default='BIOS or UEFI')
+    job.add_argument('--file-system', choices=('FAT32', 'NTFS'), default='FAT32')
+
+    tuning = options.add_argument_group("write options")
+    tuning.add_argument('--buffer-size', type=int, metavar='MIB', help="copy and raw write buffer size in MiB")
+    tuning.add_argument('--buffer-count', type=int, help="raw write buffers in flight")
+    tuning.add_argument('--window', type=int, help="blocks the fastest of several raw targets may run ahead")
+    tuning.add_argument('--no-direct', action='store_true', help="write through the OS cache")
+    tuning.add_argument('--fsync', choices=FSYNC_POLICIES, help="when raw writes are flushed to the device")
+    tuning.add_argument('--skip-zeros', action='store_true', help="seek over zero blocks in raw writes")
+    tuning.add_argument('--target-zeroed', action='store_true', help="the raw target is known to read as zeros")
+    tuning.add_argument('--sample-percent', type=int, help="share of blocks read back by --verify sampled")
+    tuning.add_argument('--no-resume', action='store_true', help="start over instead of resuming an interrupted job")
+    tuning.add_argument('--json', action='store_true', help="print progress and results as JSON lines on stdout")
+
+    flash = commands.add_parser('flash', parents=[options], help="flash one image to one or more targets")
+    flash.add_argument('source', help="ISO or disk image, optionally .xz/.gz/.bz2/.zst compressed")
+    flash.add_argument('targets', nargs='+', help="drive letters, or device/image file paths with --mode raw")
+
+    batch = commands.add_parser('batch', parents=[options], help="run the jobs listed in a JSON manifest")
+    batch.add_argument('manifest', help="JSON file with a list of jobs")
+
+    return parser
+
+
+def load_manifest(path, defaults):
+    """Jobs of a batch manifest, with missing settings taken from defaults"""
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise Exception("A batch manifest must be a JSON list of jobs")
+
+    jobs = []
+    for number, entry in enumerate(entries):
+        entry = dict(entry)
+        if 'target' in entry:
+            entry['targets'] = [entry.pop('target')]
+        if isinstance(entry.get('targets'), str):
+            entry['targets'] = [entry['targets']]
+        unknown = set(entry) - set(JOB_KEYS)
+        if unknown:
+            raise Exception(f"Job {number}: unknown settings {', '.join(sorted(unknown))}")
+        if 'source' not in entry or not entry.get('targets'):
+            raise Exception(f"Job {number}: needs a source and at least one target")
+        jobs.append(dict(defaults, **entry))
+    return jobs
+
+
+def configure(flasher, args):
+    """Apply the write options to an ISOFlasher"""
+    if args.buffer_size:
+        flasher.copy_buffer_size = flasher.raw_buffer_size = args.buffer_size * 1024 * 1024
+    if args.buffer_count:
+        flasher.raw_buffer_count = args.buffer_count
+    if args.window:
+        flasher.raw_window = args.window
+    if args.no_direct:
+        flasher.raw_direct = False
+    if args.fsync:
+        flasher.raw_fsync_policy = args.fsync
+    if args.sample_percent:
+        flasher.verify_sample_percent = args.sample_percent
+    flasher.raw_skip_zeros = args.skip_zeros
+    flasher.raw_target_zeroed = args.target_zeroed
+    flasher.resumable = not args.no_resume
+
+
+def drive_letter(target):
+    """The drive letter of a target like "E" or "E:", None for a path"""
+    match = re.fullmatch(r'([A-Za-z]):?', target)
+    return match.group(1).upper() if match else None
+
+
+def check_source(handler, job, progress):
+    """Raise unless the job's image matches its checksum file"""
+    checksum_path = None if job['checksum'] is True else job['checksum']
+    result = handler.verify_checksum(
+        job['source'], checksum_path,
+        progress_callback=lambda percent, status: progress(percent, status, phase="checksum")
+    )
+    if result is None:
+        raise Exception("No checksum for the image found")
+    if not result['match']:
+        raise Exception(f"{result['algorithm'].upper()} mismatch: expected {result['expected']}, "
+                        f"got {result['actual']}")
+
+
+def run_job(flasher, job, progress):
+    """Flash one job; returns {target: None if it succeeded, else the error message}"""
+    from core.iso_handler import ISOHandler
+    handler = ISOHandler()
+    if job['checksum']:
+        check_source(handler, job, progress)
+
+    flasher.verify_mode = job['verify']
+    letters = [drive_letter(target) for target in job['targets']]
+
+    if not all(letters):
+        if any(letters):
+            raise Exception("A job can't mix drive letters with device or file paths")
+        if job['mode'] != 'raw':
+            raise Exception("Device and image file targets need --mode raw")
+        return flasher.flash_image(job['source'], job['targets'], progress_callback=progress)
+
+    volume_name = job['volume_name']
+    if not volume_name:
+        volume_name = handler.get_volume_name(job['source']) or "USB"
+
+    settings = dict(
+        volume_name=volume_name,
+        partition_scheme=job['partition_scheme'],
+        target_system=job['target_system'],
+        file_system=job['file_system'],
+        progress_callback=progress,
+        write_mode=job['mode']
+    )
+    if len(letters) > 1:
+        return flasher.flash_multi(job['source'], letters, **settings)
+
+    flasher.flash_iso(job['source'], letters[0], **settings)
+    return {letters[0]: None}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    defaults = {key: getattr(args, key, None) for key in JOB_KEYS}
+
+    try:
+        if args.command == 'batch':
+            jobs = load_manifest(args.manifest, defaults)
+        else:
+            jobs = [defaults]
+    except Exception as e:
+        print(f"Error reading batch manifest: {e}", file=sys.stderr)
+        return 2
+
+    # Imported here so --help and manifest errors don't load the imaging code
+    from core.flasher import ISOFlasher
+
+    # Diagnostics printed by the flasher go to stderr, keeping stdout JSON only
+    output = sys.stdout
+    progress = ProgressPrinter(args.json, output)
+    failed = False
+
+    with contextlib.redirect_stdout(sys.stderr):
+        for number, job in enumerate(jobs):
+            flasher = ISOFlasher()
+            configure(flasher, args)
+            progress.start(number, job)
+
+            start = time.monotonic()
+            try:
+                results = run_job(flasher, job, progress)
+            except Exception as e:
+                results = {target: str(e) for target in job['targets']}
+
+            progress.finish(results, time.monotonic() - start)
+            failed = failed or any(results.values())
+
+    return 1 if failed else 0
@@ -0,0 +1,121 @@
+import bz2
+import gzip
+import lzma
+import os
+
+# Compressed image suffixes (image.iso.xz, image.img.gz, ...) and their format
+COMPRESSION_EXTENSIONS = {'.xz': 'xz', '.gz': 'gzip', '.bz2': 'bz2', '.zst': 'zstd'}
+
+# Compressed bytes the zstd reader pulls from the file per call
+ZSTD_READ_SIZE = 1024 * 1024
+
+
+def compression_of(path):
+    """Compression format of an image path, or None for a plain image"""
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def is_compressed(path):
+    return compression_of(path) is not None
+
+
+def strip_compression(path):
+    """The image name without its compression suffix (image.iso.xz -> image.iso)"""
+    return os.path.splitext(path)[0] if is_compressed(path) else path
+
+
+def open_image(path):
+    """Open an image for reading, decompressing it on the fly if needed"""
+    if is_compressed(path):
+        return CompressedImage(path)
+    return open(path, 'rb', buffering=0)
+
+
+def read_prefix(path, size):
+    """Read up to size bytes from the start of a (possibly compressed) image"""
+    with open_image(path) as f:
+        return f.read(size)
+
+
+class CompressedImage:
+    """Read-only stream of the decompressed bytes of a compressed image
+
+    xz, gzip and bz2 use the standard library; zstd needs the optional
+    zstandard package. The decompressors release the GIL, so reading
+    from a worker thread overlaps decompression with device writes.
+    Seeking only works forwards cheaply: backwards seeks restart the
+    stream (and are unsupported for zstd).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.compression = compression_of(path)
+        if self.compression is None:
+            raise Exception(f"Not a compressed image: {os.path.basename(path)}")
+
+        self.compressed_size = os.path.getsize(path)
+        # Unbuffered, so tell() is exactly what the decompressor consumed
+        self._raw = open(path, 'rb', buffering=0)
+        try:
+            self._stream = self._open_stream()
+        except Exception:
+            self._raw.close()
+            raise
+
+    def _open_stream(self):
+        if self.compression == 'xz':
+            return lzma.LZMAFile(self._raw)
+        if self.compression == 'gzip':
+            return gzip.GzipFile(fileobj=self._raw, mode='rb')
+        if self.compression == 'bz2':
+            return bz2.BZ2File(self._raw)
+
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception("Zstandard images need the zstandard package (pip install zstandard)")
+        return zstandard.ZstdDecompressor().stream_reader(self._raw, read_size=ZSTD_READ_SIZE)
+
+    @property
+    def compressed_read(self):
+        """Compressed bytes consumed so far, for progress reporting"""
+        try:
+            return self._raw.tell()
+        except ValueError:
+            # Already closed
+            return self.compressed_size
+
+    def read(self, size=-1):
+        """Read size bytes, short only at the end of the image"""
+        if size is None or size < 0:
+            return self._stream.read()
+
+        parts = []
+        while size > 0:
+            data = self._stream.read(size)
+            if not data:
+                break
+            parts.append(data)
+            size -= len(data)
+        return b''.join(parts)
+
+    def readinto(self, buffer):
+        return self._stream.readinto(buffer)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._stream.seek(offset, whence)
+
+    def tell(self):
+        return self._stream.tell()
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,217 @@
+import os
+import struct
+import time
+
+SECTOR_SIZE = 512
+
+# A volume needs at least this many clusters to be FAT32 rather than FAT16
+MIN_CLUSTERS = 65525
+MAX_CLUSTERS = 0x0FFFFFF5
+
+RESERVED_SECTORS = 32
+FAT_COUNT = 2
+FSINFO_SECTOR = 1
+BACKUP_BOOT_SECTOR = 6
+ROOT_CLUSTER = 2
+
+MEDIA_DESCRIPTOR = 0xF8
+END_OF_CHAIN = 0x0FFFFFFF
+
+ATTR_READ_ONLY = 0x01
+ATTR_HIDDEN = 0x02
+ATTR_SYSTEM = 0x04
+ATTR_VOLUME_ID = 0x08
+ATTR_DIRECTORY = 0x10
+ATTR_ARCHIVE = 0x20
+
+# Zeros are written in blocks of this size
+WRITE_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Default cluster size by volume size, as Windows format picks it
+CLUSTER_SIZES = [
+    (64 * 1024 * 1024, 512),
+    (128 * 1024 * 1024, 1024),
+    (256 * 1024 * 1024, 2048),
+    (8 * 1024 * 1024 * 1024, 4096),
+    (16 * 1024 * 1024 * 1024, 8192),
+    (32 * 1024 * 1024 * 1024, 16384),
+]
+LARGE_CLUSTER_SIZE = 32768
+
+LABEL_INVALID_CHARS = '"*+,./:;<=>?[\\]|'
+
+BOOT_SECTOR = struct.Struct('<3s8sHBHBHHBHHHII' 'IHHIHH12xBxBI11s8s')
+FSINFO = struct.Struct('<I480xIII12xI')
+
+
+def default_cluster_size(volume_size):
+    """Cluster size Windows would choose for a FAT32 volume of this size"""
+    for limit, cluster_size in CLUSTER_SIZES:
+        if volume_size <= limit:
+            return cluster_size
+    return LARGE_CLUSTER_SIZE
+
+
+def volume_label(name):
+    """Turn a volume name into an 11-byte FAT label"""
+    label = ''.join('_' if c in LABEL_INVALID_CHARS else c for c in (name or '').upper())
+    label = label.encode('ascii', errors='replace')[:11]
+    return (label or b'NO NAME').ljust(11)
+
+
+class FAT32Layout:
+    """Geometry of a FAT32 volume: reserved area, two FATs, then clusters
+
+    The reserved area is grown so that the data region starts on a
+    cluster boundary, which keeps cluster writes aligned on flash media.
+    """
+
+    def __init__(self, volume_size, cluster_size=None):
+        cluster_size = cluster_size or default_cluster_size(volume_size)
+        if cluster_size < SECTOR_SIZE or cluster_size > 65536 or cluster_size & (cluster_size - 1):
+            raise Exception(f"Invalid FAT32 cluster size: {cluster_size}")
+
+        self.volume_size = volume_size
+        self.cluster_size = cluster_size
+        self.sectors_per_cluster = cluster_size // SECTOR_SIZE
+        self.total_sectors = volume_size // SECTOR_SIZE
+
+        # FAT size formula from the FAT specification, then align the data region
+        reserved = RESERVED_SECTORS
+        divisor = (256 * self.sectors_per_cluster + FAT_COUNT) // 2
+        self.fat_sectors = -(-(self.total_sectors - reserved) // divisor)
+        reserved += -(reserved + FAT_COUNT * self.fat_sectors) % self.sectors_per_cluster
+        self.reserved_sectors = reserved
+
+        self.data_start = (reserved + FAT_COUNT * self.fat_sectors) * SECTOR_SIZE
+        self.cluster_count = (self.total_sectors * SECTOR_SIZE - self.data_start) // cluster_size
+
+        if self.cluster_count < MIN_CLUSTERS:
+            raise Exception("Volume is too small for FAT32 with this cluster size")
+        if self.cluster_count > MAX_CLUSTERS or self.total_sectors > 0xFFFFFFFF:
+            raise Exception("Volume is too large for FAT32")
+
+    @property
+    def fat_size(self):
+        return self.fat_sectors * SECTOR_SIZE
+
+    def fat_offset(self, copy):
+        """Byte offset of FAT number copy (0 or 1)"""
+        return (self.reserved_sectors + copy * self.fat_sectors) * SECTOR_SIZE
+
+    def cluster_offset(self, cluster):
+        """Byte offset of a data cluster (clusters are numbered from 2)"""
+        return self.data_start + (cluster - 2) * self.cluster_size
+
+    def boot_sector(self, label, volume_id, hidden_sectors=0):
+        """Build the 512-byte boot sector with the FAT32 BPB"""
+        sector = bytearray(BOOT_SECTOR.pack(
+            b'\xEB\x58\x90', b'MSWIN4.1', SECTOR_SIZE, self.sectors_per_cluster,
+            self.reserved_sectors, FAT_COUNT, 0, 0, MEDIA_DESCRIPTOR, 0, 63, 255,
+            hidden_sectors, self.total_sectors,
+            self.fat_sectors, 0, 0, ROOT_CLUSTER, FSINFO_SECTOR, BACKUP_BOOT_SECTOR,
+            0x80, 0x29, volume_id, label, b'FAT32   '
+        )).ljust(SECTOR_SIZE, b'\x00')
+
+        # Not a system disk: "int 18h" hands control back to the BIOS.
+        # Volumes that must boot on BIOS get their boot code from diskpart.
+        sector[0x5A:0x5C] = b'\xCD\x18'
+        sector[510:512] = b'\x55\xAA'
+        return bytes(sector)
+
+    def fsinfo_sector(self, free_clusters, next_free):
+        """Build the FSInfo sector holding the free cluster hint"""
+        return FSINFO.pack(0x41615252, 0x61417272, free_clusters, next_free, 0xAA550000)
+
+    def reserved_area(self, label, volume_id, hidden_sectors, free_clusters, next_free):
+        """Reserved sectors: boot sector and FSInfo plus their backups"""
+        boot = self.boot_sector(label, volume_id, hidden_sectors)
+        fsinfo = self.fsinfo_sector(free_clusters, next_free)
+
+        area = bytearray(self.reserved_sectors * SECTOR_SIZE)
+        area[0:SECTOR_SIZE] = boot
+        area[FSINFO_SECTOR * SECTOR_SIZE:(FSINFO_SECTOR + 1) * SECTOR_SIZE] = fsinfo
+        backup = BACKUP_BOOT_SECTOR * SECTOR_SIZE
+        area[backup:backup + SECTOR_SIZE] = boot
+        area[backup + SECTOR_SIZE:backup + 2 * SECTOR_SIZE] = fsinfo
+        return area
+
+
+class FAT32Formatter:
+    """Formats a volume as FAT32 from Python, without diskpart or format.com
+
+    Writes the reserved area, both FATs and an empty root directory with
+    a few large sequential writes to any seekable file-like target: an
+    open device or volume, or an image file.
+    """
+
+    def __init__(self, label="NO NAME", cluster_size=None, volume_id=None):
+        self.label = volume_label(label)
+        self.cluster_size = cluster_size
+        self.volume_id = volume_id
+        self.layout = None
+
+    def format(self, target, size=None, offset=0, hidden_sectors=None):
+        """Format size bytes of target starting at offset
+
+        target is a file-like object or a path; size defaults to the rest
+        of the target. hidden_sectors (the partition's starting sector) is
+        recorded in the BPB and defaults to offset / 512.
+        """
+        if isinstance(target, (str, bytes, os.PathLike)):
+            with open(target, 'r+b', buffering=0) as f:
+                return self.format(f, size, offset, hidden_sectors)
+
+        if size is None:
+            size = target.seek(0, os.SEEK_END) - offset
+        if hidden_sectors is None:
+            hidden_sectors = offset // SECTOR_SIZE
+
+        layout = FAT32Layout(size, self.cluster_size)
+        volume_id = self.volume_id if self.volume_id is not None else int(time.time()) & 0xFFFFFFFF
+
+        # Root directory takes the first cluster; the rest is free
+        reserved = layout.reserved_area(self.label, volume_id, hidden_sectors,
+                                        layout.cluster_count - 1, ROOT_CLUSTER + 1)
+        fat_start = struct.pack('<III', MEDIA_DESCRIPTOR | 0x0FFFFF00, END_OF_CHAIN, END_OF_CHAIN)
+
+        root = bytearray(layout.cluster_size)
+        root[0:32] = directory_entry(self.label, ATTR_VOLUME_ID, 0, 0)
+
+        target.seek(offset)
+        target.write(reserved)
+        for _ in range(FAT_COUNT):
+            target.write(fat_start.ljust(SECTOR_SIZE, b'\x00'))
+            write_zeros(target, layout.fat_size - SECTOR_SIZE)
+        target.write(root)
+        target.flush()
+
+        self.layout = layout
+        return layout
+
+
+def write_zeros(target, count):
+    """Write count zero bytes in large blocks"""
+    block = memoryview(bytes(min(count, WRITE_BLOCK_SIZE)))
+    while count > 0:
+        written = target.write(block[:min(count, len(block))])
+        count -= written if written is not None else min(count, len(block))
+
+
+def fat_timestamp(timestamp=None):
+    """Return (date, time) in FAT directory entry encoding"""
+    t = time.localtime(timestamp)
+    year = min(max(t.tm_year, 1980), 2107)
+    date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    clock = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    return date, clock
+
+
+def directory_entry(short_name, attributes, cluster, size, timestamp=None):
+    """Build a 32-byte short-name directory entry"""
+    date, clock = fat_timestamp(timestamp)
+    return struct.pack(
+        '<11sBBBHHHHHHHI',
+        short_name, attributes, 0, 0, clock, date, date,
+        cluster >> 16, clock, date, cluster & 0xFFFF, size
+    )
@@ -0,0 +1,357 @@
+import os
+import struct
+import time
+from array import array
+
+from core.fat32 import (
+    ATTR_ARCHIVE, ATTR_DIRECTORY, ATTR_HIDDEN, ATTR_VOLUME_ID, END_OF_CHAIN, FAT_COUNT,
+    MEDIA_DESCRIPTOR, MIN_CLUSTERS, ROOT_CLUSTER, SECTOR_SIZE, WRITE_BLOCK_SIZE,
+    FAT32Layout, directory_entry, volume_label, write_zeros
+)
+from core.file_splitter import FAT32_MAX_FILE_SIZE, DEFAULT_CHUNK_SIZE, chunk_paths, slice_extents
+from core.iso_catalog import FLAG_HIDDEN
+
+DIR_ENTRY_SIZE = 32
+LFN_CHARS = 13
+ATTR_LFN = 0x0F
+
+# Characters that may appear in a short (8.3) name besides letters and digits
+SHORT_NAME_CHARS = set("!#$%&'()-@^_`{}~")
+
+# Free space left in a generated .img beyond what the files need
+IMAGE_SLACK = 0.02
+IMAGE_CLUSTER_SIZE = 4096
+
+
+def short_name_basis(name):
+    """Split a long name into the uppercase base and extension of its 8.3 alias"""
+    name = name.upper().replace(' ', '').lstrip('.')
+    base, dot, ext = name.rpartition('.')
+    if not dot:
+        base, ext = name, ''
+
+    def clean(part):
+        return ''.join(c if c.isascii() and (c.isalnum() or c in SHORT_NAME_CHARS) else '_' for c in part.replace('.', ''))
+
+    return clean(base) or '_', clean(ext)[:3]
+
+
+def lfn_checksum(short_name):
+    """Checksum of the 11-byte short name stored in each LFN entry"""
+    total = 0
+    for byte in short_name:
+        total = (((total & 1) << 7) + (total >> 1) + byte) & 0xFF
+    return total
+
+
+def lfn_entries(name, short_name):
+    """Build the long file name entries that precede a short entry"""
+    encoded = name.encode('utf-16-le')
+    count = -(-len(encoded) // (2 * LFN_CHARS))
+    padded = encoded + b'\x00\x00'
+    padded = padded.ljust(count * 2 * LFN_CHARS, b'\xFF')[:count * 2 * LFN_CHARS]
+    checksum = lfn_checksum(short_name)
+
+    entries = []
+    for number in range(count, 0, -1):
+        part = padded[(number - 1) * 2 * LFN_CHARS:number * 2 * LFN_CHARS]
+        sequence = number | (0x40 if number == count else 0)
+        entries.append(struct.pack(
+            '<B10sBBB12sH4s', sequence, part[0:10], ATTR_LFN, 0, checksum, part[10:22], 0, part[22:26]
+        ))
+    return b''.join(entries)
+
+
+class _Node:
+    """One file or directory of the volume being built"""
+
+    __slots__ = ('name', 'directory', 'hidden', 'size', 'extents', 'children', 'cluster', 'clusters', 'data')
+
+    def __init__(self, name, directory, hidden=False, size=0, extents=None):
+        self.name = name
+        self.directory = directory
+        self.hidden = hidden
+        self.size = size
+        self.extents = extents or []
+        self.children = []
+        self.cluster = 0
+        self.clusters = 0
+        self.data = None
+
+
+class FAT32ImageBuilder:
+    """Lays out a complete FAT32 volume for an ISO catalog and writes it in one pass
+
+    Every file gets a contiguous run of clusters, directories (with LFN
+    entries) are built in memory, and the volume is written front to back:
+    reserved area, both FATs, directory clusters, then file data streamed
+    from the ISO in LBA order. Files over 4 GiB are stored as numbered
+    chunks, listed in split_files as (path, offset, size) per catalog
+    index. The target can be a device, a volume or an image file.
+    """
+
+    def __init__(self, catalog, label="NO NAME", cluster_size=None, chunk_size=DEFAULT_CHUNK_SIZE, timestamp=None):
+        self.catalog = catalog
+        self.label = volume_label(label)
+        self.cluster_size = cluster_size
+        self.chunk_size = chunk_size
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.progress_callback = None
+
+        self.layout = None
+        self.root = None
+        self.directories = []
+        self.files = []
+        self.split_files = {}
+        self.bytes_written = 0
+
+    def required_size(self, cluster_size=IMAGE_CLUSTER_SIZE):
+        """Smallest volume size that holds the tree with a little free space"""
+        root, directories, files = self._build_tree()
+        clusters = sum(self._cluster_count(self._directory_size(d), cluster_size) for d in directories)
+        clusters += sum(self._cluster_count(f.size, cluster_size) for f in files)
+        clusters = max(int(clusters * (1 + IMAGE_SLACK)) + 16, MIN_CLUSTERS + 16)
+
+        fat_bytes = -(-(clusters + 2) * 4 // SECTOR_SIZE) * SECTOR_SIZE
+        size = (64 * SECTOR_SIZE + FAT_COUNT * fat_bytes + (clusters + 1) * cluster_size)
+        return -(-size // cluster_size) * cluster_size
+
+    def build(self, iso_file, target, size=None, offset=0, hidden_sectors=None, progress_callback=None):
+        """Write the volume to target (a file-like object or a path)
+
+        size defaults to the rest of the target, or for a new image file
+        to required_size(). Returns the FAT32Layout used.
+        """
+        self.progress_callback = progress_callback
+
+        cluster_size = self.cluster_size
+
+        if isinstance(target, (str, bytes, os.PathLike)):
+            mode = 'r+b' if os.path.exists(target) else 'w+b'
+            with open(target, mode, buffering=0) as f:
+                if size is None and mode == 'w+b':
+                    # New image files are sized to fit the tree
+                    cluster_size = cluster_size or IMAGE_CLUSTER_SIZE
+                    size = self.required_size(cluster_size)
+                    f.truncate(offset + size)
+                return self._build(iso_file, f, size, offset, hidden_sectors, cluster_size)
+
+        return self._build(iso_file, target, size, offset, hidden_sectors, cluster_size)
+
+    def _build(self, iso_file, target, size, offset, hidden_sectors, cluster_size):
+        if size is None:
+            size = target.seek(0, os.SEEK_END) - offset
+        if hidden_sectors is None:
+            hidden_sectors = offset // SECTOR_SIZE
+
+        self.layout = FAT32Layout(size, cluster_size)
+        self.root, self.directories, self.files = self._build_tree()
+        next_free = self._allocate()
+
+        if next_free - 2 > self.layout.cluster_count:
+            raise Exception("Files don't fit on the FAT32 volume")
+
+        self.bytes_written = 0
+        total = sum(f.size for f in self.files) or 1
+        free = self.layout.cluster_count - (next_free - 2)
+
+        target.seek(offset)
+        target.write(self.layout.reserved_area(self.label, int(self.timestamp) & 0xFFFFFFFF,
+                                               hidden_sectors, free, next_free))
+        fat = self._fat(next_free)
+        for _ in range(FAT_COUNT):
+            target.write(fat)
+            write_zeros(target, self.layout.fat_size - len(fat))
+
+        for directory in self.directories:
+            target.write(directory.data)
+
+        buffer = memoryview(bytearray(WRITE_BLOCK_SIZE))
+        for node in self.files:
+            self._write_file(iso_file, target, node, buffer)
+            self._update_progress((self.bytes_written / total) * 100, f"Writing files... {node.name}")
+
+        target.flush()
+        return self.layout
+
+    def _build_tree(self):
+        """Turn the catalog into nodes; oversized files become numbered chunks"""
+        catalog = self.catalog
+        nodes = {0: _Node('', True)}
+        directories = [nodes[0]]
+        files = []
+        self.split_files = {}
+
+        for index in range(1, len(catalog)):
+            if catalog.is_symlink(index):
+                continue
+            parent = nodes.get(catalog.parents[index])
+            if parent is None:
+                continue
+
+            name = catalog.paths[index].rsplit('/', 1)[-1]
+            hidden = bool(catalog.flags[index] & FLAG_HIDDEN)
+
+            if catalog.is_directory(index):
+                node = nodes[index] = _Node(name, True, hidden)
+                parent.children.append(node)
+                directories.append(node)
+                continue
+
+            size = catalog.sizes[index]
+            extents = catalog.file_extents(index) if size else []
+            if size <= FAT32_MAX_FILE_SIZE:
+                pieces = [(name, size, extents)]
+            else:
+                count = -(-size // self.chunk_size)
+                pieces = []
+                self.split_files[index] = []
+                for number, chunk_path in enumerate(chunk_paths(catalog.paths[index], count)):
+                    start = number * self.chunk_size
+                    length = min(self.chunk_size, size - start)
+                    pieces.append((chunk_path.rsplit('/', 1)[-1], length, slice_extents(extents, start, length)))
+                    self.split_files[index].append((chunk_path, start, length))
+
+            for piece_name, piece_size, piece_extents in pieces:
+                node = _Node(piece_name, False, hidden, piece_size, piece_extents)
+                parent.children.append(node)
+                files.append(node)
+
+        # Stream the ISO front to back
+        files.sort(key=lambda f: next((o for o, _ in f.extents if o is not None), 0))
+        return nodes[0], directories, files
+
+    def _allocate(self):
+        """Give every directory and file a contiguous cluster run; returns the next free cluster"""
+        cluster_size = self.layout.cluster_size
+        next_free = ROOT_CLUSTER
+
+        for directory in self.directories:
+            directory.clusters = self._cluster_count(self._directory_size(directory), cluster_size)
+            directory.cluster = next_free
+            next_free += directory.clusters
+
+        for node in self.files:
+            node.clusters = self._cluster_count(node.size, cluster_size)
+            node.cluster = next_free if node.clusters else 0
+            next_free += node.clusters
+
+        parents = {id(child): directory for directory in self.directories for child in directory.children}
+        for directory in self.directories:
+            parent = parents.get(id(directory))
+            directory.data = self._directory_data(directory, parent)
+
+        return next_free
+
+    @staticmethod
+    def _cluster_count(size, cluster_size):
+        return -(-size // cluster_size)
+
+    def _directory_size(self, directory):
+        """Bytes of directory entries, including LFN entries"""
+        entries = 2 if directory is not self.root else 1
+        for child in directory.children:
+            entries += 1 + -(-len(child.name.encode('utf-16-le')) // (2 * LFN_CHARS))
+        return max(entries, 1) * DIR_ENTRY_SIZE
+
+    def _directory_data(self, directory, parent):
+        """Encode a directory's entries, padded to its clusters"""
+        entries = []
+        if directory is self.root:
+            entries.append(directory_entry(self.label, ATTR_VOLUME_ID, 0, 0, self.timestamp))
+        else:
+            parent_cluster = 0 if parent is self.root else parent.cluster
+            entries.append(directory_entry(b'.'.ljust(11), ATTR_DIRECTORY, directory.cluster, 0, self.timestamp))
+            entries.append(directory_entry(b'..'.ljust(11), ATTR_DIRECTORY, parent_cluster, 0, self.timestamp))
+
+        used = set()
+        for child in directory.children:
+            short_name, needs_lfn = self._short_name(child.name, used)
+            attributes = ATTR_DIRECTORY if child.directory else ATTR_ARCHIVE
+            if child.hidden:
+                attributes |= ATTR_HIDDEN
+            if needs_lfn:
+                entries.append(lfn_entries(child.name, short_name))
+            size = 0 if child.directory else child.size
+            entries.append(directory_entry(short_name, attributes, child.cluster, size, self.timestamp))
+
+        data = b''.join(entries)
+        return data.ljust(directory.clusters * self.layout.cluster_size, b'\x00')
+
+    @staticmethod
+    def _short_name(name, used):
+        """Return (11-byte short name, needs LFN) unique within a directory"""
+        base, ext = short_name_basis(name)
+        exact = f"{base}.{ext}" if ext else base
+
+        if len(base) <= 8 and exact == name and exact not in used:
+            used.add(exact)
+            return (base.ljust(8) + ext.ljust(3)).encode('ascii'), False
+
+        number = 1
+        while True:
+            tail = f"~{number}"
+            candidate = base[:8 - len(tail)] + tail
+            key = f"{candidate}.{ext}" if ext else candidate
+            if key not in used:
+                used.add(key)
+                return (candidate.ljust(8) + ext.ljust(3)).encode('ascii'), True
+            number += 1
+
+    def _fat(self, next_free):
+        """FAT entries up to next_free: every run is a simple forward chain"""
+        fat = array('I', bytes(4 * next_free))
+        fat[0] = MEDIA_DESCRIPTOR | 0x0FFFFF00
+        fat[1] = END_OF_CHAIN
+
+        for node in self.directories + self.files:
+            if not node.clusters:
+                continue
+            last = node.cluster + node.clusters - 1
+            for cluster in range(node.cluster, last):
+                fat[cluster] = cluster + 1
+            fat[last] = END_OF_CHAIN
+
+        if struct.pack('=I', 1) != struct.pack('<I', 1):
+            fat.byteswap()
+        data = fat.tobytes()
+        return data + bytes(-len(data) % SECTOR_SIZE)
+
+    def _write_file(self, iso_file, target, node, buffer):
+        """Stream a file's extents from the ISO, zero-padding its last cluster
+
+        Data is gathered in the cluster-aligned buffer so every write is a
+        whole number of sectors, as raw volumes require.
+        """
+        filled = 0
+        for offset, length in node.extents:
+            if offset is not None:
+                iso_file.seek(offset)
+            remaining = length
+
+            while remaining > 0:
+                count = min(len(buffer) - filled, remaining)
+                if offset is None:
+                    # Unrecorded extents read as zeros
+                    buffer[filled:filled + count] = bytes(count)
+                    read = count
+                else:
+                    read = iso_file.readinto(buffer[filled:filled + count])
+                    if not read:
+                        raise Exception(f"Unexpected end of ISO file in {node.name}")
+
+                filled += read
+                remaining -= read
+                self.bytes_written += read
+                if filled == len(buffer):
+                    target.write(buffer)
+                    filled = 0
+
+        if filled:
+            padded = filled + (-filled % self.layout.cluster_size)
+            buffer[filled:padded] = bytes(padded - filled)
+            target.write(buffer[:padded])
+
+    def _update_progress(self, progress, status):
+        if self.progress_callback:
+            self.progress_callback(progress, status)
@@ -0,0 +1,161 @@
+import os
+import subprocess
+import sys
+import time
+
+# Largest file a FAT32 directory entry can describe
+FAT32_MAX_FILE_SIZE = 4 * 1024 * 1024 * 1024 - 1
+
+# Chunks stay safely under the limit, in whole MiB as DISM expects
+DEFAULT_CHUNK_SIZE = 3800 * 1024 * 1024
+
+# Windows Setup installs from split WIMs (install.swm, install2.swm, ...)
+WIM_EXTENSIONS = ('.wim',)
+
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+
+def oversized_files(catalog, limit=FAT32_MAX_FILE_SIZE):
+    """Return catalog indexes of the regular files larger than limit"""
+    return [index for index in catalog.files() if catalog.sizes[index] > limit]
+
+
+def slice_extents(extents, start, length):
+    """Return the (offset, length) extents covering bytes start..start+length of a file"""
+    sliced = []
+    position = 0
+    end = start + length
+
+    for offset, size in extents:
+        extent_end = position + size
+        if extent_end > start and position < end:
+            skip = max(0, start - position)
+            count = min(extent_end, end) - position - skip
+            sliced.append((None if offset is None else offset + skip, count))
+        position = extent_end
+
+    return sliced
+
+
+def is_wim(path):
+    return os.path.splitext(path)[1].lower() in WIM_EXTENSIONS
+
+
+def chunk_paths(path, count, swm=False):
+    """Names of the pieces of a split file
+
+    Split WIMs follow the DISM convention (install.swm, install2.swm, ...);
+    plain chunks get numbered suffixes (file.iso.001, file.iso.002, ...).
+    """
+    if swm:
+        base = os.path.splitext(path)[0]
+        return [f"{base}.swm" if n == 1 else f"{base}{n}.swm" for n in range(1, count + 1)]
+    return [f"{path}.{n:03d}" for n in range(1, count + 1)]
+
+
+class FileSplitter:
+    """Splits files that don't fit on FAT32 while copying them off the ISO
+
+    WIM images are split into .swm parts with DISM on Windows, reading
+    straight from the mounted ISO. Everything else (and WIMs where DISM
+    isn't available) is cut into fixed-size chunks streamed from the ISO
+    extents, so the whole file is never staged on disk first.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, copy_range=None):
+        if chunk_size <= 0 or chunk_size > FAT32_MAX_FILE_SIZE:
+            raise Exception("Chunk size must fit in a FAT32 file")
+
+        self.chunk_size = chunk_size
+        self.copy_range = copy_range or self._copy_range
+        self.progress_callback = None
+        self._buffer = None
+
+    def split(self, iso_file, extents, size, target_path, mounted_path=None, progress_callback=None):
+        """Split one file into FAT32-sized pieces next to target_path
+
+        extents are the file's (byte offset, length) extents in the ISO;
+        mounted_path is the same file on a mounted ISO, used for DISM.
+        Returns [(chunk path, offset, size)] for a byte-for-byte split, or
+        None when the file was split into .swm parts by DISM.
+        """
+        self.progress_callback = progress_callback
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+        if is_wim(target_path) and mounted_path and sys.platform == "win32":
+            self._split_wim(mounted_path, target_path, size)
+            return None
+
+        return self._split_stream(iso_file, extents, size, target_path)
+
+    def _split_stream(self, iso_file, extents, size, target_path):
+        """Stream the file from the ISO into consecutive chunks"""
+        count = max(1, -(-size // self.chunk_size))
+        chunks = []
+
+        for number, path in enumerate(chunk_paths(target_path, count)):
+            start = number * self.chunk_size
+            length = min(self.chunk_size, size - start)
+
+            with open(path, 'wb') as output_file:
+                position = 0
+                for offset, piece in slice_extents(extents, start, length):
+                    # Unrecorded extents read as zeros and are left as holes
+                    if offset is not None:
+                        output_file.seek(position)
+                        self.copy_range(iso_file, output_file, offset, piece)
+                    position += piece
+                output_file.truncate(position)
+
+            chunks.append((path, start, length))
+            self._update_progress(((number + 1) / count) * 100,
+                                  f"Splitting {os.path.basename(target_path)}... (part {number + 1}/{count})")
+
+        return chunks
+
+    def _split_wim(self, source_path, target_path, size):
+        """Run DISM /Split-Image, reporting progress as the parts appear"""
+        swm_path = chunk_paths(target_path, 1, swm=True)[0]
+        size_mb = self.chunk_size // (1024 * 1024)
+        command = [
+            'dism', '/Split-Image', f'/ImageFile:{source_path}',
+            f'/SWMFile:{swm_path}', f'/FileSize:{size_mb}'
+        ]
+
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            creationflags=subprocess.CREATE_NO_WINDOW
+        )
+
+        count = max(1, -(-size // self.chunk_size))
+        while process.poll() is None:
+            parts = [p for p in chunk_paths(target_path, count, swm=True) if os.path.exists(p)]
+            written = sum(os.path.getsize(p) for p in parts)
+            self._update_progress(min(99, (written / size) * 100 if size else 0),
+                                  f"Splitting {os.path.basename(target_path)}... (part {max(1, len(parts))}/{count})")
+            time.sleep(0.5)
+
+        if process.returncode != 0:
+            raise Exception(f"DISM failed to split {os.path.basename(source_path)} (exit code {process.returncode})")
+
+        self._update_progress(100, f"Split {os.path.basename(target_path)}")
+
+    def _copy_range(self, iso_file, output_file, offset, size):
+        """Plain buffered copy, used when no faster copy routine is supplied"""
+        if self._buffer is None:
+            self._buffer = memoryview(bytearray(COPY_BUFFER_SIZE))
+
+        iso_file.seek(offset)
+        remaining = size
+        while remaining > 0:
+            read = iso_file.readinto(self._buffer[:min(len(self._buffer), remaining)])
+            if not read:
+                raise Exception("Unexpected end of ISO file")
+            output_file.write(self._buffer[:read])
+            remaining -= read
+
+    def _update_progress(self, progress, status):
+        if self.progress_callback:
+            self.progress_callback(progress, status)
@@ -1,29 +1,106 @@
+import errno
+import io
 import os
 import subprocess
 import shutil
 import tempfile
 import time
 import struct
-from pathlib import Path
+
+from core.compressed_image import is_compressed
+from core.fat32 import FAT32Formatter
+from core.fat32_builder import FAT32ImageBuilder
+from core.file_splitter import FileSplitter, is_wim, oversized_files, slice_extents
+from core.iso_catalog import ISOCatalog, PathTableIndex
+from core.multi_writer import DEFAULT_WINDOW, MultiTargetWriter
+from core.partition_table import PartitionTable, set_active_partition
+from core.progress import ProgressModel
+from core.raw_writer import RawImageWriter
+from core.verifier import ImageVerifier
+from core.volume_descriptors import VolumeDescriptorSet
+from core.write_journal import FILE_BOUNDARY_SIZE, WriteJournal
+
+# Copy strategies tried in order by ISOFlasher._copy_range
+COPY_METHODS = ['copy_file_range', 'sendfile', 'readinto']
+
+# Errors meaning a zero-copy method can't be used here, rather than that the copy failed
+COPY_FALLBACK_ERRNOS = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+# xcopy gets at least 10 minutes, more for images that need it even at this rate
+XCOPY_MIN_RATE = 2 * 1024 * 1024
+
+# Seconds between checks of how much xcopy has copied
+XCOPY_POLL_INTERVAL = 0.5
+
+# Byte-equivalents the progress model gives steps without a byte counter:
+# about what a USB stick writes in the time they take
+FORMAT_PROGRESS_BYTES = 256 * 1024 * 1024
+BOOTABLE_PROGRESS_BYTES = 32 * 1024 * 1024
+
+# Windows volume control codes used to release a drive for raw writing
+FSCTL_LOCK_VOLUME = 0x00090018
+FSCTL_DISMOUNT_VOLUME = 0x00090020
+IOCTL_DISK_GET_LENGTH_INFO = 0x0007405C
+IOCTL_DISK_UPDATE_PROPERTIES = 0x00070140
+IOCTL_STORAGE_GET_DEVICE_NUMBER = 0x002D1080
 
 class ISOFlasher:
     def __init__(self):
         self.progress_callback = None
+        self.phase = None
+        self.progress_model = ProgressModel()
         self.temp_dir = None
+        self.catalog = None
+        self.sequential_extract = True
+        self.copy_buffer_size = 4 * 1024 * 1024
+        self._copy_buffer = None
+        self._copy_method = COPY_METHODS[0]
+        self.raw_buffer_size = 4 * 1024 * 1024
+        self.raw_buffer_count = 4
+        self.raw_direct = True
+        self.raw_fsync_policy = "end"
+        self.raw_skip_zeros = False
+        self.raw_target_zeroed = False
+        self.raw_window = DEFAULT_WINDOW
+        self.resumable = True
+        self.journal_dir = None
+        self.verify_mode = None
+        self.verify_sample_percent = 5
+        self.split_large_files = True
+        self.direct_fat32 = True
+        self.split_chunk_size = None
+        self.split_files = {}
         
-    def flash_iso(self, iso_path, drive_letter, volume_name, partition_scheme, target_system, file_system, progress_callback=None):
-        """Flash ISO to USB drive using temporary folder extraction method or format only for non-bootable"""
+    def flash_iso(self, iso_path, drive_letter, volume_name, partition_scheme, target_system, file_system, progress_callback=None, write_mode="copy", verify_mode=None):
+        """Flash ISO to USB drive using temporary folder extraction method or format only for non-bootable
+
+        write_mode "raw" writes the image block-for-block to the whole disk
+        instead; partition scheme and file system then come from the image.
+        verify_mode ("full", "sampled" or "hash") reads the result back and
+        compares it with the ISO.
+        """
         self.progress_callback = progress_callback
+        if verify_mode is not None:
+            self.verify_mode = verify_mode
 
         try:
             # Update progress
-            self._update_progress(5, "Validating inputs...")
+            self.progress_model = ProgressModel()
+            self._begin_phase("validate", "Validating inputs...")
 
             # Check if this is a non-bootable format-only operation
             if iso_path is None:
                 # Non-bootable mode - just format the drive
                 return self._format_only_mode(drive_letter, volume_name, partition_scheme, file_system)
 
+            # Raw mode copies the image as-is, configuration doesn't apply
+            if write_mode == "raw":
+                return self._raw_write_mode(iso_path, drive_letter)
+
+            # File copy needs random access to the ISO, which a compressed stream can't give
+            if is_compressed(iso_path):
+                raise Exception("Compressed images can only be written in raw (DD) mode")
+
             # To prevent unwanted configuration
             if partition_scheme == "MBR":
                 if target_system == "BIOS or UEFI":
@@ -56,36 +133,88 @@ class ISOFlasher:
             if not drive_info:
                 raise Exception("Could not get drive information")
 
-            # Update progress
-            self._update_progress(10, "Preparing USB drive...")
+            # The catalog's file sizes weigh the copy and verify phases
+            self.catalog = ISOCatalog.from_path(iso_path)
+            self.split_files = {}
 
-            # Format the drive first
-            if not self._format_drive_standalone(drive_letter, volume_name, partition_scheme, file_system):
-                raise Exception("Failed to format USB drive")
+            # FAT32 can't hold files of 4 GiB or more; those are split instead of copied
+            oversized = []
+            if file_system == "FAT32" and self.split_large_files:
+                oversized = oversized_files(self.catalog)
+            split_wim = any(is_wim(self.catalog.paths[i]) for i in oversized)
 
-            # Update progress
-            self._update_progress(25, "Mounting ISO and copying files...")
+            # A FAT32 volume can be written in one pass straight from the ISO,
+            # unless a WIM has to be split into .swm parts by DISM. Its boot
+            # sector has no BIOS boot code, so BIOS targets keep diskpart's.
+            direct = file_system == "FAT32" and self.direct_fat32 and target_system == "UEFI" and not split_wim
+
+            # An interrupted file copy of the same ISO with the same settings
+            # picks up where it stopped instead of formatting the drive again.
+            # The direct FAT32 build and the xcopy path always start over.
+            journal = None
+            if not direct and not split_wim:
+                journal = self._journal(iso_path, f"{drive_letter}:", "copy",
+                                        [volume_name, partition_scheme, target_system, file_system])
+            resuming = journal is not None and journal.resuming
+
+            # A direct build's formatting is part of writing the volume
+            copy_size = self.catalog.total_size()
+            self._plan(
+                ("format", 0 if resuming or direct else FORMAT_PROGRESS_BYTES),
+                ("copy", copy_size),
+                ("verify", self._verify_size(copy_size)),
+                ("bootable", BOOTABLE_PROGRESS_BYTES)
+            )
+
+            if resuming:
+                self._begin_phase("format", "Resuming interrupted flash...")
+            else:
+                # Update progress
+                self._begin_phase("format", "Preparing USB drive...")
+
+                # Format the drive first; a direct build writes the whole volume instead
+                if not self._format_drive_standalone(drive_letter, volume_name, partition_scheme, file_system,
+                                                     target_system, iso_path if direct else None):
+                    raise Exception("Failed to format USB drive")
+
+            if split_wim:
+                # Update progress
+                self._begin_phase("copy", "Mounting ISO and copying files...")
 
-            # Copy all files directly from mounted ISO to USB drive using xcopy
-            if not self._copy_iso_to_usb_direct(iso_path, drive_letter):
-                raise Exception("Failed to copy files to USB drive")
+                # DISM splits WIMs from the mounted ISO, so copy with xcopy from there too
+                if not self._copy_iso_to_usb_direct(iso_path, drive_letter, oversized):
+                    raise Exception("Failed to copy files to USB drive")
+            elif not direct:
+                self._begin_phase("copy", "Copying files to USB...")
+                if not self._copy_iso_files(iso_path, drive_letter, oversized, journal):
+                    raise Exception("Failed to copy files to USB drive")
+
+            # Every file is on the drive; a later failure starts over
+            if journal is not None:
+                journal.discard()
+
+            # Read the copied files back and compare them with the ISO
+            if self.verify_mode:
+                self._verify(
+                    lambda verifier, report: verifier.verify_tree(
+                        iso_path, self.catalog, f"{drive_letter}:\\", report, split_files=self.split_files
+                    )
+                )
 
             # Update progress
-            self._update_progress(90, "Making drive bootable...")
+            self._begin_phase("bootable", "Making drive bootable...")
 
             # Make the drive bootable
             if not self._make_bootable_standalone(drive_letter, target_system):
                 raise Exception("Failed to make drive bootable")
 
             # Update progress
-            self._update_progress(95, "Finalizing...")
-
-            # Update progress
-            self._update_progress(100, "Flash completed successfully!")
+            self._begin_phase("done", "Flash completed successfully!")
 
             return True
 
         except Exception as e:
+            self.phase = "error"
             self._update_progress(0, f"Error: {str(e)}")
             raise e
             
@@ -93,31 +222,344 @@ class ISOFlasher:
         """Format-only mode for non-bootable USB drives"""
         try:
             # Update progress
-            self._update_progress(10, "Validating drive...")
+            self._plan(("format", FORMAT_PROGRESS_BYTES))
+            self._update_progress(0, "Validating drive...")
 
             if not os.path.exists(f"{drive_letter}:\\"):
                 raise Exception("USB drive not found")
 
             # Update progress
-            self._update_progress(20, "Formatting USB drive...")
+            self._begin_phase("format", "Formatting USB drive...")
 
             # Format the drive using diskpart
             if not self._format_drive_standalone(drive_letter, volume_name, partition_scheme, file_system):
                 raise Exception("Failed to format USB drive")
 
             # Update progress
-            self._update_progress(100, "Format completed successfully!")
+            self._begin_phase("done", "Format completed successfully!")
 
             return True
 
         except Exception as e:
+            self.phase = "error"
             self._update_progress(0, f"Error: {str(e)}")
             raise e
 
-    def _update_progress(self, progress, status):
-        """Update progress callback"""
+    def _raw_write_mode(self, iso_path, drive_letter):
+        """Raw mode: write the ISO block-for-block to the USB disk"""
+        try:
+            if not os.path.exists(iso_path):
+                raise Exception("ISO file not found")
+
+            if not os.path.exists(f"{drive_letter}:\\"):
+                raise Exception("USB drive not found")
+
+            # Never guess the disk number when overwriting a whole disk
+            disk_number = self._get_disk_number(drive_letter, fallback=None)
+            if disk_number is None:
+                raise Exception("Could not determine the disk of the USB drive")
+
+            # Update progress
+            size = os.path.getsize(iso_path)
+            self._plan(("write", size), ("verify", self._verify_size(size)))
+            self._begin_phase("write", "Dismounting USB drive...")
+
+            volume_handle = self._lock_volume(drive_letter)
+            target_path = f"\\\\.\\PhysicalDrive{disk_number}"
+            try:
+                writer = self.write_raw_image(iso_path, target_path)
+                self._plan_verify(writer.bytes_done)
+
+                # Read the device back while we still hold the volume lock
+                if self.verify_mode:
+                    self._verify(
+                        lambda verifier, report: verifier.verify_raw(iso_path, target_path, report, writer.bytes_done)
+                    )
+            finally:
+                if volume_handle is not None:
+                    volume_handle.Close()
+
+            # Update progress
+            self._begin_phase("done", "Flash completed successfully!")
+
+            return True
+
+        except Exception as e:
+            self.phase = "error"
+            self._update_progress(0, f"Error: {str(e)}")
+            raise e
+
+    def flash_multi(self, iso_path, drive_letters, volume_name, partition_scheme, target_system, file_system, progress_callback=None, write_mode="copy", verify_mode=None):
+        """Flash the same ISO to several USB drives
+
+        Raw mode reads the image once and writes every drive in parallel;
+        file copy mode flashes the drives one after another. A drive that
+        fails is reported and dropped without stopping the others.
+        Returns {drive_letter: None if it succeeded, else the error message}.
+        """
+        self.progress_callback = progress_callback
+        if verify_mode is not None:
+            self.verify_mode = verify_mode
+
+        if write_mode == "raw" and iso_path is not None:
+            return self._raw_write_multi(iso_path, drive_letters)
+
+        results = {}
+        for number, drive_letter in enumerate(drive_letters):
+            # Each drive gets an equal slice of the overall progress
+            def report(progress, status, number=number, drive_letter=drive_letter, **details):
+                if progress_callback:
+                    progress_callback((number + progress / 100) * 100 / len(drive_letters), f"[{drive_letter}:] {status}", **details)
+            report.structured = getattr(progress_callback, 'structured', False)
+
+            try:
+                self.flash_iso(iso_path, drive_letter, volume_name, partition_scheme, target_system, file_system,
+                               progress_callback=report, write_mode=write_mode)
+                results[drive_letter] = None
+            except Exception as e:
+                results[drive_letter] = str(e)
+
+        self.progress_callback = progress_callback
+        flashed = sum(error is None for error in results.values())
+        self.phase = "done"
+        self._update_progress(100, f"Flashed {flashed} of {len(drive_letters)} drives")
+        return results
+
+    def _raw_write_multi(self, iso_path, drive_letters):
+        """Raw mode for several drives: one read of the image fanned out to every disk"""
+        results = {}
+        targets = {}
+        handles = []
+
+        try:
+            if not os.path.exists(iso_path):
+                raise Exception("ISO file not found")
+
+            # Update progress
+            size = os.path.getsize(iso_path)
+            self._plan(("write", size), ("verify", self._verify_size(size) * len(drive_letters)))
+            self._begin_phase("write", "Dismounting USB drives...")
+
+            for drive_letter in drive_letters:
+                disk_number = None
+                if os.path.exists(f"{drive_letter}:\\"):
+                    disk_number = self._get_disk_number(drive_letter, fallback=None)
+                if disk_number is None:
+                    results[drive_letter] = "Could not determine the disk of the USB drive"
+                    continue
+
+                handle = self._lock_volume(drive_letter)
+                if handle is not None:
+                    handles.append(handle)
+                targets[f"\\\\.\\PhysicalDrive{disk_number}"] = drive_letter
+
+            if not targets:
+                raise Exception("None of the USB drives could be opened")
+
+            # Every disk is read back while we still hold the volume locks
+            for target_path, error in self._write_targets(iso_path, list(targets)).items():
+                results[targets[target_path]] = error
+        finally:
+            for handle in handles:
+                handle.Close()
+
+        flashed = sum(error is None for error in results.values())
+        self._begin_phase("done", f"Flashed {flashed} of {len(drive_letters)} drives")
+        return results
+
+    def flash_image(self, iso_path, target_paths, progress_callback=None, verify_mode=None):
+        """Raw-write an image to device or image file paths instead of drive letters
+
+        Nothing is dismounted or locked first, so the targets must not be
+        in use. Several targets share one read of the image, like
+        flash_multi. Returns {target_path: None if it succeeded, else the
+        error message}.
+        """
+        self.progress_callback = progress_callback
+        if verify_mode is not None:
+            self.verify_mode = verify_mode
+
+        if not os.path.exists(iso_path):
+            raise Exception("ISO file not found")
+
+        size = os.path.getsize(iso_path)
+        self._plan(("write", size), ("verify", self._verify_size(size) * len(target_paths)))
+        self._begin_phase("write", "Writing image...")
+
+        results = self._write_targets(iso_path, list(target_paths))
+
+        flashed = sum(error is None for error in results.values())
+        self._begin_phase("done", f"Flashed {flashed} of {len(target_paths)} targets")
+        return results
+
+    def _write_targets(self, iso_path, target_paths):
+        """Raw-write the image to every target path, then verify them if asked
+
+        A single target goes through write_raw_image so it can resume;
+        several are written in parallel by a MultiTargetWriter. Returns
+        {target_path: None if it succeeded, else the error message}.
+        """
+        if len(target_paths) == 1:
+            try:
+                writer = self.write_raw_image(iso_path, target_paths[0])
+                results = {target_paths[0]: None}
+            except Exception as e:
+                print(f"Error writing image: {e}")
+                return {target_paths[0]: str(e)}
+        else:
+            writer = self._raw_writer(MultiTargetWriter, self.raw_window)
+            try:
+                writer.write(iso_path, target_paths, progress_callback=self._raw_progress(writer, iso_path))
+            except Exception as e:
+                print(f"Error writing image: {e}")
+            results = {stats['target']: stats['error'] for stats in writer.target_stats()}
+
+        written = [path for path in target_paths if results[path] is None]
+        self._plan_verify(writer.bytes_done, len(written))
+        if self.verify_mode:
+            for number, target_path in enumerate(written):
+                try:
+                    self._verify(
+                        lambda verifier, report: verifier.verify_raw(iso_path, target_path, report, writer.bytes_done),
+                        number, len(written)
+                    )
+                except Exception as e:
+                    results[target_path] = str(e)
+        return results
+
+    def write_raw_image(self, iso_path, target_path):
+        """Write an image block-for-block to a device or image file
+
+        An earlier write of the same image to the same target that was
+        interrupted resumes from its last checkpoint.
+        """
+        writer = self._raw_writer(RawImageWriter, self.raw_buffer_count)
+        journal = self._journal(iso_path, target_path, "raw", [self.raw_skip_zeros, self.raw_target_zeroed])
+        size = os.path.getsize(iso_path)
+        if self.progress_model.phase != "write":
+            # Called on its own rather than as a step of a flash
+            self._plan(("write", size))
+        self._begin_phase("write", "Writing image...", size)
+        writer.write(iso_path, target_path, progress_callback=self._raw_progress(writer, iso_path), journal=journal)
+        return writer
+
+    def _journal(self, iso_path, target, mode, settings):
+        """The write journal for this job, or None when resuming is off"""
+        if not self.resumable:
+            return None
+        try:
+            return WriteJournal(iso_path, target, mode, settings, journal_dir=self.journal_dir)
+        except Exception as e:
+            print(f"Error opening write journal: {e}")
+            return None
+
+    def _raw_writer(self, writer_class, buffer_count):
+        """A raw writer configured from the raw_* settings"""
+        return writer_class(
+            buffer_size=self.raw_buffer_size,
+            buffer_count=buffer_count,
+            direct=self.raw_direct,
+            fsync_policy=self.raw_fsync_policy,
+            skip_zeros=self.raw_skip_zeros,
+            target_zeroed=self.raw_target_zeroed
+        )
+
+    def _raw_progress(self, writer, iso_path):
+        """Progress callback feeding a raw writer's byte count into the write phase"""
+        # A compressed image's progress is by compressed bytes, like the phase size
+        compressed = is_compressed(iso_path)
+        def report(progress, status):
+            done = progress * self.progress_model.size / 100 if compressed else writer.bytes_done
+            self._phase_progress(done, status)
+        return report
+
+    def _verify(self, run, number=0, count=1):
+        """Run the number-th of count verification passes of the verify phase"""
+        verifier = ImageVerifier(mode=self.verify_mode, sample_percent=self.verify_sample_percent)
+        if number == 0:
+            self._begin_phase("verify", "Verifying...")
+
+        # The verifier knows how much it reads once it has planned its blocks
+        def report(progress, status):
+            planned = verifier.bytes_planned
+            self._phase_progress(planned * number + verifier.bytes_verified, status, planned * count)
+
+        if not run(verifier, report):
+            name, offset = verifier.mismatches[0]
+            raise Exception(f"Verification failed: {len(verifier.mismatches)} mismatch(es), "
+                            f"first in {name} at byte {offset}")
+
+        rate = verifier.throughput / (1024 * 1024)
+        self._phase_progress(verifier.bytes_planned * (number + 1),
+                             f"Verified {verifier.bytes_verified / (1024 * 1024):.0f} MB at {rate:.1f} MB/s")
+        return verifier
+
+    def _lock_volume(self, drive_letter):
+        """Lock and dismount the volume so its disk can be written raw"""
+        try:
+            import win32file
+
+            handle = win32file.CreateFile(
+                f"\\\\.\\{drive_letter}:",
+                win32file.GENERIC_READ | win32file.GENERIC_WRITE,
+                win32file.FILE_SHARE_READ | win32file.FILE_SHARE_WRITE,
+                None,
+                win32file.OPEN_EXISTING,
+                0,
+                None
+            )
+            win32file.DeviceIoControl(handle, FSCTL_LOCK_VOLUME, None, None)
+            win32file.DeviceIoControl(handle, FSCTL_DISMOUNT_VOLUME, None, None)
+            return handle
+
+        except Exception as e:
+            print(f"Error locking volume: {e}")
+            return None
+
+    def _plan(self, *phases):
+        """Start a byte-weighted progress model for this flash's (phase, bytes) steps"""
+        self.progress_model = ProgressModel(phases)
+
+    def _verify_size(self, size):
+        """Bytes a verification of size bytes will read, 0 when verifying is off"""
+        if not self.verify_mode:
+            return 0
+        if self.verify_mode == "sampled":
+            return size * self.verify_sample_percent // 100
+        return size
+
+    def _plan_verify(self, size, count=1):
+        """Size the planned verify phase from the image bytes a raw write handled
+
+        The plan starts from the file size, which for a compressed image
+        is the compressed one; the written size is only known afterwards.
+        """
+        self.progress_model.resize("verify", self._verify_size(size) * count)
+
+    def _begin_phase(self, phase, status, size=None):
+        """Move the progress model on to phase and report it"""
+        self.phase = phase
+        self.progress_model.begin(phase, size)
+        self._phase_progress(0, status)
+
+    def _phase_progress(self, done, status, size=None, **details):
+        """Report done bytes of the current phase as overall progress, rate and ETA"""
+        model = self.progress_model
+        model.update(done, size)
+        self._update_progress(model.progress, status, bytes_done=model.done, bytes_total=model.size,
+                              rate=model.rate, eta=model.eta, **details)
+
+    def _update_progress(self, progress, status, **details):
+        """Update progress callback
+
+        Structured callbacks (see core.progress) also get the current phase
+        and whatever details the phase reports, such as byte and file counts.
+        """
         if self.progress_callback:
-            self.progress_callback(progress, status)
+            if getattr(self.progress_callback, 'structured', False):
+                self.progress_callback(progress, status, phase=self.phase, **details)
+            else:
+                self.progress_callback(progress, status)
             
     def _get_drive_info(self, drive_letter):
         """Get drive information"""
@@ -132,9 +574,21 @@ class ISOFlasher:
         except Exception:
             return None
             
-    def _format_drive_standalone(self, drive_letter, volume_name, partition_scheme, file_system):
-        """Format the USB drive using only Windows built-in tools"""
+    def _format_drive_standalone(self, drive_letter, volume_name, partition_scheme, file_system, target_system=None,
+                                 iso_path=None):
+        """Partition and format the USB drive
+
+        FAT32 drives for UEFI, or that won't be made bootable (no
+        target_system), are partitioned by PartitionTable and formatted by
+        FAT32Formatter in-process (with iso_path, built from the ISO's
+        files instead). Those write no BIOS boot code, so BIOS targets and
+        other file systems still go through diskpart, whose MBR and boot
+        sector load bootmgr.
+        """
         try:
+            if file_system == "FAT32" and target_system in (None, "UEFI"):
+                return self._partition_drive(drive_letter, volume_name, partition_scheme, iso_path)
+
             # Create diskpart script for comprehensive formatting
             diskpart_script = f"""
 select disk {self._get_disk_number(drive_letter)}
@@ -146,61 +600,181 @@ format fs={file_system} label="{volume_name}" quick
 assign letter={drive_letter}
 exit
 """
-            
-            # Write diskpart script to temp file
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-                f.write(diskpart_script)
-                script_path = f.name
-                
-            try:
-                # Run diskpart with elevated privileges
-                result = subprocess.run(
-                    ['diskpart', '/s', script_path],
-                    capture_output=True,
-                    text=True,
-                    timeout=180,
-                    creationflags=subprocess.CREATE_NO_WINDOW
-                )
-                
-                if result.returncode == 0:
-                    # Wait for drive to be ready
-                    time.sleep(3)
-                    return os.path.exists(f"{drive_letter}:\\")
-                else:
-                    return False
-                    
-            finally:
-                # Clean up temp file
-                try:
-                    os.unlink(script_path)
-                except:
-                    pass
-                    
+            if not self._run_diskpart(diskpart_script, timeout=180):
+                return False
+
+            # Wait for drive to be ready
+            return self._wait_for_drive(drive_letter)
+
         except Exception as e:
             print(f"Error formatting drive: {e}")
             return False
-            
-    def _get_disk_number(self, drive_letter):
+
+    def _partition_drive(self, drive_letter, volume_name, partition_scheme, iso_path=None):
+        """Write a one-partition MBR/GPT table and a FAT32 file system to the whole disk
+
+        With iso_path the file system is built from the ISO's files by
+        build_fat32_image instead of being formatted empty.
+        """
+        disk_number = self._get_disk_number(drive_letter, fallback=None)
+        if disk_number is None:
+            raise Exception("Could not determine the disk of the USB drive")
+
+        volume_handle = self._lock_volume(drive_letter)
+        try:
+            disk_path = f"\\\\.\\PhysicalDrive{disk_number}"
+            table = PartitionTable(self._disk_size(disk_path), partition_scheme)
+            partition = table.add(bootable=partition_scheme == "MBR", name="Basic data partition")
+
+            with open(disk_path, 'r+b', buffering=0) as disk:
+                table.write(disk)
+                if iso_path is None:
+                    FAT32Formatter(label=volume_name).format(disk, partition.size, partition.offset)
+                else:
+                    self._begin_phase("copy", "Writing files to USB...")
+                    builder = self.build_fat32_image(iso_path, disk, volume_name, partition.size,
+                                                     offset=partition.offset, hidden_sectors=partition.start_lba)
+                    self._record_split_files(drive_letter, builder)
+
+            # Have Windows pick up the new layout and mount the volume
+            self._update_disk_properties(disk_path)
+        finally:
+            if volume_handle is not None:
+                volume_handle.Close()
+
+        if self._wait_for_drive(drive_letter):
+            return True
+
+        # Windows gave the new volume another letter; move it back
+        return self._run_diskpart(f"""
+select disk {disk_number}
+select partition 1
+assign letter={drive_letter}
+exit
+""") and self._wait_for_drive(drive_letter)
+
+    def _run_diskpart(self, script, timeout=60):
+        """Run a diskpart script, returning True on success"""
+        # Write diskpart script to temp file
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
+            f.write(script)
+            script_path = f.name
+
+        try:
+            # Run diskpart with elevated privileges
+            result = subprocess.run(
+                ['diskpart', '/s', script_path],
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                creationflags=subprocess.CREATE_NO_WINDOW
+            )
+            return result.returncode == 0
+
+        finally:
+            # Clean up temp file
+            try:
+                os.unlink(script_path)
+            except OSError:
+                pass
+
+    def _disk_size(self, disk_path):
+        """Size in bytes of a physical disk"""
+        import win32file
+
+        handle = win32file.CreateFile(
+            disk_path, win32file.GENERIC_READ,
+            win32file.FILE_SHARE_READ | win32file.FILE_SHARE_WRITE,
+            None, win32file.OPEN_EXISTING, 0, None
+        )
+        try:
+            return self._volume_size(handle)
+        finally:
+            handle.Close()
+
+    def _update_disk_properties(self, disk_path):
+        """Ask Windows to re-read the partition table of a disk"""
+        try:
+            import win32file
+
+            handle = win32file.CreateFile(
+                disk_path, win32file.GENERIC_READ | win32file.GENERIC_WRITE,
+                win32file.FILE_SHARE_READ | win32file.FILE_SHARE_WRITE,
+                None, win32file.OPEN_EXISTING, 0, None
+            )
+            try:
+                win32file.DeviceIoControl(handle, IOCTL_DISK_UPDATE_PROPERTIES, None, None)
+            finally:
+                handle.Close()
+
+        except Exception as e:
+            print(f"Error updating disk properties: {e}")
+
+    def _record_split_files(self, drive_letter, builder):
+        """Remember where the builder stored oversized files as chunks, to verify them as such"""
+        drive_path = f"{drive_letter}:\\"
+        self.split_files = {
+            index: [(os.path.join(drive_path, *path.split('/')), start, length) for path, start, length in chunks]
+            for index, chunks in builder.split_files.items()
+        }
+
+    def build_fat32_image(self, iso_path, target, volume_name, size=None, cluster_size=None, offset=0, hidden_sectors=None):
+        """Lay out the ISO's files as a FAT32 volume on target (a device, volume or .img path)
+
+        offset is where the volume starts on target and hidden_sectors the
+        partition's starting sector recorded in its boot sector. The boot
+        sector has no BIOS boot code; the volume boots through UEFI.
+        """
+        if self.catalog is None:
+            self.catalog = ISOCatalog.from_path(iso_path)
+
+        builder = FAT32ImageBuilder(self.catalog, label=volume_name, cluster_size=cluster_size)
+        if self.split_chunk_size:
+            builder.chunk_size = self.split_chunk_size
+
+        def report(progress, status):
+            self._phase_progress(builder.bytes_written, status)
+
+        with open(iso_path, 'rb') as iso_file:
+            builder.build(iso_file, target, size, offset, hidden_sectors, progress_callback=report)
+        return builder
+
+    def _volume_size(self, handle):
+        """Size in bytes of an open volume or disk handle"""
+        import win32file
+        length = win32file.DeviceIoControl(handle, IOCTL_DISK_GET_LENGTH_INFO, None, 8)
+        return struct.unpack('<q', length)[0]
+
+    def _wait_for_drive(self, drive_letter, timeout=15):
+        """Wait until Windows has mounted the drive again"""
+        deadline = time.monotonic() + timeout
+        while not os.path.exists(f"{drive_letter}:\\"):
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def _get_disk_number(self, drive_letter, fallback="1"):
         """Get disk number for the drive letter"""
         try:
-            # Use wmic to get disk number
-            cmd = f'wmic logicaldisk where "DeviceID=\\"{drive_letter}:\\"" assoc /assocclass:Win32_LogicalDiskToPartition'
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0 and result.stdout:
-                # Parse output to get disk number
-                lines = result.stdout.strip().split('\n')
-                for line in lines:
-                    if 'Disk #' in line:
-                        disk_num = line.split('Disk #')[1].split(',')[0].strip()
-                        return disk_num
-                        
-            # Fallback: assume it's disk 1 (common for USB drives)
-            return "1"
-            
+            import win32file
+
+            handle = win32file.CreateFile(
+                f"\\\\.\\{drive_letter}:", 0,
+                win32file.FILE_SHARE_READ | win32file.FILE_SHARE_WRITE,
+                None, win32file.OPEN_EXISTING, 0, None
+            )
+            try:
+                # STORAGE_DEVICE_NUMBER: device type, device number, partition number
+                result = win32file.DeviceIoControl(handle, IOCTL_STORAGE_GET_DEVICE_NUMBER, None, 12)
+            finally:
+                handle.Close()
+
+            return str(struct.unpack('<III', result)[1])
+
         except Exception:
-            return "1"
-            
+            return fallback
+
     def _extract_iso_to_temp(self, iso_path):
         """Extract ISO contents to temporary folder"""
         try:
@@ -255,120 +829,239 @@ exit
         """Manual ISO extraction using Python"""
         try:
             with open(iso_path, 'rb') as iso_file:
-                # Read ISO 9660 structure
-                iso_file.seek(16 * 2048)  # Primary Volume Descriptor
-                pvd = iso_file.read(2048)
-                
-                if pvd[1:6] != b'CD001':
-                    raise Exception("Invalid ISO format")
-                
-                # Get root directory location
-                root_dir_lba = struct.unpack('<L', pvd[158:162])[0]
-                root_dir_size = struct.unpack('<L', pvd[166:170])[0]
-                
+                # Index the whole directory tree in one pass
+                self.catalog = ISOCatalog.from_file(iso_file)
+
                 # Extract files from ISO
-                self._extract_iso_files(iso_file, root_dir_lba, root_dir_size, self.temp_dir, "")
-                
+                if self.sequential_extract:
+                    self._extract_iso_sequential(iso_file, self.catalog, self.temp_dir)
+                else:
+                    self._extract_iso_files(iso_file, self.catalog, self.temp_dir)
+
                 return True
                 
         except Exception as e:
             print(f"Error with manual ISO extraction: {e}")
             return False
             
-    def _extract_iso_files(self, iso_file, dir_lba, dir_size, output_path, current_path):
-        """Recursively extract files from ISO directory"""
+    def extract_paths(self, iso_path, paths, output_path):
+        """Extract selected files, resolving each through the ISO's path table"""
         try:
-            iso_file.seek(dir_lba * 2048)
-            dir_data = iso_file.read(dir_size)
-            
-            offset = 0
-            file_count = 0
-            
-            while offset < len(dir_data):
-                if offset + 33 > len(dir_data):
-                    break
-                    
-                record_length = dir_data[offset]
-                if record_length == 0:
-                    # Skip to next sector
-                    sector_offset = offset % 2048
-                    if sector_offset != 0:
-                        offset += 2048 - sector_offset
-                        continue
+            with open(iso_path, 'rb') as iso_file:
+                descriptors = VolumeDescriptorSet.from_file(iso_file)
+                if not descriptors.valid:
+                    raise Exception("Invalid ISO format")
+
+                # The ISO 9660 side of a UDF-bridge image can't describe files
+                # over 4 GiB, so those images are always resolved through UDF
+                index = None
+                if descriptors.primary is not None and not descriptors.udf:
+                    index = PathTableIndex(iso_file, descriptors.joliet or descriptors.primary)
+                catalog = None
+
+                for path in paths:
+                    entry = index.lookup(path) if index is not None else None
+                    found = None
+
+                    # Rock Ridge names aren't in the path table; fall back to the full tree
+                    if entry is None:
+                        if catalog is None:
+                            catalog = ISOCatalog.from_file(iso_file)
+                        found = catalog.find(path)
+                        if found is not None:
+                            entry = (catalog.lbas[found], catalog.sizes[found], catalog.is_directory(found))
+
+                    if entry is None or entry[2]:
+                        raise Exception(f"File not found in ISO: {path}")
+
+                    file_lba, file_size, _ = entry
+                    full_path = os.path.join(output_path, *path.replace('\\', '/').strip('/').split('/'))
+                    if found is not None and catalog.is_fragmented(found):
+                        self._extract_extents(iso_file, catalog.file_extents(found), full_path)
                     else:
-                        break
-                
-                if offset + record_length > len(dir_data):
-                    break
-                
-                # Parse directory record
-                record = dir_data[offset:offset + record_length]
-                
-                # Get file location and size
-                file_lba = struct.unpack('<L', record[2:6])[0]
-                file_size = struct.unpack('<L', record[10:14])[0]
-                
-                # Get filename
-                filename_len = record[32]
-                if filename_len > 0 and offset + 33 + filename_len <= len(dir_data):
-                    filename = record[33:33 + filename_len].decode('ascii', errors='ignore')
-                    
-                    # Skip . and .. entries
-                    if filename not in ['.', '..', '\x00']:
-                        file_flags = record[25]
-                        is_directory = (file_flags & 2) != 0
-                        
-                        # Clean filename
-                        if ';' in filename:
-                            filename = filename.split(';')[0]
-                            
-                        full_path = os.path.join(output_path, current_path, filename)
-                        
-                        if is_directory:
-                            # Create directory
-                            os.makedirs(full_path, exist_ok=True)
-                            # Recursively extract directory contents
-                            if file_size > 0:
-                                self._extract_iso_files(iso_file, file_lba, file_size, output_path, 
-                                                      os.path.join(current_path, filename))
-                        else:
-                            # Extract file
-                            if file_size > 0:
-                                self._extract_file(iso_file, file_lba, file_size, full_path)
-                                file_count += 1
-                                
-                                # Update progress periodically
-                                if file_count % 10 == 0:
-                                    progress = 25 + min(40, (file_count / 100) * 40)
-                                    self._update_progress(progress, f"Extracting files... ({file_count} files)")
-                
-                offset += record_length
+                        self._extract_file(iso_file, file_lba, file_size, full_path)
+
+                return True
+
+        except Exception as e:
+            print(f"Error extracting files from ISO: {e}")
+            return False
+
+    def _extract_iso_files(self, iso_file, catalog, output_path):
+        """Extract every file listed in the catalog"""
+        try:
+            # Create the directory tree up front
+            for index in catalog.directories():
+                os.makedirs(os.path.join(output_path, catalog.paths[index]), exist_ok=True)
+
+            total_files = catalog.file_count()
+            file_count = 0
+
+            for index in catalog.files():
+                full_path = os.path.join(output_path, catalog.paths[index])
+                file_size = catalog.sizes[index]
+
+                if catalog.is_fragmented(index):
+                    self._extract_extents(iso_file, catalog.file_extents(index), full_path)
+                elif file_size > 0:
+                    self._extract_file(iso_file, catalog.lbas[index], file_size, full_path)
+                else:
+                    open(full_path, 'wb').close()
+                file_count += 1
+
+                # Update progress periodically
+                if file_count % 10 == 0 or file_count == total_files:
+                    progress = 25 + (file_count / total_files) * 40
+                    self._update_progress(progress, f"Extracting files... ({file_count}/{total_files})")
                 
         except Exception as e:
             print(f"Error extracting ISO files: {e}")
             
+    def _extract_iso_sequential(self, iso_file, catalog, output_path):
+        """Extract every file in LBA order, streaming the ISO once front to back"""
+        try:
+            # Create the directory tree and empty files up front
+            for index in catalog.directories():
+                os.makedirs(os.path.join(output_path, catalog.paths[index]), exist_ok=True)
+
+            total_files = 0
+            file_count = 0
+
+            for index in catalog.files():
+                total_files += 1
+                if catalog.sizes[index] == 0:
+                    open(os.path.join(output_path, catalog.paths[index]), 'wb').close()
+                    file_count += 1
+
+            for run_start, run_end, extents in catalog.extent_runs():
+                iso_file.seek(run_start)
+
+                for offset, size, index in extents:
+                    full_path = os.path.join(output_path, catalog.paths[index])
+                    with open(full_path, 'wb') as output_file:
+                        self._copy_range(iso_file, output_file, offset, size)
+
+                    file_count += 1
+
+                    # Update progress periodically
+                    if file_count % 10 == 0 or file_count == total_files:
+                        progress = 25 + (file_count / total_files) * 40
+                        self._update_progress(progress, f"Extracting files... ({file_count}/{total_files})")
+
+            # Fragmented UDF files aren't part of any run
+            for index in catalog.extents:
+                if index in catalog.links or catalog.is_directory(index):
+                    continue
+                full_path = os.path.join(output_path, catalog.paths[index])
+                self._extract_extents(iso_file, catalog.extents[index], full_path)
+                file_count += 1
+                progress = 25 + (file_count / total_files) * 40
+                self._update_progress(progress, f"Extracting files... ({file_count}/{total_files})")
+
+        except Exception as e:
+            print(f"Error extracting ISO files: {e}")
+
+    def _copy_range(self, iso_file, output_file, offset, size):
+        """Copy size bytes at offset in the ISO to output_file
+
+        Uses os.copy_file_range or os.sendfile so the data never enters
+        Python, and falls back to readinto() on a reused buffer where the
+        kernel (or Windows) doesn't support them. Other errors, like a full
+        drive or a truncated ISO, are raised.
+        """
+        copied = 0
+
+        while self._copy_method != 'readinto':
+            try:
+                copied += self._copy_range_kernel(iso_file, output_file, offset + copied, size - copied)
+                return
+            except (AttributeError, OSError) as e:
+                unsupported = (
+                    isinstance(e, (AttributeError, io.UnsupportedOperation))
+                    or e.errno in COPY_FALLBACK_ERRNOS
+                )
+                if not unsupported:
+                    raise
+
+                # Partial progress is kept, the next method picks up from there
+                copied += getattr(e, 'copied', 0)
+                self._copy_method = COPY_METHODS[COPY_METHODS.index(self._copy_method) + 1]
+
+        buffer = self._get_copy_buffer()
+
+        # Small forward gaps are read through so the ISO stays a sequential stream
+        gap = offset + copied - iso_file.tell()
+        if 0 < gap <= len(buffer):
+            iso_file.readinto(buffer[:gap])
+        elif gap != 0:
+            iso_file.seek(offset + copied)
+
+        remaining = size - copied
+        while remaining > 0:
+            read = iso_file.readinto(buffer[:min(len(buffer), remaining)])
+            if not read:
+                raise OSError("Unexpected end of ISO file")
+            output_file.write(buffer[:read])
+            remaining -= read
+
+    def _copy_range_kernel(self, iso_file, output_file, offset, size):
+        """Copy a range inside the kernel with the current zero-copy method"""
+        in_fd = iso_file.fileno()
+        out_fd = output_file.fileno()
+        output_file.flush()
+        copied = 0
+
+        try:
+            while copied < size:
+                if self._copy_method == 'copy_file_range':
+                    sent = os.copy_file_range(in_fd, out_fd, size - copied, offset + copied)
+                else:
+                    sent = os.sendfile(out_fd, in_fd, offset + copied, size - copied)
+                if sent == 0:
+                    raise OSError("Unexpected end of ISO file")
+                copied += sent
+        except OSError as e:
+            e.copied = copied
+            raise
+
+        return copied
+
+    def _get_copy_buffer(self):
+        """Return the reusable copy buffer, resized to copy_buffer_size"""
+        if self._copy_buffer is None or len(self._copy_buffer) != self.copy_buffer_size:
+            self._copy_buffer = memoryview(bytearray(self.copy_buffer_size))
+        return self._copy_buffer
+
     def _extract_file(self, iso_file, file_lba, file_size, output_path):
         """Extract a single file from ISO"""
         try:
             # Create directory if it doesn't exist
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
-            # Read file data from ISO
-            iso_file.seek(file_lba * 2048)
-            
             with open(output_path, 'wb') as output_file:
-                remaining = file_size
-                while remaining > 0:
-                    chunk_size = min(8192, remaining)
-                    chunk = iso_file.read(chunk_size)
-                    if not chunk:
-                        break
-                    output_file.write(chunk)
-                    remaining -= len(chunk)
+                self._copy_range(iso_file, output_file, file_lba * 2048, file_size)
                     
         except Exception as e:
             print(f"Error extracting file {output_path}: {e}")
             
+    def _extract_extents(self, iso_file, extents, output_path):
+        """Extract a file stored as several (byte offset, length) extents"""
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+            with open(output_path, 'wb') as output_file:
+                position = 0
+                for offset, size in extents:
+                    # Unrecorded extents read as zeros and are left as holes
+                    if offset is not None:
+                        output_file.seek(position)
+                        self._copy_range(iso_file, output_file, offset, size)
+                    position += size
+                output_file.truncate(position)
+
+        except Exception as e:
+            print(f"Error extracting file {output_path}: {e}")
+
     def _copy_directory_contents(self, src_path, dst_path):
         """Copy directory contents with progress updates"""
         try:
@@ -445,8 +1138,13 @@ exit
             print(f"Error copying to USB drive: {e}")
             return False
             
-    def _copy_iso_to_usb_direct(self, iso_path, drive_letter):
-        """Copy files directly from mounted ISO to USB drive using xcopy"""
+    def _copy_iso_to_usb_direct(self, iso_path, drive_letter, split=()):
+        """Copy files directly from mounted ISO to USB drive using xcopy
+
+        Files listed in split (catalog indexes) are left out of the xcopy
+        and written as FAT32-sized pieces by _split_large_files instead.
+        """
+        exclude_path = None
         try:
             # Mount ISO using PowerShell
             mount_cmd = [
@@ -465,26 +1163,42 @@ exit
 
                 try:
                     # Update progress
-                    self._update_progress(30, "Copying files from ISO to USB...")
+                    self._phase_progress(0, "Copying files from ISO to USB...")
 
                     # Use xcopy to copy all files with /S (subdirectories) and /H (hidden files)
                     xcopy_cmd = f'xcopy "{iso_path_src}*.*" "{drive_path}" /S /H /E /I /Y'
 
-                    result = subprocess.run(
-                        xcopy_cmd,
-                        shell=True,
-                        capture_output=True,
-                        text=True,
-                        timeout=600,
-                        creationflags=subprocess.CREATE_NO_WINDOW
+                    if split:
+                        # xcopy can't quote the /EXCLUDE path, so keep it in the drive root
+                        exclude_path = os.path.join(drive_path, "split_exclude.txt")
+                        with open(exclude_path, 'w') as f:
+                            for index in split:
+                                f.write("\\" + self.catalog.paths[index].replace('/', '\\') + "\n")
+                        xcopy_cmd += f' /EXCLUDE:{exclude_path}'
+
+                    # Everything but the split files goes through xcopy
+                    xcopy_size = self.catalog.total_size() - sum(self.catalog.sizes[i] for i in split)
+                    returncode = self._run_xcopy(
+                        xcopy_cmd, drive_path, xcopy_size,
+                        timeout=max(600, os.path.getsize(iso_path) / XCOPY_MIN_RATE)
                     )
 
+                    if returncode != 0:
+                        return False
+
+                    if split:
+                        self._phase_progress(xcopy_size, "Splitting large files...")
+                        self._split_large_files(iso_path, split, drive_path, iso_path_src, xcopy_size)
+
                     # Update progress
-                    self._update_progress(70, "Files copied successfully")
+                    self._phase_progress(self.progress_model.size, "Files copied successfully")
 
-                    return result.returncode == 0
+                    return True
 
                 finally:
+                    if exclude_path and os.path.exists(exclude_path):
+                        os.remove(exclude_path)
+
                     # Unmount ISO
                     unmount_cmd = [
                         'powershell', '-Command',
@@ -498,6 +1212,165 @@ exit
             print(f"Error copying ISO to USB: {e}")
             return False
 
+    def _run_xcopy(self, xcopy_cmd, drive_path, size, timeout):
+        """Run xcopy, reporting its progress by the space used on the drive
+
+        xcopy prints nothing useful while it copies, so the drive's used
+        bytes are polled instead; they run slightly ahead of the file bytes
+        by cluster slack, so they're capped at size. Returns xcopy's exit code.
+        """
+        used_before = shutil.disk_usage(drive_path).used
+        process = subprocess.Popen(
+            xcopy_cmd,
+            shell=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            creationflags=subprocess.CREATE_NO_WINDOW
+        )
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return process.wait(timeout=XCOPY_POLL_INTERVAL)
+            except subprocess.TimeoutExpired:
+                if time.monotonic() > deadline:
+                    process.kill()
+                    process.wait()
+                    raise Exception("xcopy timed out")
+
+            copied = shutil.disk_usage(drive_path).used - used_before
+            self._phase_progress(min(max(copied, 0), size), "Copying files from ISO to USB...")
+
+    def _copy_iso_files(self, iso_path, drive_letter, split=(), journal=None):
+        """Copy every file from the ISO straight onto the drive, in ISO order
+
+        Uses the same copy routine as extraction, so there is no mount and
+        no xcopy time limit. With a journal, the copied files are flushed
+        and recorded every journal.checkpoint_interval bytes, and files an
+        interrupted run already finished are skipped. Files in split are
+        written as FAT32-sized pieces afterwards.
+        """
+        try:
+            if self.catalog is None:
+                self.catalog = ISOCatalog.from_path(iso_path)
+            catalog = self.catalog
+            target_root = f"{drive_letter}:\\"
+
+            finished = journal.verified_files(target_root) if journal is not None else set()
+            for index in catalog.directories():
+                os.makedirs(os.path.join(target_root, *catalog.paths[index].split('/')), exist_ok=True)
+
+            split = set(split)
+            indexes = [
+                index for index in sorted(catalog.files(), key=lambda i: catalog.lbas[i])
+                if index not in split and catalog.paths[index] not in finished
+            ]
+            # Files an interrupted run finished count as copied
+            copied = sum(catalog.sizes[i] for i in catalog.files() if catalog.paths[i] in finished and i not in split)
+            batch = []
+            batch_size = 0
+
+            with open(iso_path, 'rb') as iso_file:
+                for number, index in enumerate(indexes, 1):
+                    path = catalog.paths[index]
+                    size = catalog.sizes[index]
+                    extents = catalog.file_extents(index)
+                    full_path = os.path.join(target_root, *path.split('/'))
+
+                    # The journal hashes a file's last bytes; those are read
+                    # once, in ISO order, and written from the same buffer
+                    tail_start = max(0, size - FILE_BOUNDARY_SIZE) if journal is not None else size
+
+                    with open(full_path, 'wb') as output_file:
+                        position = 0
+                        for offset, length in slice_extents(extents, 0, tail_start):
+                            # Unrecorded extents read as zeros and are left as holes
+                            if offset is not None:
+                                output_file.seek(position)
+                                self._copy_range(iso_file, output_file, offset, length)
+                            position += length
+
+                        tail = self._read_extents(iso_file, extents, tail_start, size - tail_start)
+                        output_file.seek(tail_start)
+                        output_file.write(tail)
+                        output_file.truncate(size)
+                    copied += size
+
+                    if journal is not None:
+                        journal.add_file(path, size, tail)
+                        batch.append(full_path)
+                        batch_size += size
+                        if batch_size >= journal.checkpoint_interval:
+                            self._flush_files(batch)
+                            journal.commit()
+                            batch = []
+                            batch_size = 0
+
+                    self._phase_progress(copied, f"Copying files to USB... ({path})",
+                                         files_done=number, files_total=len(indexes), path=path)
+
+            if journal is not None and batch:
+                self._flush_files(batch)
+                journal.commit()
+
+            if split:
+                self._phase_progress(copied, "Splitting large files...")
+                self._split_large_files(iso_path, sorted(split), target_root, None, copied)
+
+            return True
+
+        except Exception as e:
+            print(f"Error copying files to USB drive: {e}")
+            return False
+
+    def _read_extents(self, iso_file, extents, start, length):
+        """Read length bytes at start of a file made of (offset, length) extents"""
+        parts = []
+        for offset, size in slice_extents(extents, start, length):
+            if offset is None:
+                parts.append(bytes(size))
+            else:
+                iso_file.seek(offset)
+                data = iso_file.read(size)
+                if len(data) < size:
+                    raise OSError("Unexpected end of ISO file")
+                parts.append(data)
+        return b''.join(parts)
+
+    def _flush_files(self, paths):
+        """Make sure copied files reached the drive before the journal says so"""
+        for path in paths:
+            with open(path, 'rb+') as f:
+                os.fsync(f.fileno())
+
+    def _split_large_files(self, iso_path, indexes, target_root, mounted_root=None, copied=0):
+        """Write each file in indexes to target_root as FAT32-sized pieces
+
+        Data streams straight from the ISO into the pieces, so nothing is
+        staged in temp_dir. Records the pieces in self.split_files for
+        verification (None for WIMs that DISM turned into .swm parts).
+        Progress continues the copy phase from the copied bytes before them.
+        """
+        splitter = FileSplitter(copy_range=self._copy_range)
+        if self.split_chunk_size:
+            splitter.chunk_size = self.split_chunk_size
+        done = copied
+
+        with open(iso_path, 'rb') as iso_file:
+            for index in indexes:
+                path = self.catalog.paths[index]
+                size = self.catalog.sizes[index]
+                target_path = os.path.join(target_root, *path.split('/'))
+                mounted_path = os.path.join(mounted_root, *path.split('/')) if mounted_root else None
+
+                def report(progress, status, done=done, size=size):
+                    self._phase_progress(done + size * progress / 100, status)
+
+                self.split_files[index] = splitter.split(
+                    iso_file, self.catalog.file_extents(index), size, target_path, mounted_path, report
+                )
+                done += size
+
     def _cleanup_temp_dir(self):
         """Clean up temporary directory"""
         if self.temp_dir and os.path.exists(self.temp_dir):
@@ -517,14 +1390,20 @@ exit
             # Check for different boot methods
             boot_files_found = []
             
+            # Prefer the ISO catalog when we have one, it avoids touching the drive
+            if self.catalog is not None:
+                exists = self.catalog.exists
+            else:
+                exists = lambda name: os.path.exists(os.path.join(drive_path, name))
+
             # Check for Windows boot files
-            if os.path.exists(os.path.join(drive_path, "bootmgr")):
+            if exists("bootmgr"):
                 boot_files_found.append("bootmgr")
-            if os.path.exists(os.path.join(drive_path, "boot")):
+            if exists("boot"):
                 boot_files_found.append("boot_folder")
-            if os.path.exists(os.path.join(drive_path, "efi")):
+            if exists("efi"):
                 boot_files_found.append("efi")
-            if os.path.exists(os.path.join(drive_path, "isolinux")):
+            if exists("isolinux"):
                 boot_files_found.append("isolinux")
                 
             # Make partition active using diskpart
@@ -543,35 +1422,20 @@ exit
             return True  # Don't fail the entire process for boot setup issues
             
     def _make_partition_active(self, drive_letter):
-        """Mark the partition as active using diskpart"""
+        """Mark the first partition as active in the disk's MBR"""
         try:
-            disk_num = self._get_disk_number(drive_letter)
-            
-            diskpart_script = f"""
-select disk {disk_num}
-select partition 1
-active
-exit
-"""
-            
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-                f.write(diskpart_script)
-                script_path = f.name
-                
-            try:
-                subprocess.run(
-                    ['diskpart', '/s', script_path], 
-                    capture_output=True, 
-                    timeout=60,
-                    creationflags=subprocess.CREATE_NO_WINDOW
-                )
-                return True
-            finally:
-                try:
-                    os.unlink(script_path)
-                except:
-                    pass
-                    
+            disk_number = self._get_disk_number(drive_letter, fallback=None)
+            if disk_number is None:
+                raise Exception("Could not determine the disk of the USB drive")
+
+            # Sector 0 lies outside every volume, so the drive can stay mounted
+            disk_path = f"\\\\.\\PhysicalDrive{disk_number}"
+            with open(disk_path, 'r+b', buffering=0) as disk:
+                changed = set_active_partition(disk, 0)
+            if changed:
+                self._update_disk_properties(disk_path)
+            return True
+
         except Exception as e:
             print(f"Error making partition active: {e}")
             return True
@@ -0,0 +1,547 @@
+import stat
+import struct
+from array import array
+
+from core.udf_reader import UDFReader, CHAR_DIRECTORY, CHAR_HIDDEN, FILE_TYPE_SYMLINK
+from core.volume_descriptors import VolumeDescriptorSet
+
+SECTOR_SIZE = 2048
+
+# Fixed 33-byte part of an ISO 9660 directory record (both-endian fields
+# are read from their little-endian half only)
+DIR_RECORD = struct.Struct('<BxI4xI4x7xB6xB')
+
+# L-path table entry header: name length, extended attribute length,
+# extent LBA and parent directory number
+PATH_TABLE_ENTRY = struct.Struct('<BxIH')
+
+FLAG_HIDDEN = 0x01
+FLAG_DIRECTORY = 0x02
+FLAG_MULTI_EXTENT = 0x80
+
+NAME_SOURCES = ("rockridge", "udf", "joliet", "iso9660")
+
+# Name sources whose lookups ignore case, as Windows does for them
+CASE_INSENSITIVE_NAMES = ("joliet", "iso9660")
+
+
+def iter_directory_records(dir_data):
+    """Yield (lba, size, flags, name, system_use) for every record of a directory extent"""
+    data = memoryview(dir_data)
+    offset = 0
+
+    while offset + 33 <= len(data):
+        record_length = data[offset]
+        if record_length == 0:
+            # Records never span sectors; skip the padding to the next one
+            sector_offset = offset % SECTOR_SIZE
+            if sector_offset == 0:
+                break
+            offset += SECTOR_SIZE - sector_offset
+            continue
+
+        if offset + record_length > len(data):
+            break
+
+        _, lba, size, flags, name_len = DIR_RECORD.unpack_from(data, offset)
+        name = bytes(data[offset + 33:offset + 33 + name_len])
+
+        # System use area follows the name, padded to an even offset
+        system_use_start = offset + 33 + name_len + (1 - name_len % 2)
+        system_use = data[system_use_start:offset + record_length]
+
+        yield lba, size, flags, name, system_use
+        offset += record_length
+
+
+def decode_name(name, joliet):
+    """Decode an ISO 9660 or Joliet file identifier, dropping the ;1 version"""
+    if joliet:
+        filename = name.decode('utf-16-be', errors='replace')
+    else:
+        filename = name.decode('ascii', errors='replace')
+
+    if ';' in filename:
+        filename = filename.split(';')[0]
+        # "README." is how level 1 stores names without an extension
+        if filename.endswith('.') and not joliet:
+            filename = filename[:-1]
+    return filename
+
+
+def read_rock_ridge(system_use, skip, iso_file):
+    """Decode Rock Ridge NM/PX/SL/CL/RE entries, following CE continuation areas
+
+    Returns (name, mode, symlink_target, child_link, relocated). The first
+    four are None when absent; child_link is the LBA of a directory that
+    was moved out of a too-deep tree and left this placeholder (CL), and
+    relocated is True for such a moved directory in its new place (RE).
+    """
+    name_parts = []
+    link_parts = None
+    mode = None
+    child_link = None
+    relocated = False
+    areas = [system_use[skip:]]
+
+    while areas:
+        data = areas.pop(0)
+        offset = 0
+
+        while offset + 4 <= len(data):
+            signature = bytes(data[offset:offset + 2])
+            length = data[offset + 2]
+            if length < 4 or offset + length > len(data):
+                break
+            body = data[offset + 4:offset + length]
+
+            if signature == b'NM' and len(body) >= 1:
+                # Skip the "." and ".." aliases
+                if not body[0] & 0x06:
+                    name_parts.append(bytes(body[1:]))
+            elif signature == b'PX' and len(body) >= 8:
+                mode = struct.unpack_from('<I', body, 0)[0]
+            elif signature == b'SL' and len(body) >= 1:
+                if link_parts is None:
+                    link_parts = []
+                link_parts.extend(_symlink_components(body[1:]))
+            elif signature == b'CL' and len(body) >= 4:
+                child_link = struct.unpack_from('<I', body, 0)[0]
+            elif signature == b'RE':
+                relocated = True
+            elif signature == b'CE' and len(body) >= 24 and iso_file is not None:
+                block, area_offset, area_length = struct.unpack_from('<I4xI4xI', body, 0)
+                position = iso_file.tell()
+                iso_file.seek(block * SECTOR_SIZE + area_offset)
+                areas.append(memoryview(iso_file.read(area_length)))
+                iso_file.seek(position)
+            elif signature == b'ST':
+                break
+
+            offset += length
+
+    name = b''.join(name_parts).decode('utf-8', errors='replace') if name_parts else None
+    symlink = None
+    if link_parts is not None:
+        symlink = '/'.join(link_parts)
+        if symlink.startswith('//'):
+            symlink = symlink[1:]
+    return name, mode, symlink, child_link, relocated
+
+
+def _symlink_components(data):
+    """Split the component records of an SL entry"""
+    components = []
+    offset = 0
+    while offset + 2 <= len(data):
+        flags = data[offset]
+        length = data[offset + 1]
+        content = bytes(data[offset + 2:offset + 2 + length]).decode('utf-8', errors='replace')
+        if flags & 0x02:
+            content = '.'
+        elif flags & 0x04:
+            content = '..'
+        elif flags & 0x08:
+            content = '/'
+        components.append(content)
+        offset += 2 + length
+    return components
+
+
+def directory_size(iso_file, lba):
+    """Size of a directory extent, from its own "." record"""
+    iso_file.seek(lba * SECTOR_SIZE)
+    for _, size, _, _, _ in iter_directory_records(iso_file.read(SECTOR_SIZE)):
+        return size
+    return SECTOR_SIZE
+
+
+def rock_ridge_skip(iso_file, root_lba):
+    """Return the SUSP skip length if the tree uses Rock Ridge, otherwise None"""
+    iso_file.seek(root_lba * SECTOR_SIZE)
+    for _, _, _, name, system_use in iter_directory_records(iso_file.read(SECTOR_SIZE)):
+        # The SP entry sits in the root's "." record
+        if name == b'\x00' and len(system_use) >= 7 and bytes(system_use[0:2]) == b'SP' \
+                and bytes(system_use[4:6]) == b'\xBE\xEF':
+            return system_use[6]
+        break
+    return None
+
+
+class ISOCatalog:
+    """In-memory index of every entry in an ISO 9660 directory tree
+
+    Entries are stored in parallel arrays so that tens of thousands of
+    records cost a few hundred kilobytes. Index 0 is always the root
+    directory; paths are relative, '/' separated and keep the case found
+    in the image. Names come from Rock Ridge when present, then UDF (the
+    only tree that describes files over 4 GiB on Windows images), then
+    Joliet, then plain ISO 9660. Files whose data isn't one contiguous
+    extent keep their (byte offset, length) extents in self.extents.
+    """
+
+    def __init__(self):
+        self.paths = []
+        self.lbas = array('Q')
+        self.sizes = array('Q')
+        self.flags = array('B')
+        self.parents = array('l')
+        self.links = {}
+        self.extents = {}
+        self.name_source = "iso9660"
+        self._lookup = None
+        self._folded = None
+
+    @classmethod
+    def from_path(cls, iso_path, names="auto"):
+        """Build a catalog from an ISO file on disk"""
+        with open(iso_path, 'rb') as iso_file:
+            return cls.from_file(iso_file, names)
+
+    @classmethod
+    def from_file(cls, iso_file, names="auto"):
+        """Build a catalog from an open ISO file
+
+        names is "auto" or one of NAME_SOURCES to force a naming scheme.
+        """
+        descriptors = VolumeDescriptorSet.from_file(iso_file)
+        if not descriptors.valid:
+            raise Exception("Invalid ISO format")
+
+        pvd = descriptors.primary
+        skip = None
+        if names in ("auto", "rockridge") and pvd is not None:
+            skip = rock_ridge_skip(iso_file, pvd.root_lba)
+
+        if skip is None and names in ("auto", "udf") and descriptors.udf:
+            try:
+                catalog = cls()
+                catalog.name_source = "udf"
+                catalog._walk_udf(UDFReader(iso_file))
+                return catalog
+            except Exception as e:
+                if pvd is None or names == "udf":
+                    raise
+                # Fall back to the ISO 9660 tree of the bridge image
+                print(f"Error reading UDF file system: {e}")
+
+        if pvd is None:
+            raise Exception("Invalid ISO format")
+
+        catalog = cls()
+        descriptor = pvd
+        if skip is not None:
+            catalog.name_source = "rockridge"
+        elif names in ("auto", "joliet") and descriptors.joliet is not None:
+            catalog.name_source = "joliet"
+            descriptor = descriptors.joliet
+
+        catalog._add('', descriptor.root_lba, descriptor.root_size, FLAG_DIRECTORY, -1)
+        catalog._walk(iso_file, skip)
+        return catalog
+
+    def _add(self, path, lba, size, flags, parent):
+        self.paths.append(path)
+        self.lbas.append(lba)
+        self.sizes.append(size)
+        self.flags.append(flags)
+        self.parents.append(parent)
+        return len(self.paths) - 1
+
+    def _walk(self, iso_file, susp_skip):
+        """Breadth-first walk reading each level's directory extents in LBA order"""
+        level = [0]
+
+        while level:
+            next_level = []
+
+            for index in sorted(level, key=lambda i: self.lbas[i]):
+                iso_file.seek(self.lbas[index] * SECTOR_SIZE)
+                dir_data = iso_file.read(self.sizes[index])
+
+                for child in self._parse_directory(dir_data, index, iso_file, susp_skip):
+                    if self.flags[child] & FLAG_DIRECTORY and self.sizes[child] > 0:
+                        next_level.append(child)
+
+            level = next_level
+
+    def _parse_directory(self, dir_data, parent, iso_file, susp_skip):
+        """Add the records of one directory extent and return the new indexes"""
+        added = []
+        parent_path = self.paths[parent]
+        joliet = self.name_source == "joliet"
+        pending = None
+
+        for lba, size, flags, name, system_use in iter_directory_records(dir_data):
+            # Skip . and .. entries
+            if name in (b'\x00', b'\x01') or not name:
+                continue
+
+            filename = None
+            symlink = None
+            if susp_skip is not None:
+                filename, mode, symlink, child_link, relocated = read_rock_ridge(system_use, susp_skip, iso_file)
+                if mode is not None and stat.S_ISLNK(mode) and symlink is None:
+                    symlink = ''
+
+                # A relocated directory is listed where its CL placeholder
+                # is, not again in the relocation directory
+                if relocated:
+                    continue
+                if child_link is not None:
+                    lba = child_link
+                    size = directory_size(iso_file, lba)
+                    flags |= FLAG_DIRECTORY
+            if filename is None:
+                filename = decode_name(name, joliet)
+
+            # Files larger than 4 GiB are stored as several consecutive
+            # records with the same name; fold them into a single entry.
+            # Their extents usually follow on from each other, but nothing
+            # requires it, so any other layout is kept as an extent list
+            if pending is not None and self.paths[pending].rsplit('/', 1)[-1] == filename:
+                extents = self.file_extents(pending)
+                offset, length = extents[-1]
+                if lba * SECTOR_SIZE == offset + length:
+                    extents[-1] = (offset, length + size)
+                else:
+                    extents.append((lba * SECTOR_SIZE, size))
+                if len(extents) > 1:
+                    self.extents[pending] = extents
+                self.sizes[pending] += size
+            else:
+                path = f"{parent_path}/{filename}" if parent_path else filename
+                pending = self._add(path, lba, size, flags & ~FLAG_MULTI_EXTENT, parent)
+                added.append(pending)
+                if symlink is not None:
+                    self.links[pending] = symlink
+
+            if not flags & FLAG_MULTI_EXTENT:
+                pending = None
+
+        return added
+
+    def _walk_udf(self, reader):
+        """Breadth-first walk of a UDF tree, reading file entries in block order"""
+        _, size, extents = reader.read_entry(reader.root_icb)
+        self._add_extents('', size, extents, FLAG_DIRECTORY, -1)
+        level = [0]
+
+        while level:
+            next_level = []
+
+            for index in sorted(level, key=lambda i: self.lbas[i]):
+                dir_data = reader.read_extents(self.file_extents(index))
+                parent_path = self.paths[index]
+
+                for name, characteristics, icb in sorted(reader.iter_directory(dir_data), key=lambda e: e[2]):
+                    file_type, size, extents = reader.read_entry(icb)
+
+                    flags = 0
+                    if characteristics & CHAR_DIRECTORY:
+                        flags |= FLAG_DIRECTORY
+                    if characteristics & CHAR_HIDDEN:
+                        flags |= FLAG_HIDDEN
+
+                    path = f"{parent_path}/{name}" if parent_path else name
+                    child = self._add_extents(path, size, extents, flags, index)
+
+                    if file_type == FILE_TYPE_SYMLINK:
+                        self.links[child] = reader.symlink_target(reader.read_extents(extents))
+                    elif flags & FLAG_DIRECTORY and size > 0:
+                        next_level.append(child)
+
+            level = next_level
+
+    def _add_extents(self, path, size, extents, flags, parent):
+        """Add an entry from (byte offset, length) extents
+
+        Data that is one sector-aligned extent is stored as an LBA like
+        any ISO 9660 file; anything else also keeps its extent list.
+        """
+        first = next((position for position, _ in extents if position is not None), 0)
+        index = self._add(path, first // SECTOR_SIZE, size, flags, parent)
+        if len(extents) > 1 or (extents and (extents[0][0] is None or extents[0][0] % SECTOR_SIZE)):
+            self.extents[index] = extents
+        return index
+
+    def __len__(self):
+        return len(self.paths)
+
+    def is_directory(self, index):
+        """Check if the entry at index is a directory"""
+        return bool(self.flags[index] & FLAG_DIRECTORY)
+
+    def is_fragmented(self, index):
+        """Check if the entry's data is not one contiguous extent"""
+        return index in self.extents
+
+    def file_extents(self, index):
+        """Return the (byte offset, length) extents of an entry's data
+
+        The offset is None for extents that read as zeros.
+        """
+        if index in self.extents:
+            return self.extents[index]
+        return [(self.lbas[index] * SECTOR_SIZE, self.sizes[index])]
+
+    def is_symlink(self, index):
+        """Check if the entry at index is a Rock Ridge symbolic link"""
+        return index in self.links
+
+    def find(self, path):
+        """Return the index of path or None
+
+        An exact match wins. Plain ISO 9660 and Joliet names are also
+        matched case-insensitively, like Windows does; Rock Ridge names
+        are POSIX names that may differ only by case, so they must match
+        exactly.
+        """
+        if self._lookup is None:
+            self._lookup = {p: i for i, p in enumerate(self.paths)}
+            self._folded = {}
+            if self.name_source in CASE_INSENSITIVE_NAMES:
+                for i, p in enumerate(self.paths):
+                    self._folded.setdefault(p.lower(), i)
+
+        path = path.replace('\\', '/').strip('/')
+        index = self._lookup.get(path)
+        return index if index is not None else self._folded.get(path.lower())
+
+    def exists(self, path):
+        """Check if path exists in the image"""
+        return self.find(path) is not None
+
+    def directories(self):
+        """Yield indexes of all directories except the root"""
+        for index in range(1, len(self.paths)):
+            if self.flags[index] & FLAG_DIRECTORY:
+                yield index
+
+    def files(self):
+        """Yield indexes of all regular files (symbolic links excluded)"""
+        for index in range(1, len(self.paths)):
+            if not self.flags[index] & FLAG_DIRECTORY and index not in self.links:
+                yield index
+
+    def file_count(self):
+        """Number of regular files in the image"""
+        return sum(1 for _ in self.files())
+
+    def total_size(self):
+        """Total size in bytes of all regular files"""
+        return sum(self.sizes[i] for i in self.files())
+
+    def extent_runs(self, max_gap=64 * 1024):
+        """Group file extents into LBA-ordered runs that can be read sequentially
+
+        Returns a list of (run_start, run_end, extents) where offsets are in
+        bytes and extents is a list of (offset, size, index). Extents that
+        are closer than max_gap bytes share a run. Extents overlapping an
+        earlier one (hard links, deduplicated data) start a new run so that
+        every run can be streamed front to back without seeking backwards.
+        Fragmented files (see file_extents) are left out.
+        """
+        extents = sorted(
+            (self.lbas[i] * SECTOR_SIZE, self.sizes[i], i)
+            for i in self.files() if self.sizes[i] > 0 and i not in self.extents
+        )
+
+        runs = []
+        for offset, size, index in extents:
+            if runs and runs[-1][1] <= offset <= runs[-1][1] + max_gap:
+                run = runs[-1]
+                run[1] = offset + size
+                run[2].append((offset, size, index))
+            else:
+                runs.append([offset, offset + size, [(offset, size, index)]])
+
+        return [tuple(run) for run in runs]
+
+
+class PathTableIndex:
+    """Single-path lookups through the ISO's L-path table
+
+    The path table lists every directory with its parent, so resolving
+    /efi/boot/bootx64.efi takes one dictionary hop per directory level and
+    a single read of the final directory extent, instead of walking the
+    whole tree. Uses the Joliet table when the image has one.
+    """
+
+    def __init__(self, iso_file, descriptor):
+        self.iso_file = iso_file
+        self.joliet = descriptor.is_joliet
+        self.root_lba = descriptor.root_lba
+        self.directory_lbas = [None]
+        self._children = {}
+
+        iso_file.seek(descriptor.l_path_table * SECTOR_SIZE)
+        self._parse(iso_file.read(descriptor.path_table_size))
+
+    @classmethod
+    def from_file(cls, iso_file):
+        """Build the index from an open ISO file"""
+        descriptors = VolumeDescriptorSet.from_file(iso_file)
+        if descriptors.primary is None:
+            raise Exception("Invalid ISO format")
+        return cls(iso_file, descriptors.joliet or descriptors.primary)
+
+    def _parse(self, table):
+        """Index path table entries; directory numbers start at 1 (the root)"""
+        offset = 0
+        while offset + 8 <= len(table):
+            name_len, lba, parent = PATH_TABLE_ENTRY.unpack_from(table, offset)
+            if name_len == 0:
+                break
+            name = table[offset + 8:offset + 8 + name_len]
+            number = len(self.directory_lbas)
+            self.directory_lbas.append(lba)
+
+            if number > 1:
+                self._children[(parent, decode_name(name, self.joliet).lower())] = number
+
+            offset += 8 + name_len + (name_len % 2)
+
+    def lookup(self, path):
+        """Return (lba, size, is_directory) for path (case-insensitive), or None"""
+        components = [c.lower() for c in path.replace('\\', '/').split('/') if c]
+        if not components:
+            return self.root_lba, self._directory_size(self.root_lba), True
+
+        # Walk the directory part through the path table
+        directory = 1
+        for component in components[:-1]:
+            directory = self._children.get((directory, component))
+            if directory is None:
+                return None
+
+        # The last component may itself be a directory in the table
+        child = self._children.get((directory, components[-1]))
+        if child is not None:
+            lba = self.directory_lbas[child]
+            return lba, self._directory_size(lba), True
+
+        # Otherwise scan the parent directory's records for the file
+        parent_lba = self.directory_lbas[directory]
+        parent_size = self._directory_size(parent_lba)
+        self.iso_file.seek(parent_lba * SECTOR_SIZE)
+        dir_data = self.iso_file.read(parent_size)
+
+        result = None
+        for lba, size, flags, name, _ in iter_directory_records(dir_data):
+            if name in (b'\x00', b'\x01'):
+                continue
+            if result is not None:
+                # Continuation records of a multi-extent file
+                if decode_name(name, self.joliet).lower() != components[-1]:
+                    break
+                result = (result[0], result[1] + size, False)
+            elif decode_name(name, self.joliet).lower() == components[-1]:
+                result = (lba, size, bool(flags & FLAG_DIRECTORY))
+            if result is not None and not flags & FLAG_MULTI_EXTENT:
+                break
+
+        return result
+
+    def _directory_size(self, lba):
+        return directory_size(self.iso_file, lba)
@@ -1,33 +1,79 @@
+import io
 import os
-import struct
-import subprocess
-from pathlib import Path
+
+from core.boot_catalog import BootInfo
+from core.checksum import find_checksum_file, parse_checksum_file, hash_file
+from core.compressed_image import is_compressed, read_prefix, strip_compression
+from core.metadata_cache import MetadataCache
+from core.volume_descriptors import VolumeDescriptorSet
+
+# Bumped whenever the cached metadata layout changes
+METADATA_FORMAT = 4
+
+# Decompressed bytes scanned for the descriptors and boot catalog of a
+# compressed image; both sit near the start of real images
+COMPRESSED_METADATA_SIZE = 4 * 1024 * 1024
 
 class ISOHandler:
-    def __init__(self):
-        pass
+    def __init__(self, cache=None):
+        # Parsed ISO metadata, shared by all the query methods below
+        self.cache = cache if cache is not None else MetadataCache()
         
+    def get_metadata(self, iso_path):
+        """Get parsed ISO metadata, reading the image only on a cache miss"""
+        metadata = self.cache.get(iso_path)
+        if metadata is not None and metadata.get('format') == METADATA_FORMAT:
+            return metadata
+
+        # Keep anything else cached for this file (e.g. checksums)
+        metadata = dict(metadata or {})
+        metadata.update(self._read_metadata(iso_path))
+        self.cache.put(iso_path, metadata)
+        return metadata
+
+    def _read_metadata(self, iso_path):
+        """Read the volume descriptor set and boot catalog with a single open"""
+        if is_compressed(iso_path):
+            f = io.BytesIO(read_prefix(iso_path, COMPRESSED_METADATA_SIZE))
+        else:
+            f = open(iso_path, 'rb')
+
+        with f:
+            descriptors = VolumeDescriptorSet.from_file(f)
+            catalog_lba = descriptors.boot_record.boot_catalog_lba if descriptors.el_torito else None
+            boot = BootInfo.from_file(f, catalog_lba)
+
+        pvd = descriptors.primary
+
+        metadata = {
+            'format': METADATA_FORMAT,
+            'valid': descriptors.valid,
+            'bootable': boot.bootable,
+            'volume_name': None,
+            'creation_date': None,
+            'joliet': descriptors.joliet is not None,
+            'udf': descriptors.udf,
+            'boot': boot.to_dict()
+        }
+
+        if pvd is not None:
+            metadata['volume_name'] = pvd.volume_id
+            metadata['creation_date'] = pvd.creation_date
+
+        return metadata
+
     def validate_iso(self, iso_path):
         """Validate if the file is a valid ISO"""
         try:
             if not os.path.exists(iso_path):
                 return False
                 
-            # Check file extension
-            if not iso_path.lower().endswith('.iso'):
+            # Check file extension (image.iso, or compressed as image.iso.xz etc.)
+            if not strip_compression(iso_path).lower().endswith('.iso'):
                 return False
                 
-            # Check ISO signature
-            with open(iso_path, 'rb') as f:
-                # Skip to sector 16 (ISO 9660 primary volume descriptor)
-                f.seek(16 * 2048)
-                data = f.read(6)
-                
-                # Check for ISO 9660 signature
-                if data[1:6] == b'CD001':
-                    return True
-                    
-            return False
+            # Check ISO 9660 signature
+            return self.get_metadata(iso_path)['valid']
             
         except Exception:
             return False
@@ -35,47 +81,65 @@ class ISOHandler:
     def is_bootable(self, iso_path):
         """Check if ISO is bootable"""
         try:
-            with open(iso_path, 'rb') as f:
-                # Check for El Torito boot record
-                f.seek(17 * 2048)  # Boot record volume descriptor
-                data = f.read(2048)
-                
-                # Look for El Torito signature
-                if b'EL TORITO SPECIFICATION' in data:
-                    return True
-                    
-                # Alternative check for boot signature
-                f.seek(0x8000)  # Common boot sector location
-                boot_data = f.read(512)
-                
-                # Check for boot signature (0x55AA at end of boot sector)
-                if len(boot_data) >= 512 and boot_data[510:512] == b'\x55\xAA':
-                    return True
-                    
-            return False
+            return self.get_metadata(iso_path)['bootable']
             
         except Exception:
             return False
             
+    def get_boot_info(self, iso_path):
+        """Get decoded boot entries, BIOS/UEFI support and recommended settings"""
+        try:
+            return self.get_metadata(iso_path)['boot']
+            
+        except Exception:
+            return None
+            
     def get_volume_name(self, iso_path):
         """Extract volume name from ISO"""
         try:
-            with open(iso_path, 'rb') as f:
-                # Go to primary volume descriptor
-                f.seek(16 * 2048)
-                data = f.read(2048)
-                
-                # Volume identifier is at offset 40, 32 bytes long
-                if len(data) >= 72:
-                    volume_name = data[40:72].decode('ascii', errors='ignore').strip()
-                    if volume_name:
-                        return volume_name
-                        
-            return None
+            return self.get_metadata(iso_path)['volume_name']
             
         except Exception:
             return None
             
+    def verify_checksum(self, iso_path, checksum_path=None, progress_callback=None):
+        """Verify ISO against a SHA256SUMS/.sha256/.md5 style checksum file
+
+        Returns None if no usable checksum was found, otherwise a dict with
+        the algorithm, expected and actual digests and whether they match.
+        """
+        try:
+            if checksum_path is None:
+                checksum_path = find_checksum_file(iso_path)
+                if checksum_path is None:
+                    return None
+
+            entry = parse_checksum_file(checksum_path, os.path.basename(iso_path))
+            if entry is None or entry[0] is None:
+                return None
+
+            algorithm, expected = entry
+
+            # Digests are kept with the rest of the ISO metadata
+            digests = dict((self.cache.get(iso_path) or {}).get('digests', {}))
+            actual = digests.get(algorithm)
+            if actual is None:
+                actual = hash_file(iso_path, (algorithm,), progress_callback=progress_callback)[algorithm]
+                digests[algorithm] = actual
+                self.cache.update(iso_path, digests=digests)
+
+            return {
+                'checksum_file': checksum_path,
+                'algorithm': algorithm,
+                'expected': expected,
+                'actual': actual,
+                'match': actual == expected
+            }
+
+        except Exception as e:
+            print(f"Error verifying ISO checksum: {e}")
+            return None
+
     def get_iso_info(self, iso_path):
         """Get comprehensive ISO information"""
         info = {
@@ -99,21 +163,11 @@ class ISOHandler:
             if not info['valid']:
                 return info
                 
-            # Check if bootable
-            info['bootable'] = self.is_bootable(iso_path)
-            
-            # Get volume name
-            info['volume_name'] = self.get_volume_name(iso_path)
-            
-            # Get creation date from ISO
-            with open(iso_path, 'rb') as f:
-                f.seek(16 * 2048)
-                data = f.read(2048)
-                
-                # Creation date is at offset 813, 17 bytes
-                if len(data) >= 830:
-                    date_str = data[813:830].decode('ascii', errors='ignore')
-                    info['creation_date'] = date_str
+            # Everything else comes from the same cached parse
+            metadata = self.get_metadata(iso_path)
+            info['bootable'] = metadata['bootable']
+            info['volume_name'] = metadata['volume_name']
+            info['creation_date'] = metadata['creation_date']
                     
         except Exception as e:
             print(f"Error getting ISO info: {e}")
@@ -0,0 +1,111 @@
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+CACHE_FILE_NAME = "iso_metadata.json"
+CACHE_VERSION = 1
+
+
+def default_cache_dir():
+    """Per-user cache directory for Lahiri ISO Flasher"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+        return os.path.join(base, "LahiriISOFlasher", "Cache")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "lahiri-iso-flasher")
+
+
+class MetadataCache:
+    """LRU map of per-file metadata, persisted as JSON in the user cache dir
+
+    Entries are keyed by absolute path and only returned while the file's
+    size, mtime and inode still match what was recorded, so a replaced or
+    modified image is parsed again automatically.
+    """
+
+    def __init__(self, path=None, max_entries=512, persistent=True):
+        self.path = path or os.path.join(default_cache_dir(), CACHE_FILE_NAME)
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = not persistent
+
+    def get(self, file_path):
+        """Return the cached metadata dict for file_path, or None"""
+        try:
+            identity = self._identity(file_path)
+        except OSError:
+            return None
+
+        with self._lock:
+            self._load()
+            key = identity[0]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if entry['identity'] != list(identity[1:]):
+                # File changed since it was cached
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return entry['metadata']
+
+    def put(self, file_path, metadata):
+        """Store metadata for file_path and write the cache to disk"""
+        try:
+            identity = self._identity(file_path)
+        except OSError:
+            return
+
+        with self._lock:
+            self._load()
+            self._entries[identity[0]] = {'identity': list(identity[1:]), 'metadata': metadata}
+            self._entries.move_to_end(identity[0])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def update(self, file_path, **values):
+        """Merge values into the cached metadata of file_path"""
+        metadata = dict(self.get(file_path) or {})
+        metadata.update(values)
+        self.put(file_path, metadata)
+
+    def _identity(self, file_path):
+        info = os.stat(file_path)
+        return (os.path.abspath(file_path), info.st_size, info.st_mtime_ns, info.st_ino)
+
+    def _load(self):
+        """Load the on-disk store once, ignoring a missing or corrupt file"""
+        if self._loaded:
+            return
+        self._loaded = True
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                self._entries.update(data.get('entries', {}))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Ignoring unreadable metadata cache: {e}")
+
+    def _save(self):
+        """Atomically replace the on-disk store"""
+        if not self.persistent:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': CACHE_VERSION, 'entries': self._entries}, f)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"Error saving metadata cache: {e}")
@@ -0,0 +1,372 @@
+import mmap
+import os
+import queue
+import threading
+import time
+
+from core.compressed_image import is_compressed, open_image
+from core.raw_writer import RawImageWriter, SECTOR_ALIGNMENT
+
+# Buffers in the shared ring: how many blocks the fastest target may run
+# ahead of the slowest one
+DEFAULT_WINDOW = 8
+
+# Seconds a target may spend on one block before it is failed as hung
+STALL_TIMEOUT = 60.0
+
+# How often the reader checks for hung targets while it waits for a buffer
+STALL_CHECK_INTERVAL = 1.0
+
+
+class TargetWriter(RawImageWriter):
+    """One target of a MultiTargetWriter, with its own writer thread and counters"""
+
+    def __init__(self, target_path, settings):
+        super().__init__(
+            buffer_size=settings.buffer_size,
+            direct=settings.direct,
+            fsync_policy=settings.fsync_policy,
+            fsync_interval=settings.fsync_interval,
+            skip_zeros=settings.skip_zeros,
+            target_zeroed=settings.target_zeroed
+        )
+        self.target_path = target_path
+        self.error = None
+        self.queue = queue.Queue()
+        self.thread = None
+        self.held = set()  # Shared buffers queued on this target and not yet released
+        self.busy_since = None
+        self.busy_slot = None
+        self.stalled = False
+        self.running = False
+        # Guards error, busy_* and running between the writer thread and the reader
+        self.lock = threading.Lock()
+        self._close_on_exit = False
+        self._fd = None
+        self._aligned = False
+        self._skip = False
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+    def open(self):
+        self._fd, self._aligned = self._open_target(self.target_path)
+        self._skip = self.skip_zeros and (self.target_zeroed or self._is_empty_file(self._fd))
+
+    def run(self, release):
+        """Writer thread: write queued (data, length, slot) blocks until None
+
+        After a failure the remaining blocks are only released, so the
+        shared buffers keep flowing to the other targets. busy_since is
+        when the block being written was started, None while idle. If
+        finish() found the thread still busy, it closes the target itself.
+        """
+        start = time.perf_counter()
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                item = self.queue.get()
+                self.writer_stall_time += time.perf_counter() - wait_start
+
+                if item is None:
+                    break
+
+                data, read, slot = item
+                with self.lock:
+                    writing = self.error is None
+                    if writing:
+                        self.busy_since = time.monotonic()
+                        self.busy_slot = slot
+                if writing:
+                    try:
+                        self._write_block(self._fd, data, read, self._aligned, self._skip)
+                    except Exception as e:
+                        with self.lock:
+                            # A hung write that returns after all was already reported
+                            if not self.stalled:
+                                print(f"Error writing to {self.target_path}: {e}")
+                                self.error = e
+                    finally:
+                        with self.lock:
+                            self.busy_since = None
+                            self.busy_slot = None
+                if slot is not None:
+                    release(self, slot)
+        finally:
+            self.elapsed = time.perf_counter() - start
+            with self.lock:
+                self.running = False
+                close = self._close_on_exit
+            if close:
+                self._close()
+
+    def finish(self, total):
+        """Trim or extend file targets, flush and close"""
+        if self._fd is None:
+            return
+
+        with self.lock:
+            if self.running:
+                # A hung write still uses the fd; the thread closes it once the write returns
+                self._close_on_exit = True
+                return
+
+        try:
+            if self.error is None:
+                self._fix_file_size(self._fd, total)
+                if self.fsync_policy != "none":
+                    os.fsync(self._fd)
+        except Exception as e:
+            print(f"Error flushing {self.target_path}: {e}")
+            self.error = e
+        finally:
+            self._close()
+
+    def _close(self):
+        os.close(self._fd)
+        self._fd = None
+        self._close_zero_buffer()
+
+    def stats(self):
+        stats = super().stats()
+        stats['target'] = self.target_path
+        stats['error'] = str(self.error) if self.error else None
+        return stats
+
+
+class MultiTargetWriter(RawImageWriter):
+    """Writes one image to several targets at once
+
+    The source is read once into a ring of buffer_count shared buffers and
+    each block is handed to one writer thread per target. A buffer is only
+    refilled after every target has written it, so the fastest target runs
+    at most buffer_count blocks ahead of the slowest; that window bounds
+    memory use and how far one slow stick can hold the others back.
+
+    A target that fails drops out and the others carry on; the write only
+    fails when no target is left. A target stuck on one block for
+    stall_timeout seconds (a hung stick) is failed too and its buffers are
+    freed, so it can't hold the others back. The buffer its write is still
+    reading from is left to it and replaced in the ring by a fresh one.
+    Per-target counters are in target_stats().
+    """
+
+    def __init__(self, buffer_size=4 * 1024 * 1024, direct=False, fsync_policy="end",
+                 fsync_interval=256 * 1024 * 1024, buffer_count=DEFAULT_WINDOW, skip_zeros=False, target_zeroed=False,
+                 stall_timeout=STALL_TIMEOUT):
+        super().__init__(buffer_size, direct, fsync_policy, fsync_interval, buffer_count, skip_zeros, target_zeroed)
+        self.stall_timeout = stall_timeout
+        self.targets = []
+        self._position = 0
+
+    @property
+    def bytes_done(self):
+        """Image bytes handed to every target, including source holes"""
+        return self._position
+
+    @property
+    def active_targets(self):
+        return [target for target in self.targets if not target.failed]
+
+    def target_stats(self):
+        """Throughput counters and error of every target of the last run"""
+        return [target.stats() for target in self.targets]
+
+    def stats(self):
+        stats = super().stats()
+        stats['targets'] = self.target_stats()
+        return stats
+
+    def write(self, source_path, target_paths, progress_callback=None):
+        """Write source_path to every target path; returns the paths that were written"""
+        self.progress_callback = progress_callback
+        self._reset_counters()
+        self._position = 0
+        self.targets = [TargetWriter(path, self) for path in target_paths]
+        if not self.targets:
+            raise Exception("No target to write to")
+
+        total = None if is_compressed(source_path) else os.path.getsize(source_path)
+        start = self._start = time.perf_counter()
+
+        for target in self.targets:
+            try:
+                target.open()
+            except Exception as e:
+                print(f"Error opening {target.target_path}: {e}")
+                target.error = e
+
+        try:
+            with open_image(source_path) as source:
+                self._fan_out(source, total)
+        except Exception as e:
+            # A source error fails every target that was still writing
+            for target in self.active_targets:
+                target.error = e
+            raise
+        finally:
+            for target in self.targets:
+                target.finish(self._position if total is None else total)
+
+        self.elapsed = time.perf_counter() - start
+        self.bytes_written = sum(target.bytes_written for target in self.targets)
+        self.bytes_skipped = sum(target.bytes_skipped for target in self.targets)
+
+        written = [target.target_path for target in self.active_targets]
+        if not written:
+            errors = "; ".join(f"{target.target_path}: {target.error}" for target in self.targets)
+            raise Exception(f"All targets failed ({errors})")
+
+        done = self._position
+        self._update_progress(done, done, f"Image written to {len(written)} of {len(self.targets)} drives")
+        return written
+
+    def _fan_out(self, source, total):
+        """Read the source once and queue every block on all remaining targets"""
+        buffer = mmap.mmap(-1, self.buffer_size * self.buffer_count)
+        view = memoryview(buffer)
+        slots = [view[i * self.buffer_size:(i + 1) * self.buffer_size] for i in range(self.buffer_count)]
+        spares = []  # Buffers that replaced ones left to hung writes
+
+        free_slots = queue.Queue()
+        for slot in range(self.buffer_count):
+            free_slots.put(slot)
+
+        # Targets still to write each slot; the last one frees it. A slot is
+        # released once per target: by its writer, or when it is dropped as hung.
+        pending = [0] * self.buffer_count
+        lock = threading.Lock()
+
+        def release(target, slot):
+            with lock:
+                if slot not in target.held:
+                    return
+                target.held.discard(slot)
+                pending[slot] -= 1
+                if pending[slot]:
+                    return
+            free_slots.put(slot)
+
+        def drop_stalled():
+            """Fail targets stuck on one block for stall_timeout seconds and free their slots"""
+            if self.stall_timeout is None:
+                return
+            now = time.monotonic()
+            for target in self.active_targets:
+                with target.lock:
+                    busy_since = target.busy_since
+                    if busy_since is None or now - busy_since < self.stall_timeout:
+                        continue
+                    target.stalled = True
+                    target.error = Exception(f"Drive stopped responding for {self.stall_timeout:g} s")
+                    in_flight = target.busy_slot
+                print(f"Error writing to {target.target_path}: no progress for {self.stall_timeout:g} s")
+
+                if in_flight is not None:
+                    # The hung write keeps reading the old memory; refill the slot elsewhere
+                    spare = mmap.mmap(-1, self.buffer_size)
+                    spares.append(spare)
+                    slots[in_flight] = memoryview(spare)
+                for slot in list(target.held):
+                    release(target, slot)
+
+        for target in self.active_targets:
+            target.thread = threading.Thread(target=target.run, args=(release,), daemon=True)
+            target.running = True
+            target.thread.start()
+
+        try:
+            find_holes = self.skip_zeros and total is not None and hasattr(os, 'SEEK_DATA')
+
+            while (total is None or self._position < total) and self.active_targets:
+                if find_holes:
+                    hole = self._hole_length(source, self._position, total)
+                    if hole is None:
+                        find_holes = False
+                    elif hole:
+                        for target in self.active_targets:
+                            target.queue.put((None, hole, None))
+                        self._position += hole
+                        source.seek(self._position)
+                        continue
+
+                wait_start = time.perf_counter()
+                slot = None
+                while slot is None:
+                    try:
+                        slot = free_slots.get(timeout=STALL_CHECK_INTERVAL)
+                    except queue.Empty:
+                        drop_stalled()
+                self.reader_stall_time += time.perf_counter() - wait_start
+
+                read_start = time.perf_counter()
+                read = self._fill(source, slots[slot])
+                self.read_time += time.perf_counter() - read_start
+
+                active = self.active_targets
+                if not read or not active:
+                    break
+
+                self.bytes_read += read
+                self._position += read
+                if read % SECTOR_ALIGNMENT:
+                    # Pad once here so sector-aligned targets don't all pad the shared buffer
+                    padded = read + SECTOR_ALIGNMENT - read % SECTOR_ALIGNMENT
+                    slots[slot][read:padded] = bytes(padded - read)
+
+                with lock:
+                    pending[slot] = len(active)
+                    for target in active:
+                        target.held.add(slot)
+                for target in active:
+                    target.queue.put((slots[slot], read, slot))
+
+                self._report_progress(source, total)
+                if read < self.buffer_size:
+                    break
+
+            if total is not None and self._position < total and self.active_targets:
+                raise Exception("Unexpected end of image file")
+        finally:
+            for target in self.targets:
+                if target.thread is not None:
+                    target.queue.put(None)
+            for target in self.targets:
+                # A hung target's thread is left behind; it is a daemon
+                while target.thread is not None and target.thread.is_alive() and not target.stalled:
+                    target.thread.join(0.25)
+                    drop_stalled()
+                    self._report_progress(source, total)
+
+            try:
+                for slot_view in slots:
+                    slot_view.release()
+                for spare in spares:
+                    spare.close()
+                view.release()
+                buffer.close()
+            except BufferError:
+                # A traceback or a hung write still references a slice; the GC frees it later
+                pass
+
+    def _report_progress(self, source, total):
+        """Progress of the slowest target still writing"""
+        active = self.active_targets
+        if not active:
+            return
+
+        slowest = min(target.bytes_done for target in active)
+        elapsed = time.perf_counter() - self._start
+        rate = slowest / elapsed / (1024 * 1024) if elapsed else 0.0
+        status = f"Writing image to {len(active)} drives... {rate:.1f} MB/s"
+        failed = len(self.targets) - len(active)
+        if failed:
+            status += f" ({failed} failed)"
+
+        if total is None:
+            # Scale the compressed position back by how far the slowest target lags the reader
+            done = source.compressed_read * (slowest / self._position if self._position else 0)
+            self._update_progress(done, source.compressed_size, status)
+        else:
+            self._update_progress(slowest, total, status)
@@ -0,0 +1,258 @@
+import os
+import struct
+import uuid
+import zlib
+
+SECTOR_SIZE = 512
+
+# Partitions start on 1 MiB boundaries, like Windows and parted place them
+DEFAULT_ALIGNMENT = 1024 * 1024
+
+PARTITION_SCHEMES = ("MBR", "GPT")
+
+# MBR partition type bytes
+MBR_TYPE_FAT32_LBA = 0x0C
+MBR_TYPE_NTFS = 0x07
+MBR_TYPE_EFI = 0xEF
+MBR_TYPE_GPT_PROTECTIVE = 0xEE
+MBR_ACTIVE = 0x80
+
+MBR_TYPES = {"FAT32": MBR_TYPE_FAT32_LBA, "NTFS": MBR_TYPE_NTFS, "exFAT": MBR_TYPE_NTFS}
+
+# GPT partition type GUIDs
+GPT_TYPE_ESP = "C12A7328-F81F-11D2-BA4B-00A0C93EC93B"
+GPT_TYPE_BASIC_DATA = "EBD0A0A2-B9E5-4433-87C0-68B6B72699C7"
+
+GPT_SIGNATURE = b'EFI PART'
+GPT_REVISION = 0x00010000
+GPT_HEADER = struct.Struct('<8sIIIIQQQQ16sQIII')
+GPT_ENTRY = struct.Struct('<16s16sQQQ72s')
+GPT_ENTRY_COUNT = 128
+
+MBR_ENTRY = struct.Struct('<B3sB3sII')
+
+# Old partition tables and file system signatures are wiped from both ends
+WIPE_SIZE = 1024 * 1024
+
+
+def crc32(data):
+    return zlib.crc32(data) & 0xFFFFFFFF
+
+
+def chs(lba):
+    """Encode an LBA as the legacy 3-byte cylinder/head/sector address"""
+    heads, sectors = 255, 63
+    cylinder = lba // (heads * sectors)
+    if cylinder > 1023:
+        return b'\xFE\xFF\xFF'
+    head = (lba // sectors) % heads
+    sector = lba % sectors + 1
+    return bytes((head, sector | ((cylinder >> 2) & 0xC0), cylinder & 0xFF))
+
+
+class Partition:
+    """One partition: its sector range, type and flags"""
+
+    def __init__(self, start_lba, sector_count, partition_type, bootable=False, name="", sector_size=SECTOR_SIZE):
+        self.start_lba = start_lba
+        self.sector_count = sector_count
+        self.type = partition_type
+        self.bootable = bootable
+        self.name = name
+        self.guid = uuid.uuid4()
+        self.sector_size = sector_size
+
+    @property
+    def end_lba(self):
+        """Last sector of the partition (inclusive)"""
+        return self.start_lba + self.sector_count - 1
+
+    @property
+    def offset(self):
+        """Byte offset of the partition on the disk"""
+        return self.start_lba * self.sector_size
+
+    @property
+    def size(self):
+        return self.sector_count * self.sector_size
+
+
+class PartitionTable:
+    """Builds an MBR or GPT partition table and writes it to a disk or image
+
+    MBR tables get the active flag on bootable partitions. GPT tables get a
+    protective MBR, the primary header and entry array at the start of the
+    disk and the backup copies at the end, all with their CRC32s.
+    """
+
+    def __init__(self, disk_size, scheme="MBR", sector_size=SECTOR_SIZE, alignment=DEFAULT_ALIGNMENT, disk_guid=None):
+        if scheme not in PARTITION_SCHEMES:
+            raise Exception(f"Unknown partition scheme: {scheme}")
+        if alignment % sector_size:
+            raise Exception("Alignment must be a multiple of the sector size")
+
+        self.scheme = scheme
+        self.sector_size = sector_size
+        self.alignment = alignment
+        self.total_sectors = disk_size // sector_size
+        self.disk_guid = disk_guid or uuid.uuid4()
+        self.partitions = []
+
+        if scheme == "MBR" and self.total_sectors > 0xFFFFFFFF:
+            raise Exception("Disk is too large for an MBR partition table")
+
+    @property
+    def entry_sectors(self):
+        """Sectors taken by one copy of the GPT partition entry array"""
+        return -(-GPT_ENTRY_COUNT * GPT_ENTRY.size // self.sector_size)
+
+    @property
+    def first_usable(self):
+        return 1 if self.scheme == "MBR" else 2 + self.entry_sectors
+
+    @property
+    def last_usable(self):
+        if self.scheme == "MBR":
+            return self.total_sectors - 1
+        return self.total_sectors - 2 - self.entry_sectors
+
+    def add(self, size=None, partition_type=None, bootable=False, name="", esp=False):
+        """Append a partition after the last one, aligned to self.alignment
+
+        size None takes the rest of the disk. partition_type is an MBR type
+        byte or a GPT type GUID; by default FAT32 (MBR) or basic data (GPT),
+        or the EFI system partition type when esp is set.
+        """
+        if partition_type is None:
+            if self.scheme == "MBR":
+                partition_type = MBR_TYPE_EFI if esp else MBR_TYPE_FAT32_LBA
+            else:
+                partition_type = GPT_TYPE_ESP if esp else GPT_TYPE_BASIC_DATA
+        if self.scheme == "MBR" and len(self.partitions) == 4:
+            raise Exception("An MBR partition table holds at most four primary partitions")
+
+        align = self.alignment // self.sector_size
+        start = self.partitions[-1].end_lba + 1 if self.partitions else self.first_usable
+        start = -(-start // align) * align
+
+        available = self.last_usable - start + 1
+        sectors = available if size is None else -(-size // self.sector_size)
+        if sectors <= 0 or sectors > available:
+            raise Exception("Partition doesn't fit on the disk")
+
+        partition = Partition(start, sectors, partition_type, bootable, name, self.sector_size)
+        self.partitions.append(partition)
+        return partition
+
+    def write(self, target, boot_code=None, wipe=True):
+        """Write the table to target (a file-like disk or image, or a path)
+
+        boot_code is the MBR bootstrap (up to 440 bytes); by default the
+        code already on the disk is kept. wipe zeroes the first and last
+        MiB first so no stale GPT or file system signatures survive.
+        """
+        if isinstance(target, (str, bytes, os.PathLike)):
+            with open(target, 'r+b', buffering=0) as f:
+                return self.write(f, boot_code, wipe)
+
+        if boot_code is None:
+            # Raw disks only read whole sectors
+            target.seek(0)
+            boot_code = target.read(self.sector_size)[:440] if hasattr(target, 'read') else b''
+        boot_code = bytes(boot_code or b'')[:440]
+
+        head_size = max(self.alignment, WIPE_SIZE) if wipe else self.first_usable * self.sector_size
+        head_size = min(head_size, self.total_sectors * self.sector_size)
+        head = bytearray(head_size)
+        head[0:self.sector_size] = self._mbr(boot_code)
+
+        tail = None
+        if self.scheme == "GPT":
+            entries = self._gpt_entries()
+            entries_crc = crc32(entries)
+            primary = self._gpt_header(1, self.total_sectors - 1, 2, entries_crc)
+            head[self.sector_size:2 * self.sector_size] = primary
+            head[2 * self.sector_size:2 * self.sector_size + len(entries)] = entries
+
+            backup_entries_lba = self.total_sectors - 1 - self.entry_sectors
+            backup = self._gpt_header(self.total_sectors - 1, 1, backup_entries_lba, entries_crc)
+            tail = entries + backup
+        elif wipe:
+            tail = b''
+
+        target.seek(0)
+        target.write(head)
+
+        if tail is not None:
+            tail_size = min(WIPE_SIZE, self.total_sectors * self.sector_size - head_size) if wipe else len(tail)
+            tail_size = max(tail_size, len(tail))
+            target.seek(self.total_sectors * self.sector_size - tail_size)
+            target.write(bytes(tail_size - len(tail)) + tail)
+
+        if hasattr(target, 'flush'):
+            target.flush()
+        return self.partitions
+
+    def _mbr(self, boot_code):
+        """Sector 0: bootstrap code, disk signature and four partition entries"""
+        sector = bytearray(self.sector_size)
+        sector[0:len(boot_code)] = boot_code
+        sector[440:444] = self.disk_guid.bytes[:4]
+
+        if self.scheme == "GPT":
+            count = min(self.total_sectors - 1, 0xFFFFFFFF)
+            entries = [MBR_ENTRY.pack(0, b'\x00\x02\x00', MBR_TYPE_GPT_PROTECTIVE, chs(count), 1, count)]
+        else:
+            entries = [
+                MBR_ENTRY.pack(
+                    MBR_ACTIVE if p.bootable else 0, chs(p.start_lba), p.type,
+                    chs(p.end_lba), p.start_lba, p.sector_count
+                )
+                for p in self.partitions
+            ]
+
+        for number, entry in enumerate(entries):
+            sector[446 + 16 * number:462 + 16 * number] = entry
+        sector[510:512] = b'\x55\xAA'
+        return bytes(sector)
+
+    def _gpt_entries(self):
+        """The partition entry array, padded to whole sectors"""
+        data = bytearray(self.entry_sectors * self.sector_size)
+        for number, p in enumerate(self.partitions):
+            GPT_ENTRY.pack_into(
+                data, number * GPT_ENTRY.size,
+                uuid.UUID(p.type).bytes_le, p.guid.bytes_le, p.start_lba, p.end_lba, 0,
+                p.name.encode('utf-16-le')[:72]
+            )
+        return bytes(data)
+
+    def _gpt_header(self, my_lba, alternate_lba, entries_lba, entries_crc):
+        """A GPT header sector with its CRC32 filled in"""
+        fields = [
+            GPT_SIGNATURE, GPT_REVISION, GPT_HEADER.size, 0, 0,
+            my_lba, alternate_lba, self.first_usable, self.last_usable,
+            self.disk_guid.bytes_le, entries_lba, GPT_ENTRY_COUNT, GPT_ENTRY.size, entries_crc
+        ]
+        fields[3] = crc32(GPT_HEADER.pack(*fields))
+        return GPT_HEADER.pack(*fields).ljust(self.sector_size, b'\x00')
+
+
+def set_active_partition(target, number=0, sector_size=SECTOR_SIZE):
+    """Mark MBR partition number (0-3) active and clear the flag on the others
+
+    Returns False if target has no MBR or uses a protective (GPT) MBR.
+    """
+    target.seek(0)
+    sector = bytearray(target.read(sector_size))
+    if len(sector) < 512 or sector[510:512] != b'\x55\xAA' or sector[450] == MBR_TYPE_GPT_PROTECTIVE:
+        return False
+
+    for entry in range(4):
+        sector[446 + 16 * entry] = MBR_ACTIVE if entry == number else 0
+
+    target.seek(0)
+    target.write(sector)
+    if hasattr(target, 'flush'):
+        target.flush()
+    return True
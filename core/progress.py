@@ -0,0 +1,184 @@
+import collections
+import time
+
+# Events kept for a consumer that stops draining; older ones are dropped
+MAX_PENDING_EVENTS = 1024
+
+# Seconds of recent progress the moving-average rate is taken over
+RATE_WINDOW = 5.0
+
+
+def format_eta(seconds):
+    """Remaining time as H:MM:SS or M:SS"""
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class ProgressEvent:
+    """One progress report of a flash
+
+    progress and status are what every progress callback gets; the other
+    fields are filled in by the phases that know them (None otherwise).
+    """
+
+    __slots__ = ('progress', 'status', 'phase', 'bytes_done', 'bytes_total',
+                 'files_done', 'files_total', 'path', 'rate', 'eta')
+
+    def __init__(self, progress, status, phase=None, bytes_done=None, bytes_total=None,
+                 files_done=None, files_total=None, path=None, rate=None, eta=None):
+        self.progress = progress
+        self.status = status
+        self.phase = phase
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+        self.files_done = files_done
+        self.files_total = files_total
+        self.path = path
+        self.rate = rate
+        self.eta = eta
+
+
+class ProgressChannel:
+    """Hands progress events from a flash thread to the UI thread
+
+    The flash thread calls the channel like any progress callback; that
+    only appends to a deque, which is atomic in CPython, so it never
+    waits on a lock or on the UI. The UI drains the channel on a timer
+    and draws just the newest event, so how often a copy loop reports
+    doesn't slow the copy down. close() hands over a final result.
+    """
+
+    # Progress callbacks with this flag also take the ProgressEvent fields as keywords
+    structured = True
+
+    def __init__(self, max_pending=MAX_PENDING_EVENTS):
+        self._events = collections.deque(maxlen=max_pending)
+        self.closed = False
+        self.result = None
+
+    def __call__(self, progress, status, **details):
+        self.post(ProgressEvent(progress, status, **details))
+
+    def post(self, event):
+        self._events.append(event)
+
+    def drain(self):
+        """Every event posted since the last drain, oldest first"""
+        events = []
+        while True:
+            try:
+                events.append(self._events.popleft())
+            except IndexError:
+                return events
+
+    def latest(self):
+        """The newest pending event, dropping the ones before it; None if there is none"""
+        events = self.drain()
+        return events[-1] if events else None
+
+    def close(self, result=None):
+        """Mark the flash as finished; the consumer picks up result after the last event"""
+        self.result = result
+        self.closed = True
+
+
+class ProgressModel:
+    """Overall progress of a flash, weighted by the bytes each phase moves
+
+    A flash is planned as (phase, size) steps: the bytes it copies, writes
+    or verifies, or a byte-equivalent estimate for steps like formatting
+    that have no counter. Progress is the share of all planned bytes done,
+    so every phase takes as much of the bar as it takes of the work. rate
+    is a moving average over the last rate_window seconds of the current
+    phase and eta the remaining planned bytes at that rate.
+    """
+
+    def __init__(self, phases=(), rate_window=RATE_WINDOW):
+        self.phases = [[name, size] for name, size in phases]
+        self.rate_window = rate_window
+        self.phase = None
+        self.done = 0
+        self._index = None
+        self._samples = collections.deque()
+
+    @property
+    def size(self):
+        """Planned bytes of the current phase"""
+        return self.phases[self._index][1] if self._index is not None else 0
+
+    @property
+    def total(self):
+        return sum(size for _, size in self.phases)
+
+    @property
+    def completed(self):
+        """Planned bytes done over all phases"""
+        if self._index is None:
+            return 0
+        before = sum(size for _, size in self.phases[:self._index])
+        return before + min(self.done, self.size)
+
+    @property
+    def progress(self):
+        total = self.total
+        return (self.completed / total) * 100 if total else 0.0
+
+    def begin(self, phase, size=None):
+        """Start phase; phases before it in the plan count as done
+
+        A phase that wasn't planned is added at the end. size replaces
+        the planned size, for phases only measured once they start.
+        """
+        names = [name for name, _ in self.phases]
+        if phase not in names:
+            self.phases.append([phase, 0])
+            names.append(phase)
+        self._index = names.index(phase)
+        if size is not None:
+            self.phases[self._index][1] = size
+
+        self.phase = phase
+        self.done = 0
+        self._samples.clear()
+
+    def resize(self, phase, size):
+        """Change the planned size of phase, for sizes measured by an earlier phase"""
+        for step in self.phases:
+            if step[0] == phase:
+                step[1] = size
+
+    def update(self, done, size=None):
+        """Set the bytes done in the current phase (and correct its size)"""
+        if self._index is None:
+            return
+        if size is not None:
+            self.phases[self._index][1] = size
+        self.done = done
+
+        now = time.monotonic()
+        samples = self._samples
+        samples.append((now, done))
+        # Keep one sample older than the window so the rate spans all of it
+        while len(samples) > 2 and samples[1][0] <= now - self.rate_window:
+            samples.popleft()
+
+    @property
+    def rate(self):
+        """Moving-average bytes per second of the current phase, None until measurable"""
+        if len(self._samples) < 2:
+            return None
+        (first_time, first_done), (last_time, last_done) = self._samples[0], self._samples[-1]
+        if last_time <= first_time:
+            return None
+        return max(0.0, (last_done - first_done) / (last_time - first_time))
+
+    @property
+    def eta(self):
+        """Seconds left for every planned byte at the current rate, None without a rate"""
+        rate = self.rate
+        if not rate:
+            return None
+        return (self.total - self.completed) / rate
@@ -0,0 +1,426 @@
+import errno
+import mmap
+import os
+import queue
+import stat
+import threading
+import time
+
+from core.compressed_image import is_compressed, open_image
+from core.write_journal import BOUNDARY_SIZE
+
+# Buffers and O_DIRECT writes are aligned to the largest common sector size
+SECTOR_ALIGNMENT = 4096
+
+FSYNC_POLICIES = ("none", "end", "periodic")
+
+# Granularity of the all-zero check; a multiple of SECTOR_ALIGNMENT so
+# skipped ranges keep O_DIRECT writes aligned
+ZERO_CHECK_SIZE = 64 * 1024
+ZERO_CHUNK = bytes(ZERO_CHECK_SIZE)
+
+
+class RawImageWriter:
+    """Block-for-block image writer ("dd mode")
+
+    Streams an image straight to a block device or a plain file through
+    large page-aligned buffers, optionally bypassing the page cache with
+    O_DIRECT. Hybrid ISOs written this way boot exactly like the original
+    image.
+
+    A reader thread fills a ring of buffer_count preallocated buffers while
+    the calling thread drains them to the target, so the source is read
+    while the device is busy writing.
+
+    With skip_zeros, all-zero chunks are seeked over instead of written,
+    and holes in a sparse source are found with SEEK_DATA/SEEK_HOLE
+    without reading them. Skipping is only safe when the target already
+    reads as zeros: new or empty plain files always do, devices only when
+    the caller sets target_zeroed (e.g. after a full TRIM or zero fill).
+
+    Compressed images (.xz, .gz, .bz2, .zst) are decompressed by the
+    reader thread as they stream in; progress then follows the
+    compressed bytes consumed since the image size isn't known upfront.
+    """
+
+    def __init__(self, buffer_size=4 * 1024 * 1024, direct=False, fsync_policy="end",
+                 fsync_interval=256 * 1024 * 1024, buffer_count=4, skip_zeros=False, target_zeroed=False):
+        if buffer_size <= 0 or buffer_size % SECTOR_ALIGNMENT:
+            raise Exception(f"Buffer size must be a multiple of {SECTOR_ALIGNMENT} bytes")
+        if buffer_count < 1:
+            raise Exception("At least one buffer is required")
+        if fsync_policy not in FSYNC_POLICIES:
+            raise Exception(f"Unknown fsync policy: {fsync_policy}")
+
+        self.buffer_size = buffer_size
+        self.buffer_count = buffer_count
+        self.direct = direct
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.skip_zeros = skip_zeros
+        self.target_zeroed = target_zeroed
+        self.progress_callback = None
+        self._zero_buffer = None
+
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.bytes_skipped = 0
+        self.bytes_resumed = 0
+        self.elapsed = 0.0
+        self.read_time = 0.0
+        self.write_time = 0.0
+        self.reader_stall_time = 0.0
+        self.writer_stall_time = 0.0
+        self._since_fsync = 0
+        self._start = None
+
+    @property
+    def bytes_done(self):
+        """Image bytes handled so far: written, skipped or already there from a resumed run"""
+        return self.bytes_written + self.bytes_skipped + self.bytes_resumed
+
+    @property
+    def throughput(self):
+        """Average speed of the last run in image bytes per second"""
+        return (self.bytes_done - self.bytes_resumed) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def rate(self):
+        """Speed so far of the write in progress, in image bytes per second"""
+        elapsed = time.perf_counter() - self._start if self._start is not None else 0.0
+        return (self.bytes_done - self.bytes_resumed) / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        """Throughput counters of the last run
+
+        read/write rates only count time spent inside read and write calls;
+        stall times are how long each side waited on the other, which shows
+        whether the source or the target is the bottleneck. bytes_skipped
+        counts zero blocks and source holes that were seeked over.
+        """
+        return {
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'bytes_skipped': self.bytes_skipped,
+            'bytes_resumed': self.bytes_resumed,
+            'elapsed': self.elapsed,
+            'throughput': self.throughput,
+            'read_rate': self.bytes_read / self.read_time if self.read_time else 0.0,
+            'write_rate': self.bytes_written / self.write_time if self.write_time else 0.0,
+            'reader_stall_time': self.reader_stall_time,
+            'writer_stall_time': self.writer_stall_time,
+        }
+
+    def write(self, source_path, target_path, progress_callback=None, journal=None):
+        """Write source_path to target_path and return the number of image bytes handled
+
+        With a WriteJournal, the target is flushed and a checkpoint recorded
+        every journal.checkpoint_interval bytes, and a write interrupted
+        earlier resumes from its newest checkpoint that still reads back.
+        """
+        self.progress_callback = progress_callback
+        self._reset_counters()
+
+        if journal is not None:
+            self.bytes_resumed = journal.verified_offset(target_path) if journal.resuming else 0
+            if not self.bytes_resumed:
+                journal.discard()
+
+        # The decompressed size of a compressed image is only known at the end
+        total = None if is_compressed(source_path) else os.path.getsize(source_path)
+        start = self._start = time.perf_counter()
+
+        with open_image(source_path) as source:
+            target_fd, aligned = self._open_target(target_path)
+            try:
+                skip = self.skip_zeros and (self.target_zeroed or self._is_empty_file(target_fd))
+                if self.bytes_resumed:
+                    self._update_progress(self.bytes_resumed if total else 0, total or 1,
+                                          f"Resuming after {self.bytes_resumed / (1024 * 1024):.0f} MB...")
+                    source.seek(self.bytes_resumed)
+                    os.lseek(target_fd, self.bytes_resumed, os.SEEK_SET)
+
+                self._copy(source, target_fd, total, aligned, skip, journal)
+                if total is None:
+                    total = self.bytes_done
+                self._fix_file_size(target_fd, total)
+
+                if self.fsync_policy != "none":
+                    self._update_progress(total, total, "Flushing to device...")
+                    os.fsync(target_fd)
+            finally:
+                os.close(target_fd)
+
+        if journal is not None:
+            journal.discard()
+
+        self.elapsed = time.perf_counter() - start
+        self._update_progress(total, total, "Image written")
+        return self.bytes_done
+
+    def _open_target(self, target_path):
+        """Open the target for writing, returning (fd, aligned)
+
+        aligned is True when every write must be whole sectors: with
+        O_DIRECT, and on raw devices, which Windows has no O_DIRECT for
+        but still only writes in sectors.
+        """
+        flags = os.O_WRONLY | getattr(os, 'O_BINARY', 0)
+        device = target_path.startswith('\\\\.\\')
+        if not device and not os.path.exists(target_path):
+            flags |= os.O_CREAT
+
+        if self.direct and hasattr(os, 'O_DIRECT'):
+            try:
+                return os.open(target_path, flags | os.O_DIRECT, 0o644), True
+            except OSError as e:
+                # Some filesystems (tmpfs, network shares) refuse O_DIRECT
+                if e.errno != errno.EINVAL:
+                    raise
+                print(f"O_DIRECT not supported on target, using buffered writes: {e}")
+
+        target_fd = os.open(target_path, flags, 0o644)
+        mode = os.fstat(target_fd).st_mode
+        return target_fd, device or stat.S_ISBLK(mode) or stat.S_ISCHR(mode)
+
+    def _is_empty_file(self, target_fd):
+        """True for a new or empty plain file, which reads as zeros wherever we seek over"""
+        info = os.fstat(target_fd)
+        return stat.S_ISREG(info.st_mode) and info.st_size == 0
+
+    def _copy(self, source, target_fd, total, aligned, skip, journal=None):
+        """Drain the reader thread's filled buffers into the target"""
+        # Anonymous mmaps are page aligned, which O_DIRECT requires, and
+        # every slot starts at a multiple of buffer_size
+        buffer = mmap.mmap(-1, self.buffer_size * self.buffer_count)
+        view = memoryview(buffer)
+        slots = [view[i * self.buffer_size:(i + 1) * self.buffer_size] for i in range(self.buffer_count)]
+
+        free_slots = queue.Queue()
+        filled_slots = queue.Queue()
+        for slot in range(self.buffer_count):
+            free_slots.put(slot)
+
+        reader = threading.Thread(
+            target=self._read_into_slots,
+            args=(source, slots, free_slots, filled_slots, total, self.bytes_resumed),
+            daemon=True
+        )
+        reader.start()
+        checkpointed = self.bytes_done
+
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                item = filled_slots.get()
+                self.writer_stall_time += time.perf_counter() - wait_start
+
+                if item is None:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+
+                slot, read = item
+                # A hole in the source comes without a slot: nothing was read for it
+                data = None if slot is None else slots[slot]
+                self._write_block(target_fd, data, read, aligned, skip)
+                if journal is not None and self.bytes_done - checkpointed >= journal.checkpoint_interval:
+                    checkpointed = self._checkpoint(journal, target_fd, data, read)
+                if slot is not None:
+                    free_slots.put(slot)
+
+                elapsed = time.perf_counter() - self._start
+                rate = self.bytes_done / elapsed / (1024 * 1024) if elapsed else 0.0
+                status = f"Writing image... {rate:.1f} MB/s"
+                if total is None:
+                    self._update_progress(source.compressed_read, source.compressed_size, status)
+                else:
+                    self._update_progress(self.bytes_done, total, status)
+
+            if total is not None and self.bytes_done < total:
+                raise Exception("Unexpected end of image file")
+        finally:
+            # Wake the reader if it is waiting for a slot, then wait for it
+            free_slots.put(None)
+            reader.join()
+            for slot_view in slots:
+                slot_view.release()
+            view.release()
+            self._close_zero_buffer()
+            try:
+                buffer.close()
+            except BufferError:
+                # A traceback still references a slice; the GC frees it later
+                pass
+
+    def _write_block(self, target_fd, data, read, aligned, skip):
+        """Write one block of read image bytes, or a hole of read bytes when data is None"""
+        write_start = time.perf_counter()
+
+        if data is None:
+            if skip:
+                os.lseek(target_fd, read, os.SEEK_CUR)
+                self.bytes_skipped += read
+            else:
+                if self._zero_buffer is None:
+                    self._zero_buffer = mmap.mmap(-1, self.buffer_size)
+                for offset in range(0, read, self.buffer_size):
+                    self._write_all(target_fd, memoryview(self._zero_buffer)[:min(self.buffer_size, read - offset)])
+                self.bytes_written += read
+        else:
+            length = read
+            if aligned and read % SECTOR_ALIGNMENT:
+                # O_DIRECT and raw devices need whole sectors; pad the final block with zeros
+                length = read + SECTOR_ALIGNMENT - read % SECTOR_ALIGNMENT
+                data[read:length] = bytes(length - read)
+
+            if skip:
+                self._write_skipping_zeros(target_fd, data[:length], read)
+            else:
+                self._write_all(target_fd, data[:length])
+                self.bytes_written += read
+
+        self.write_time += time.perf_counter() - write_start
+        self._since_fsync += read
+        if self.fsync_policy == "periodic" and self._since_fsync >= self.fsync_interval:
+            os.fsync(target_fd)
+            self._since_fsync = 0
+
+    def _checkpoint(self, journal, target_fd, data, read):
+        """Flush the target and record in the journal how far the image got"""
+        length = min(BOUNDARY_SIZE, read)
+        boundary = bytes(length) if data is None else data[read - length:read].tobytes()
+        os.fsync(target_fd)
+        journal.checkpoint(self.bytes_done, boundary)
+        return self.bytes_done
+
+    def _close_zero_buffer(self):
+        if self._zero_buffer is not None:
+            try:
+                self._zero_buffer.close()
+            except BufferError:
+                # A traceback still references a slice; the GC frees it later
+                pass
+            self._zero_buffer = None
+
+    def _write_skipping_zeros(self, target_fd, data, read):
+        """Write data, seeking over ZERO_CHECK_SIZE chunks that are all zeros
+
+        Only the first read bytes are image data; the rest is sector padding.
+        """
+        pending = 0
+        skipped = 0
+        for offset in range(0, len(data), ZERO_CHECK_SIZE):
+            end = min(offset + ZERO_CHECK_SIZE, len(data))
+            # Cheap rejection before comparing the whole chunk; startswith
+            # memcmps the buffer in place instead of copying it
+            if data[offset] or data[end - 1] or not ZERO_CHUNK.startswith(data[offset:end]):
+                continue
+
+            if pending < offset:
+                self._write_all(target_fd, data[pending:offset])
+            os.lseek(target_fd, end - offset, os.SEEK_CUR)
+            skipped += max(0, min(end, read) - offset)
+            pending = end
+
+        if pending < len(data):
+            self._write_all(target_fd, data[pending:])
+        self.bytes_skipped += skipped
+        self.bytes_written += read - skipped
+
+    def _read_into_slots(self, source, slots, free_slots, filled_slots, total, start=0):
+        """Reader thread: fill free slots from the source until it ends
+
+        Holes of a sparse source are passed on as (None, length) without
+        reading them or using a slot.
+        """
+        position = start
+        find_holes = self.skip_zeros and total is not None and hasattr(os, 'SEEK_DATA')
+
+        try:
+            while total is None or position < total:
+                if find_holes:
+                    hole = self._hole_length(source, position, total)
+                    if hole is None:
+                        find_holes = False
+                    elif hole:
+                        filled_slots.put((None, hole))
+                        position += hole
+                        source.seek(position)
+                        continue
+
+                wait_start = time.perf_counter()
+                slot = free_slots.get()
+                self.reader_stall_time += time.perf_counter() - wait_start
+
+                if slot is None:
+                    return
+
+                read_start = time.perf_counter()
+                read = self._fill(source, slots[slot])
+                self.read_time += time.perf_counter() - read_start
+
+                if not read:
+                    break
+                self.bytes_read += read
+                position += read
+                filled_slots.put((slot, read))
+
+                if read < len(slots[slot]):
+                    break
+
+            filled_slots.put(None)
+        except BaseException as e:
+            filled_slots.put(e)
+
+    def _hole_length(self, source, position, total):
+        """Length of the sparse hole at position (whole sectors only), or None if unsupported"""
+        try:
+            data = os.lseek(source.fileno(), position, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                return None
+            # No data after position: the rest of the file is a hole
+            data = total
+        finally:
+            source.seek(position)
+
+        hole = min(data, total) - position
+        return hole - hole % SECTOR_ALIGNMENT
+
+    def _fill(self, source, view):
+        """Read until view is full or the source ends, so only the last block is short"""
+        filled = 0
+        while filled < len(view):
+            read = source.readinto(view[filled:])
+            if not read:
+                break
+            filled += read
+        return filled
+
+    def _write_all(self, target_fd, data):
+        """Write all of data, retrying short writes"""
+        while data:
+            written = os.write(target_fd, data)
+            if written <= 0:
+                raise Exception("Target device stopped accepting data")
+            data = data[written:]
+
+    def _fix_file_size(self, target_fd, total):
+        """Drop sector padding from plain file targets, or extend over a skipped tail"""
+        info = os.fstat(target_fd)
+        if not stat.S_ISREG(info.st_mode) or self.bytes_done != total:
+            return
+
+        padded_end = total + (-total % SECTOR_ALIGNMENT)
+        if info.st_size < total or total < info.st_size <= padded_end:
+            os.ftruncate(target_fd, total)
+
+    def _update_progress(self, done, total, status):
+        """Report progress as (percentage, status)"""
+        if self.progress_callback:
+            progress = (done / total) * 100 if total else 100
+            self.progress_callback(progress, status)
@@ -0,0 +1,338 @@
+import struct
+
+SECTOR_SIZE = 2048
+
+# Anchor volume descriptor pointers live at sector 256, N-256 and N-1
+ANCHOR_SECTOR = 256
+
+TAG_PRIMARY_VOLUME = 1
+TAG_ANCHOR = 2
+TAG_VOLUME_POINTER = 3
+TAG_PARTITION = 5
+TAG_LOGICAL_VOLUME = 6
+TAG_TERMINATING = 8
+TAG_FILE_SET = 256
+TAG_FILE_IDENTIFIER = 257
+TAG_ALLOCATION_EXTENT = 258
+TAG_FILE_ENTRY = 261
+TAG_EXTENDED_FILE_ENTRY = 266
+
+# Volume descriptor sequences are bounded to stop runaway parsing of corrupt images
+MAX_SEQUENCE_DESCRIPTORS = 256
+
+FILE_TYPE_DIRECTORY = 4
+FILE_TYPE_SYMLINK = 12
+
+# File characteristics of a file identifier descriptor
+CHAR_HIDDEN = 0x01
+CHAR_DIRECTORY = 0x02
+CHAR_DELETED = 0x04
+CHAR_PARENT = 0x08
+
+# Allocation descriptor types (low bits of the ICB tag flags)
+AD_SHORT = 0
+AD_LONG = 1
+AD_EXTENDED = 2
+AD_EMBEDDED = 3
+
+# Extent types (top two bits of an extent length)
+EXTENT_RECORDED = 0
+EXTENT_NEXT = 3
+
+DESCRIPTOR_TAG = struct.Struct('<HHBxHHHI')
+SHORT_AD = struct.Struct('<II')
+LONG_AD = struct.Struct('<IIH6x')
+EXTENDED_AD = struct.Struct('<IIIIH2x')
+
+
+def decode_dchars(data):
+    """Decode an OSTA compressed Unicode string (compression ID + characters)"""
+    if not data:
+        return ''
+    if data[0] in (16, 255):
+        return bytes(data[1:]).decode('utf-16-be', errors='replace')
+    return bytes(data[1:]).decode('latin-1')
+
+
+def decode_dstring(field):
+    """Decode a fixed-size dstring field whose last byte holds the used length"""
+    length = field[-1]
+    return decode_dchars(field[:length]) if length else ''
+
+
+def tag_id(data):
+    """Return the descriptor tag identifier, or None if the checksum is wrong"""
+    if len(data) < 16:
+        return None
+    if (sum(data[0:4]) + sum(data[5:16])) & 0xFF != data[4]:
+        return None
+    return DESCRIPTOR_TAG.unpack_from(data)[0]
+
+
+class UDFReader:
+    """Pure-Python reader for the UDF side of UDF-bridge images
+
+    Follows the anchor pointer to the volume descriptor sequence, the
+    partition and logical volume descriptors to the file set descriptor,
+    and from there reads file entries and their allocation descriptors.
+    File data is returned as extents of (byte offset, length), where the
+    offset is None for unrecorded (all-zero) extents, so 64-bit file
+    sizes and fragmented files are described exactly.
+    """
+
+    def __init__(self, iso_file):
+        self.iso_file = iso_file
+        self.block_size = SECTOR_SIZE
+        self.partition_starts = []
+        self.volume_id = None
+        self.root_icb = None
+
+        partitions = {}
+        partition_maps = []
+        file_set = None
+
+        for sector in self._descriptor_sequence(self._find_anchor()):
+            kind = tag_id(sector)
+            if kind == TAG_PARTITION:
+                number, start = struct.unpack_from('<H', sector, 22)[0], struct.unpack_from('<I', sector, 188)[0]
+                partitions.setdefault(number, start)
+            elif kind == TAG_LOGICAL_VOLUME and file_set is None:
+                self.volume_id = decode_dstring(sector[84:212]) or None
+                self.block_size = struct.unpack_from('<I', sector, 212)[0]
+                file_set = LONG_AD.unpack_from(sector, 248)
+                partition_maps = self._partition_maps(sector)
+
+        if file_set is None or not partition_maps:
+            raise Exception("UDF logical volume descriptor not found")
+
+        for number in partition_maps:
+            if number not in partitions:
+                raise Exception(f"UDF partition {number} not found")
+            self.partition_starts.append(partitions[number])
+
+        _, fsd_block, fsd_partition = file_set
+        fsd = self._read_block(fsd_partition, fsd_block)
+        if tag_id(fsd) != TAG_FILE_SET:
+            raise Exception("UDF file set descriptor not found")
+
+        _, root_block, root_partition = LONG_AD.unpack_from(fsd, 400)
+        self.root_icb = (root_partition, root_block)
+
+    def _find_anchor(self):
+        """Return the anchor volume descriptor pointer sector"""
+        self.iso_file.seek(0, 2)
+        last = self.iso_file.tell() // SECTOR_SIZE - 1
+
+        for sector_number in (ANCHOR_SECTOR, last, last - ANCHOR_SECTOR):
+            if sector_number < ANCHOR_SECTOR:
+                continue
+            self.iso_file.seek(sector_number * SECTOR_SIZE)
+            sector = self.iso_file.read(SECTOR_SIZE)
+            if tag_id(sector) == TAG_ANCHOR:
+                return sector
+
+        raise Exception("UDF anchor volume descriptor pointer not found")
+
+    def _descriptor_sequence(self, anchor):
+        """Yield the sectors of the main volume descriptor sequence"""
+        length, location = struct.unpack_from('<II', anchor, 16)
+        count = 0
+
+        while length and count < MAX_SEQUENCE_DESCRIPTORS:
+            self.iso_file.seek(location * SECTOR_SIZE)
+            data = self.iso_file.read(length)
+            next_extent = None
+
+            for offset in range(0, len(data) - SECTOR_SIZE + 1, SECTOR_SIZE):
+                sector = data[offset:offset + SECTOR_SIZE]
+                kind = tag_id(sector)
+                count += 1
+                if kind == TAG_TERMINATING or kind is None:
+                    return
+                if kind == TAG_VOLUME_POINTER:
+                    # The sequence continues in another extent
+                    next_extent = struct.unpack_from('<II', sector, 20)
+                    break
+                yield sector
+
+            if next_extent is None:
+                return
+            length, location = next_extent
+
+    def _partition_maps(self, lvd):
+        """Partition numbers of the logical volume's maps, by reference number"""
+        table_length, count = struct.unpack_from('<II', lvd, 264)
+        maps = []
+        offset = 440
+
+        for _ in range(count):
+            if offset + 2 > 440 + table_length:
+                break
+            map_type, map_length = lvd[offset], lvd[offset + 1]
+            if map_type != 1:
+                # Metadata, sparable and virtual partitions aren't used by install media
+                raise Exception("Unsupported UDF partition map")
+            maps.append(struct.unpack_from('<H', lvd, offset + 4)[0])
+            offset += map_length
+
+        return maps
+
+    def _position(self, partition, block):
+        """Byte offset of a logical block inside a partition"""
+        if partition >= len(self.partition_starts):
+            raise Exception(f"Invalid UDF partition reference {partition}")
+        return (self.partition_starts[partition] + block) * self.block_size
+
+    def _read_block(self, partition, block):
+        self.iso_file.seek(self._position(partition, block))
+        return self.iso_file.read(self.block_size)
+
+    def read_entry(self, icb):
+        """Decode the file entry at icb = (partition, block)
+
+        Returns (file_type, size, extents).
+        """
+        partition, block = icb
+        entry = self._read_block(partition, block)
+        kind = tag_id(entry)
+
+        if kind == TAG_FILE_ENTRY:
+            ad_start = 176
+        elif kind == TAG_EXTENDED_FILE_ENTRY:
+            ad_start = 216
+        else:
+            raise Exception(f"Bad UDF file entry at block {block}")
+
+        file_type = entry[27]
+        ad_type = struct.unpack_from('<H', entry, 34)[0] & 0x07
+        size = struct.unpack_from('<Q', entry, 56)[0]
+        ea_length, ad_length = struct.unpack_from('<II', entry, ad_start - 8)
+        ad_start += ea_length
+
+        if ad_type == AD_EMBEDDED:
+            # Small files live inside the file entry itself
+            extents = [(self._position(partition, block) + ad_start, min(size, ad_length))]
+        else:
+            extents = self._allocation_extents(entry[ad_start:ad_start + ad_length], ad_type, partition)
+
+        return file_type, size, self._trim(extents, size)
+
+    def _allocation_extents(self, data, ad_type, partition):
+        """Decode allocation descriptors, following allocation extent continuations"""
+        extents = []
+        chains = 0
+
+        while data:
+            next_data = None
+            offset = 0
+
+            while True:
+                if ad_type == AD_SHORT and offset + SHORT_AD.size <= len(data):
+                    length, block = SHORT_AD.unpack_from(data, offset)
+                    ad_partition = partition
+                    offset += SHORT_AD.size
+                elif ad_type == AD_LONG and offset + LONG_AD.size <= len(data):
+                    length, block, ad_partition = LONG_AD.unpack_from(data, offset)
+                    offset += LONG_AD.size
+                elif ad_type == AD_EXTENDED and offset + EXTENDED_AD.size <= len(data):
+                    length, _, _, block, ad_partition = EXTENDED_AD.unpack_from(data, offset)
+                    offset += EXTENDED_AD.size
+                else:
+                    break
+
+                extent_type = length >> 30
+                length &= 0x3FFFFFFF
+                if length == 0:
+                    break
+
+                if extent_type == EXTENT_NEXT:
+                    chains += 1
+                    if chains > MAX_SEQUENCE_DESCRIPTORS:
+                        raise Exception("UDF allocation extent chain too long")
+                    block_data = self._read_block(ad_partition, block)
+                    if tag_id(block_data) != TAG_ALLOCATION_EXTENT:
+                        raise Exception("Bad UDF allocation extent descriptor")
+                    continued = struct.unpack_from('<I', block_data, 20)[0]
+                    next_data = block_data[24:24 + continued]
+                    break
+
+                if extent_type == EXTENT_RECORDED:
+                    position = self._position(ad_partition, block)
+                    # Merge physically adjacent extents into one
+                    if extents and extents[-1][0] is not None and extents[-1][0] + extents[-1][1] == position:
+                        extents[-1] = (extents[-1][0], extents[-1][1] + length)
+                        continue
+                    extents.append((position, length))
+                else:
+                    # Allocated-but-unrecorded and sparse extents read as zeros
+                    extents.append((None, length))
+
+            data = next_data
+
+        return extents
+
+    @staticmethod
+    def _trim(extents, size):
+        """Cut the extent list down to the file's information length"""
+        trimmed = []
+        remaining = size
+        for position, length in extents:
+            if remaining <= 0:
+                break
+            trimmed.append((position, min(length, remaining)))
+            remaining -= length
+        return trimmed
+
+    def read_extents(self, extents):
+        """Read and join the data of a list of extents"""
+        parts = []
+        for position, length in extents:
+            if position is None:
+                parts.append(bytes(length))
+            else:
+                self.iso_file.seek(position)
+                parts.append(self.iso_file.read(length))
+        return b''.join(parts)
+
+    def iter_directory(self, dir_data):
+        """Yield (name, characteristics, icb) for the file identifiers of a directory"""
+        data = memoryview(dir_data)
+        offset = 0
+
+        while offset + 38 <= len(data):
+            if tag_id(data[offset:offset + 16]) != TAG_FILE_IDENTIFIER:
+                break
+
+            characteristics, name_length = data[offset + 18], data[offset + 19]
+            _, block, partition = LONG_AD.unpack_from(data, offset + 20)
+            use_length = struct.unpack_from('<H', data, offset + 36)[0]
+            name_start = offset + 38 + use_length
+
+            if not characteristics & (CHAR_DELETED | CHAR_PARENT):
+                name = decode_dchars(data[name_start:name_start + name_length])
+                yield name, characteristics, (partition, block)
+
+            # Identifier descriptors are padded to four bytes
+            offset += (38 + use_length + name_length + 3) & ~3
+
+    @staticmethod
+    def symlink_target(data):
+        """Join the path components stored in a symbolic link's data"""
+        parts = []
+        offset = 0
+        while offset + 4 <= len(data):
+            component_type, length = data[offset], data[offset + 1]
+            identifier = data[offset + 4:offset + 4 + length]
+            if component_type in (1, 2):
+                parts = ['']
+            elif component_type == 3:
+                parts.append('..')
+            elif component_type == 4:
+                parts.append('.')
+            elif component_type == 5:
+                parts.append(decode_dchars(identifier))
+            offset += 4 + length
+
+        if parts == ['']:
+            return '/'
+        return '/'.join(parts)
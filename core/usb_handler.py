@@ -1,42 +1,52 @@
 import os
 import subprocess
-import psutil
-import win32api
-import win32file
+import threading
+import time
 
-class USBHandler:
-    def __init__(self):
-        pass
-        
-    def get_usb_drives(self):
+# Seconds an enumerated drive list is reused before the drives are scanned again
+DRIVE_CACHE_TTL = 2.0
+
+# Seconds between checks of the backend for plugged or unplugged drives
+HOTPLUG_POLL_INTERVAL = 1.0
+
+
+class WindowsDriveBackend:
+    """Removable drives from psutil and the Win32 volume APIs"""
+
+    def list_drives(self):
         """Get list of USB drives"""
         usb_drives = []
-        
+
         try:
+            # Imported here so loading the GUI doesn't wait for the Windows APIs
+            import psutil
+            import win32api
+            import win32file
+
             # Get all disk partitions
             partitions = psutil.disk_partitions()
-            
+
             for partition in partitions:
                 try:
                     # Check if it's a removable drive
                     drive_type = win32file.GetDriveType(partition.mountpoint)
-                    
+
                     # DRIVE_REMOVABLE = 2
                     if drive_type == 2:
                         # Get drive info
                         usage = psutil.disk_usage(partition.mountpoint)
-                        
+
                         # Get volume label
                         try:
                             volume_info = win32api.GetVolumeInformation(partition.mountpoint)
                             label = volume_info[0] if volume_info[0] else "Removable Drive"
                         except:
                             label = "Removable Drive"
-                            
+
                         # Format size
                         size_gb = usage.total / (1024**3)
                         size_str = f"{size_gb:.1f} GB"
-                        
+
                         usb_drives.append({
                             'letter': partition.mountpoint[0],
                             'label': label,
@@ -45,21 +55,156 @@ class USBHandler:
                             'free_bytes': usage.free,
                             'device': partition.device
                         })
-                        
+
                 except Exception as e:
                     continue
-                    
+
         except Exception as e:
             print(f"Error getting USB drives: {e}")
-            
+
         return usb_drives
-        
+
+    def signature(self):
+        """Cheap value that changes when a drive letter comes or goes"""
+        import win32api
+        return win32api.GetLogicalDrives()
+
+    def drive_info(self, drive_letter):
+        """Get detailed drive information"""
+        try:
+            import psutil
+            import win32api
+
+            drive_path = f"{drive_letter}:\\"
+
+            if not os.path.exists(drive_path):
+                return None
+
+            usage = psutil.disk_usage(drive_path)
+
+            # Get volume label
+            try:
+                volume_info = win32api.GetVolumeInformation(drive_path)
+                label = volume_info[0] if volume_info[0] else "Removable Drive"
+                file_system = volume_info[4]
+            except:
+                label = "Removable Drive"
+                file_system = "Unknown"
+
+            return {
+                'letter': drive_letter,
+                'label': label,
+                'file_system': file_system,
+                'total_bytes': usage.total,
+                'free_bytes': usage.free,
+                'used_bytes': usage.used
+            }
+
+        except Exception as e:
+            print(f"Error getting drive info: {e}")
+            return None
+
+
+class FakeDriveBackend:
+    """A device table set in code, for tests and for running the UI without USB sticks
+
+    drives are dicts like the ones WindowsDriveBackend.list_drives returns;
+    assign a new list to plug or unplug drives. delay makes every scan that
+    many seconds slow, like a dying stick.
+    """
+
+    def __init__(self, drives=(), delay=0.0):
+        self.drives = list(drives)
+        self.delay = delay
+
+    def list_drives(self):
+        if self.delay:
+            time.sleep(self.delay)
+        return [dict(drive) for drive in self.drives]
+
+    def signature(self):
+        return tuple(sorted(drive['letter'] for drive in self.drives))
+
+    def drive_info(self, drive_letter):
+        for drive in self.drives:
+            if drive['letter'] == drive_letter:
+                return dict(drive)
+        return None
+
+
+class USBHandler:
+    """USB drive enumeration through a pluggable backend
+
+    Scans are cached for cache_ttl seconds and can run on a worker thread
+    (get_usb_drives_async), so a slow or dying stick never blocks the
+    caller. start_monitor() reports the drive list whenever drives are
+    plugged in or removed.
+    """
+
+    def __init__(self, backend=None, cache_ttl=DRIVE_CACHE_TTL):
+        self.backend = backend or WindowsDriveBackend()
+        self.cache_ttl = cache_ttl
+        self._drives = None
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        self._scan_thread = None
+        self._scan_callbacks = []
+
+    def get_usb_drives(self, max_age=None):
+        """Get list of USB drives, reusing a scan no older than max_age seconds (default cache_ttl)"""
+        max_age = self.cache_ttl if max_age is None else max_age
+        with self._lock:
+            if self._drives is not None and time.monotonic() - self._scanned_at <= max_age:
+                return list(self._drives)
+
+        drives = self.backend.list_drives()
+        with self._lock:
+            self._drives = drives
+            self._scanned_at = time.monotonic()
+        return list(drives)
+
+    def get_usb_drives_async(self, callback, max_age=None):
+        """Call callback(drives) from a worker thread once the drives are enumerated
+
+        Requests made while a scan is running share its result.
+        """
+        with self._lock:
+            self._scan_callbacks.append(callback)
+            if self._scan_thread is not None:
+                return
+            self._scan_thread = threading.Thread(target=self._scan, args=(max_age,), daemon=True)
+            self._scan_thread.start()
+
+    def _scan(self, max_age):
+        try:
+            drives = self.get_usb_drives(max_age)
+        except Exception as e:
+            print(f"Error getting USB drives: {e}")
+            drives = []
+
+        with self._lock:
+            callbacks, self._scan_callbacks = self._scan_callbacks, []
+            self._scan_thread = None
+        for callback in callbacks:
+            callback(drives)
+
+    def invalidate(self):
+        """Forget the cached scan, so the next one reads the drives again"""
+        with self._lock:
+            self._drives = None
+
+    def start_monitor(self, callback, interval=HOTPLUG_POLL_INTERVAL):
+        """Start a DriveMonitor calling callback(drives) from its thread when drives change"""
+        monitor = DriveMonitor(self, callback, interval)
+        monitor.start()
+        return monitor
+
     def format_drive(self, drive_letter, volume_name, file_system="FAT32"):
         """Format USB drive"""
         try:
             # Use Windows format command
             cmd = f'format {drive_letter}: /FS:{file_system} /V:"{volume_name}" /Q /Y'
-            
+
             result = subprocess.run(
                 cmd,
                 shell=True,
@@ -67,48 +212,71 @@ class USBHandler:
                 text=True,
                 timeout=300
             )
-            
+
             return result.returncode == 0
-            
+
         except Exception as e:
             print(f"Error formatting drive: {e}")
             return False
-            
+
     def is_drive_mounted(self, drive_letter):
         """Check if drive is mounted"""
         try:
             return os.path.exists(f"{drive_letter}:\\")
         except:
             return False
-            
+
     def get_drive_info(self, drive_letter):
         """Get detailed drive information"""
+        return self.backend.drive_info(drive_letter)
+
+
+class DriveMonitor(threading.Thread):
+    """Watches for drives being plugged in or removed
+
+    The backend's signature() is checked every interval seconds (for
+    WindowsDriveBackend a single GetLogicalDrives call) and the drives are
+    only scanned when it changes. Hotplug is Windows-only: there is no
+    drive backend for other platforms. callback(drives) runs on this
+    thread, only when the drive list differs from the last report.
+    """
+
+    def __init__(self, handler, callback, interval=HOTPLUG_POLL_INTERVAL):
+        super().__init__(daemon=True)
+        self.handler = handler
+        self.callback = callback
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._reported = None
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        self._report()
+        signature = self._signature()
+
+        while not self._stopped.wait(self.interval):
+            current = self._signature()
+            if current != signature:
+                signature = current
+                self._report()
+
+    def _signature(self):
         try:
-            drive_path = f"{drive_letter}:\\"
-            
-            if not os.path.exists(drive_path):
-                return None
-                
-            usage = psutil.disk_usage(drive_path)
-            
-            # Get volume label
-            try:
-                volume_info = win32api.GetVolumeInformation(drive_path)
-                label = volume_info[0] if volume_info[0] else "Removable Drive"
-                file_system = volume_info[4]
-            except:
-                label = "Removable Drive"
-                file_system = "Unknown"
-                
-            return {
-                'letter': drive_letter,
-                'label': label,
-                'file_system': file_system,
-                'total_bytes': usage.total,
-                'free_bytes': usage.free,
-                'used_bytes': usage.used
-            }
-            
+            return self.handler.backend.signature()
+        except Exception:
+            return None
+
+    def _report(self):
+        """Rescan and call back if the drives changed"""
+        self.handler.invalidate()
+        try:
+            drives = self.handler.get_usb_drives()
         except Exception as e:
-            print(f"Error getting drive info: {e}")
-            return None
\ No newline at end of file
+            print(f"Error getting USB drives: {e}")
+            return
+
+        if drives != self._reported:
+            self._reported = drives
+            self.callback(drives)
@@ -0,0 +1,249 @@
+import hashlib
+import os
+import queue
+import random
+import threading
+import time
+
+from core.compressed_image import is_compressed, open_image
+from core.file_splitter import slice_extents
+
+VERIFY_MODES = ("full", "sampled", "hash")
+
+# Target reads are rounded up to whole sectors so raw devices accept them
+SECTOR_ALIGNMENT = 4096
+
+
+class ImageVerifier:
+    """Read back what was written and compare it against the source
+
+    Modes:
+        full    - compare every byte
+        sampled - compare a random sample_percent of the blocks
+        hash    - stream both sides into SHA-256 on a worker thread and
+                  compare the digests of each block
+
+    Every mismatch is recorded as (name, offset) with the offset of the
+    block that differs; a copied file of the wrong size is reported at
+    the end of the shorter side.
+    """
+
+    def __init__(self, mode="full", block_size=4 * 1024 * 1024, sample_percent=5, seed=None):
+        if mode not in VERIFY_MODES:
+            raise Exception(f"Unknown verify mode: {mode}")
+        if block_size <= 0 or block_size % SECTOR_ALIGNMENT:
+            raise Exception(f"Block size must be a multiple of {SECTOR_ALIGNMENT} bytes")
+
+        self.mode = mode
+        self.block_size = block_size
+        self.sample_percent = sample_percent
+        self.random = random.Random(seed)
+        self.progress_callback = None
+
+        self.bytes_verified = 0
+        self.bytes_planned = 0
+        self.elapsed = 0.0
+        self.mismatches = []
+
+    @property
+    def throughput(self):
+        """Average verify speed of the last run in bytes per second"""
+        return self.bytes_verified / self.elapsed if self.elapsed else 0.0
+
+    def verify_raw(self, source_path, target_path, progress_callback=None, size=None):
+        """Verify a raw write: the target must start with the source image
+
+        Compressed images are decompressed again while verifying; size is
+        their decompressed size (RawImageWriter.bytes_done after the write).
+        """
+        if size is None:
+            if is_compressed(source_path):
+                raise Exception("Verifying a compressed image needs its decompressed size")
+            size = os.path.getsize(source_path)
+        segments = [([(0, size)], size, target_path, os.path.basename(source_path), False)]
+        return self._verify(source_path, segments, progress_callback)
+
+    def verify_tree(self, iso_path, catalog, target_root, progress_callback=None, split_files=None):
+        """Verify a file-copy write against the files listed in an ISOCatalog
+
+        split_files maps catalog indexes of files that were split for FAT32
+        to their (chunk path, offset, size) pieces; each piece is checked
+        against its slice of the file. Files mapped to None (.swm parts)
+        can't be compared byte for byte and are skipped.
+        """
+        split_files = split_files or {}
+        segments = []
+        for index in sorted(catalog.files(), key=lambda i: catalog.lbas[i]):
+            extents = catalog.file_extents(index)
+            if index in split_files:
+                for chunk_path, start, size in split_files[index] or ():
+                    segments.append((slice_extents(extents, start, size), size, chunk_path,
+                                     os.path.relpath(chunk_path, target_root), True))
+                continue
+
+            target_path = os.path.join(target_root, catalog.paths[index])
+            segments.append((extents, catalog.sizes[index], target_path, catalog.paths[index], True))
+        return self._verify(iso_path, segments, progress_callback)
+
+    def _verify(self, source_path, segments, progress_callback):
+        """Verify (source_extents, size, target_path, name, exact_size) segments
+
+        source_extents lists the (offset, length) pieces of the source that
+        make up the segment, in order; an offset of None reads as zeros.
+        exact_size means the target must be exactly size bytes long (copied
+        files); raw targets are devices that are larger than the image.
+        Returns True when everything matched.
+        """
+        self.progress_callback = progress_callback
+        self.bytes_verified = 0
+        self.elapsed = 0.0
+        self.mismatches = []
+
+        blocks = self._plan_blocks(segments)
+        total = sum(length for _, blocks_of in blocks for _, length in blocks_of) or 1
+        self.bytes_planned = total
+        start = time.perf_counter()
+
+        hasher = None
+        if self.mode == "hash":
+            hasher = _HashWorker(self.mismatches)
+            hasher.start()
+
+        try:
+            # Blocks are read in ascending order, so compressed sources only seek forwards
+            with open_image(source_path) as source:
+                for (source_extents, size, target_path, name, exact_size), blocks_of in blocks:
+                    try:
+                        target = open(target_path, 'rb', buffering=0)
+                    except FileNotFoundError:
+                        self.mismatches.append((name, 0))
+                        continue
+
+                    with target:
+                        target_size = os.fstat(target.fileno()).st_size
+                        if exact_size and target_size != size:
+                            self.mismatches.append((name, min(size, target_size)))
+                            continue
+
+                        self._drop_cache(target)
+                        if hasher:
+                            hasher.begin(name)
+
+                        for offset, length in blocks_of:
+                            source_data = self._read_source(source, source_extents, offset, length)
+                            target.seek(offset)
+                            target_data = target.read(length + (-length % SECTOR_ALIGNMENT))[:length]
+
+                            if hasher:
+                                hasher.put(offset, source_data, target_data)
+                            elif source_data != target_data:
+                                self.mismatches.append((name, offset))
+
+                            self.bytes_verified += length
+                            self._update_progress(start, total)
+        finally:
+            if hasher:
+                hasher.finish()
+
+        self.elapsed = time.perf_counter() - start
+        return not self.mismatches
+
+    @staticmethod
+    def _read_source(source, extents, offset, length):
+        """Read length bytes at offset of the data described by extents"""
+        if len(extents) == 1 and extents[0][0] is not None:
+            source.seek(extents[0][0] + offset)
+            return source.read(length)
+
+        parts = []
+        start = 0
+        for position, extent_length in extents:
+            end = start + extent_length
+            if end > offset and start < offset + length:
+                skip = max(0, offset - start)
+                count = min(end, offset + length) - start - skip
+                if position is None:
+                    parts.append(bytes(count))
+                else:
+                    source.seek(position + skip)
+                    parts.append(source.read(count))
+            start = end
+        return b''.join(parts)
+
+    def _plan_blocks(self, segments):
+        """Split segments into blocks, keeping only a sample in sampled mode"""
+        planned = []
+        for segment in segments:
+            size = segment[1]
+            blocks_of = [
+                (offset, min(self.block_size, size - offset))
+                for offset in range(0, size, self.block_size)
+            ]
+            if not blocks_of:
+                # Empty files still have to exist on the target
+                blocks_of = [(0, 0)]
+            planned.append((segment, blocks_of))
+
+        if self.mode == "sampled":
+            every = [(i, j) for i, (_, blocks_of) in enumerate(planned) for j in range(len(blocks_of))]
+            count = max(1, int(len(every) * self.sample_percent / 100)) if every else 0
+            chosen = set(self.random.sample(every, count))
+            planned = [
+                (segment, [block for j, block in enumerate(blocks_of) if (i, j) in chosen])
+                for i, (segment, blocks_of) in enumerate(planned)
+            ]
+            planned = [(segment, blocks_of) for segment, blocks_of in planned if blocks_of]
+
+        return planned
+
+    def _drop_cache(self, target):
+        """Ask the OS to forget cached pages so we read what is really on the device"""
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(target.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            except OSError:
+                pass
+
+    def _update_progress(self, start, total):
+        """Report (percentage, status) with the verify speed"""
+        if self.progress_callback:
+            elapsed = time.perf_counter() - start
+            rate = self.bytes_verified / elapsed / (1024 * 1024) if elapsed else 0.0
+            progress = min(100, (self.bytes_verified / total) * 100)
+            self.progress_callback(progress, f"Verifying... {rate:.1f} MB/s")
+
+
+class _HashWorker(threading.Thread):
+    """Hashes source/target block pairs off the reading thread
+
+    hashlib releases the GIL on large buffers, so the next blocks are read
+    while the previous ones are being hashed.
+    """
+
+    def __init__(self, mismatches):
+        super().__init__(daemon=True)
+        self.mismatches = mismatches
+        self.queue = queue.Queue(maxsize=8)
+
+    def begin(self, name):
+        self.queue.put(('begin', name))
+
+    def put(self, offset, source_data, target_data):
+        self.queue.put(('block', offset, source_data, target_data))
+
+    def finish(self):
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        name = None
+
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+
+            if item[0] == 'begin':
+                name = item[1]
+            elif hashlib.sha256(item[2]).digest() != hashlib.sha256(item[3]).digest():
+                self.mismatches.append((name, item[1]))
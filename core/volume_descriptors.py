@@ -0,0 +1,169 @@
+import struct
+
+SECTOR_SIZE = 2048
+FIRST_DESCRIPTOR_SECTOR = 16
+
+# Sectors fetched per read; real descriptor sets are 3-6 sectors long
+READ_AHEAD_SECTORS = 16
+
+# Descriptor set is bounded to stop runaway parsing of corrupt images
+MAX_DESCRIPTORS = 64
+
+TYPE_BOOT_RECORD = 0
+TYPE_PRIMARY = 1
+TYPE_SUPPLEMENTARY = 2
+TYPE_PARTITION = 3
+TYPE_TERMINATOR = 255
+
+# Escape sequences that mark a supplementary descriptor as Joliet level 1-3
+JOLIET_ESCAPES = {b'%/@': 1, b'%/C': 2, b'%/E': 3}
+
+EL_TORITO_ID = b'EL TORITO SPECIFICATION'
+
+# Volume recognition sequence entries that follow the ISO 9660 set on
+# UDF-bridge images; NSR02/NSR03 announce a UDF file system
+UDF_RECOGNITION_IDS = (b'BEA01', b'NSR02', b'NSR03', b'TEA01', b'BOOT2', b'CDW02')
+UDF_NSR_IDS = (b'NSR02', b'NSR03')
+
+
+class VolumeDescriptor:
+    """A primary or supplementary (Joliet) volume descriptor"""
+
+    def __init__(self, sector, data):
+        self.sector = sector
+        self.type = data[0]
+        self.version = data[6]
+
+        self.joliet_level = 0
+        if self.type == TYPE_SUPPLEMENTARY:
+            escapes = data[88:120]
+            for escape, level in JOLIET_ESCAPES.items():
+                if escapes.startswith(escape):
+                    self.joliet_level = level
+
+        encoding = 'utf-16-be' if self.joliet_level else 'ascii'
+        self.system_id = self._text(data[8:40], encoding)
+        self.volume_id = self._text(data[40:72], encoding)
+
+        self.volume_space_size = struct.unpack_from('<I', data, 80)[0]
+        self.logical_block_size = struct.unpack_from('<H', data, 128)[0]
+        self.path_table_size = struct.unpack_from('<I', data, 132)[0]
+        self.l_path_table = struct.unpack_from('<I', data, 140)[0]
+        self.m_path_table = struct.unpack_from('>I', data, 148)[0]
+
+        # Root directory record lives at offset 156
+        self.root_lba, self.root_size = struct.unpack_from('<I4xI', data, 158)
+
+        self.creation_date = data[813:830].decode('ascii', errors='ignore')
+
+    @staticmethod
+    def _text(raw, encoding):
+        return raw.decode(encoding, errors='ignore').rstrip(' \x00') or None
+
+    @property
+    def is_joliet(self):
+        return self.joliet_level > 0
+
+
+class BootRecord:
+    """A boot record volume descriptor (El Torito when boot_system_id matches)"""
+
+    def __init__(self, sector, data):
+        self.sector = sector
+        self.boot_system_id = data[7:39].rstrip(b'\x00 ')
+        self.boot_id = data[39:71].rstrip(b'\x00 ')
+
+        self.boot_catalog_lba = None
+        if self.is_el_torito:
+            self.boot_catalog_lba = struct.unpack_from('<I', data, 71)[0]
+
+    @property
+    def is_el_torito(self):
+        return self.boot_system_id == EL_TORITO_ID
+
+
+class VolumeDescriptorSet:
+    """All volume descriptors of an ISO 9660 image, read in one go
+
+    Reads from sector 16 up to the set terminator in bulk and decodes the
+    primary, supplementary (Joliet) and boot record descriptors, wherever
+    in the set they appear. The UDF volume recognition sequence that
+    follows on UDF-bridge images is scanned in the same read.
+    """
+
+    def __init__(self):
+        self.primary = None
+        self.supplementary = []
+        self.boot_record = None
+        self.terminated = False
+        self.udf = False
+        self.first_sector = b''
+
+    @classmethod
+    def from_path(cls, iso_path):
+        """Parse the descriptor set of an ISO file on disk"""
+        with open(iso_path, 'rb') as iso_file:
+            return cls.from_file(iso_file)
+
+    @classmethod
+    def from_file(cls, iso_file):
+        """Parse the descriptor set of an open ISO file"""
+        descriptors = cls()
+
+        iso_file.seek(FIRST_DESCRIPTOR_SECTOR * SECTOR_SIZE)
+        data = iso_file.read(READ_AHEAD_SECTORS * SECTOR_SIZE)
+        descriptors.first_sector = data[:SECTOR_SIZE]
+
+        index = 0
+        while index < MAX_DESCRIPTORS:
+            offset = index * SECTOR_SIZE
+            if offset + SECTOR_SIZE > len(data):
+                # Unusually long set; fetch the next batch of sectors
+                more = iso_file.read(READ_AHEAD_SECTORS * SECTOR_SIZE)
+                if not more:
+                    break
+                data += more
+                continue
+
+            sector = data[offset:offset + SECTOR_SIZE]
+            identifier = sector[1:6]
+            if identifier == b'CD001' and not descriptors.terminated:
+                descriptors._add(FIRST_DESCRIPTOR_SECTOR + index, sector)
+            elif identifier in UDF_RECOGNITION_IDS:
+                if identifier in UDF_NSR_IDS:
+                    descriptors.udf = True
+                if identifier == b'TEA01':
+                    break
+            else:
+                break
+            index += 1
+
+        return descriptors
+
+    def _add(self, sector_number, sector):
+        descriptor_type = sector[0]
+
+        if descriptor_type == TYPE_PRIMARY and self.primary is None:
+            self.primary = VolumeDescriptor(sector_number, sector)
+        elif descriptor_type == TYPE_SUPPLEMENTARY:
+            self.supplementary.append(VolumeDescriptor(sector_number, sector))
+        elif descriptor_type == TYPE_BOOT_RECORD and self.boot_record is None:
+            self.boot_record = BootRecord(sector_number, sector)
+        elif descriptor_type == TYPE_TERMINATOR:
+            self.terminated = True
+
+    @property
+    def valid(self):
+        """True if the image has an ISO 9660 descriptor set or a UDF file system"""
+        return self.primary is not None or self.udf
+
+    @property
+    def joliet(self):
+        """The highest-level Joliet descriptor, or None"""
+        joliet = [d for d in self.supplementary if d.is_joliet]
+        return max(joliet, key=lambda d: d.joliet_level) if joliet else None
+
+    @property
+    def el_torito(self):
+        """True if the set contains an El Torito boot record"""
+        return self.boot_record is not None and self.boot_record.is_el_torito
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+
+from core.metadata_cache import default_cache_dir
+
+JOURNAL_VERSION = 1
+
+# The target is flushed and the journal saved after this much new data
+CHECKPOINT_INTERVAL = 256 * 1024 * 1024
+
+# Bytes before a raw checkpoint, and at the end of a copied file, that are
+# hashed and read back on resume
+BOUNDARY_SIZE = 1024 * 1024
+FILE_BOUNDARY_SIZE = 64 * 1024
+
+
+def default_journal_dir():
+    return os.path.join(default_cache_dir(), "journals")
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class WriteJournal:
+    """Progress record of one write job, so an interrupted job can resume
+
+    Raw writes record checkpoints: image offsets up to which the target
+    was flushed, with a hash of the data just before each one. File copies
+    record finished files with a hash of their last bytes. Everything in
+    the journal was flushed to the target before the journal was saved,
+    so resuming only re-reads the boundary: the newest checkpoint, or the
+    files finished since the one before it.
+
+    A journal belongs to one source file (by size and mtime), one target
+    and one set of settings; if any of them changed it starts out empty.
+    """
+
+    def __init__(self, source_path, target, mode, settings=None, journal_dir=None,
+                 checkpoint_interval=CHECKPOINT_INTERVAL):
+        source_path = os.path.abspath(source_path)
+        info = os.stat(source_path)
+        key = digest(f"{mode}|{source_path}|{target}".encode('utf-8'))[:16]
+
+        self.path = os.path.join(journal_dir or default_journal_dir(), f"{key}.json")
+        self.checkpoint_interval = checkpoint_interval
+        self.header = {
+            'version': JOURNAL_VERSION,
+            'mode': mode,
+            'source': [source_path, info.st_size, info.st_mtime_ns],
+            'target': target,
+            'settings': settings or {},
+        }
+        self.checkpoints = []
+        self.files = {}
+        self.batch = 0
+        self._load()
+
+    @property
+    def resuming(self):
+        """True when an earlier run of this job left progress behind"""
+        return bool(self.checkpoints or self.files)
+
+    def _load(self):
+        """Pick up the saved journal if it belongs to this exact job"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Ignoring unreadable write journal: {e}")
+            return
+
+        # Compare through JSON so tuples in the settings match the saved lists
+        expected = json.loads(json.dumps(self.header))
+        if any(data.get(key) != value for key, value in expected.items()):
+            return
+
+        self.checkpoints = data.get('checkpoints', [])
+        self.files = data.get('files', {})
+        # The saved batch is complete; files copied from now on start a new one
+        self.batch = data.get('batch', 0) + 1
+
+    def save(self):
+        """Atomically replace the saved journal; call only after flushing the target"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(self.header, checkpoints=self.checkpoints, files=self.files, batch=self.batch), f)
+        os.replace(temp_path, self.path)
+
+    def discard(self):
+        """Forget the job, after it finished or when starting it over"""
+        self.checkpoints = []
+        self.files = {}
+        self.batch = 0
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def checkpoint(self, position, boundary):
+        """Record that the image up to position is on the target; boundary is the data just before it"""
+        self.checkpoints.append([position, len(boundary), digest(boundary)])
+        self.save()
+
+    def verified_offset(self, target_path):
+        """Offset a raw write can resume from: the newest checkpoint whose boundary reads back intact"""
+        try:
+            with open(target_path, 'rb', buffering=0) as target:
+                while self.checkpoints:
+                    position, length, expected = self.checkpoints[-1]
+                    target.seek(position - length)
+                    if digest(target.read(length)) == expected:
+                        return position
+                    self.checkpoints.pop()
+        except OSError as e:
+            print(f"Error reading back the write boundary: {e}")
+            self.checkpoints = []
+        return 0
+
+    def add_file(self, path, size, tail):
+        """Record a copied file in the current batch; saved by the next commit()"""
+        self.files[path] = [size, digest(tail), self.batch]
+
+    def commit(self):
+        """Save the files copied (and flushed) since the last commit as one batch"""
+        self.save()
+        self.batch += 1
+
+    def verified_files(self, target_root):
+        """Paths that don't need copying again
+
+        Only the newest batch can have been cut short by an unplug, so its
+        files are read back; older batches were flushed before a later save
+        and only have their sizes checked.
+        """
+        newest = max((batch for _, _, batch in self.files.values()), default=None)
+        for path, (size, expected, batch) in list(self.files.items()):
+            full_path = os.path.join(target_root, *path.split('/'))
+            try:
+                with open(full_path, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size == size:
+                        if batch != newest:
+                            continue
+                        f.seek(max(0, size - FILE_BOUNDARY_SIZE))
+                        if digest(f.read()) == expected:
+                            continue
+            except OSError:
+                pass
+            del self.files[path]
+
+        return set(self.files)
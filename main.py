@@ -1,18 +1,7 @@
 import customtkinter as ctk
-import tkinter as tk
-from tkinter import filedialog, messagebox
-import threading
-import os
-import sys
-import subprocess
-import time
-from pathlib import Path
 
-# Import our modules
+# Only the window is imported up front; it loads the imaging code on first use
 from ui.main_window import MainWindow
-from core.iso_handler import ISOHandler
-from core.usb_handler import USBHandler
-from core.flasher import ISOFlasher
 
 def main():
     # Set appearance mode and color theme
@@ -24,4 +13,4 @@ def main():
     app.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,87 @@
+"""Reads FAT32 volumes back for the tests, independently of core.fat32"""
+import struct
+
+
+class FATVolume:
+    """A FAT32 volume at offset bytes into an image file"""
+
+    def __init__(self, path, offset=0):
+        self.path = path
+        self.offset = offset
+        self.boot = self.read(0, 512)
+        (self.bytes_per_sector, self.sectors_per_cluster, self.reserved_sectors,
+         self.fat_count) = struct.unpack_from('<HBHB', self.boot, 11)
+        self.hidden_sectors, self.total_sectors, self.fat_sectors = struct.unpack_from('<III', self.boot, 28)
+        self.root_cluster = struct.unpack_from('<I', self.boot, 44)[0]
+        self.label = self.boot[71:82]
+
+        self.cluster_size = self.bytes_per_sector * self.sectors_per_cluster
+        fat_start = self.reserved_sectors * self.bytes_per_sector
+        self.fat_size = self.fat_sectors * self.bytes_per_sector
+        self.fats = [self.read(fat_start + n * self.fat_size, self.fat_size) for n in range(self.fat_count)]
+        self.data_start = fat_start + self.fat_count * self.fat_size
+
+    def read(self, position, length):
+        """Bytes of the volume; past the end of a sparse image they read as zeros"""
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset + position)
+            return f.read(length).ljust(length, b'\x00')
+
+    def sector(self, number):
+        return self.read(number * self.bytes_per_sector, self.bytes_per_sector)
+
+    def fat_entry(self, cluster, copy=0):
+        return struct.unpack_from('<I', self.fats[copy], cluster * 4)[0] & 0x0FFFFFFF
+
+    def chain(self, cluster):
+        clusters = []
+        while 2 <= cluster < 0x0FFFFFF8:
+            clusters.append(cluster)
+            cluster = self.fat_entry(cluster)
+        return clusters
+
+    def read_chain(self, cluster):
+        return b''.join(self.read(self.data_start + (c - 2) * self.cluster_size, self.cluster_size)
+                        for c in self.chain(cluster))
+
+    def entries(self, cluster):
+        """Yield (name, short_name, attributes, first_cluster, size) of a directory"""
+        data = self.read_chain(cluster)
+        long_parts = []
+        for offset in range(0, len(data), 32):
+            entry = data[offset:offset + 32]
+            if entry[0] == 0:
+                break
+            if entry[0] == 0xE5:
+                long_parts = []
+                continue
+            attributes = entry[11]
+            if attributes == 0x0F:
+                part = entry[1:11] + entry[14:26] + entry[28:32]
+                long_parts.insert(0, part)
+                continue
+
+            short_name = entry[0:11]
+            first = (struct.unpack_from('<H', entry, 20)[0] << 16) | struct.unpack_from('<H', entry, 26)[0]
+            size = struct.unpack_from('<I', entry, 28)[0]
+            if long_parts:
+                name = b''.join(long_parts).decode('utf-16-le').split('\x00')[0]
+            else:
+                base, ext = short_name[:8].decode().rstrip(), short_name[8:].decode().rstrip()
+                name = f"{base}.{ext}" if ext else base
+            long_parts = []
+            yield name, short_name, attributes, first, size
+
+    def walk(self, cluster=None, prefix=''):
+        """{path: (attributes, data or None for directories)} of the whole tree"""
+        tree = {}
+        for name, _, attributes, first, size in self.entries(cluster or self.root_cluster):
+            if attributes & 0x08 or name in ('.', '..'):
+                continue
+            path = f"{prefix}{name}"
+            if attributes & 0x10:
+                tree[path] = (attributes, None)
+                tree.update(self.walk(first, path + '/'))
+            else:
+                tree[path] = (attributes, self.read_chain(first)[:size] if first else b'')
+        return tree
@@ -0,0 +1,325 @@
+"""Builds small ISO 9660 images for the tests
+
+Supports Rock Ridge names and symbolic links (with deep directory
+relocation), a Joliet tree, files split into several extents and an El
+Torito boot catalog.
+"""
+import struct
+
+SECTOR_SIZE = 2048
+
+
+def both16(value):
+    return struct.pack('<H', value) + struct.pack('>H', value)
+
+
+def both32(value):
+    return struct.pack('<I', value) + struct.pack('>I', value)
+
+
+def susp(signature, body):
+    """One System Use entry"""
+    return signature + bytes([4 + len(body), 1]) + body
+
+
+def directory_record(identifier, lba, size, flags, system_use=b''):
+    length = 33 + len(identifier)
+    padding = b'\x00' if length % 2 else b''
+    length += len(padding) + len(system_use)
+    return (bytes([length, 0]) + both32(lba) + both32(size) + bytes(7) + bytes([flags, 0, 0])
+            + both16(1) + bytes([len(identifier)]) + identifier + padding + system_use)
+
+
+class Node:
+    def __init__(self, name, data=None):
+        self.name = name
+        self.data = data
+        self.children = []
+        self.parent = None
+        self.lba = 0
+        self.joliet_lba = 0
+        self.relocated = False  # Moved into rr_moved, carries RE
+        self.link = None  # Placeholder of a relocated directory, carries CL
+        self.symlink = None  # Rock Ridge symbolic link target, carries SL
+
+    @property
+    def directory(self):
+        return self.data is None
+
+    @property
+    def path(self):
+        if self.parent is None:
+            return ''
+        parent = self.parent.path
+        return f"{parent}/{self.name}" if parent else self.name
+
+
+class ISOBuilder:
+    """Collects files and directories, then lays them out in build()
+
+    extent_size splits files into multi-extent records of at most that
+    many bytes (a multiple of the sector size), with extent_gap unused
+    sectors after each extent. relocate lists directory
+    paths that Rock Ridge moves into /rr_moved, leaving a CL placeholder;
+    it can't be combined with a Joliet tree.
+    """
+
+    def __init__(self, rock_ridge=False, joliet=False, extent_size=None, extent_gap=0, relocate=(), boot=None):
+        self.rock_ridge = rock_ridge
+        self.joliet = joliet
+        self.extent_size = extent_size
+        self.extent_gap = extent_gap
+        self.relocate = set(relocate)
+        self.boot = boot  # None, or a list of "bios"/"uefi" boot entries
+        self.root = Node('')
+
+    def add(self, path, data=None):
+        """Add a file (data given) or directory, creating parent directories"""
+        parts = path.strip('/').split('/')
+        node = self.root
+        for number, name in enumerate(parts):
+            last = number == len(parts) - 1
+            child = next((c for c in node.children if c.name == name), None)
+            if child is None:
+                child = Node(name, data if last else None)
+                child.parent = node
+                node.children.append(child)
+            node = child
+        return node
+
+    def add_symlink(self, path, target):
+        """Add a Rock Ridge symbolic link to target"""
+        node = self.add(path, b'')
+        node.symlink = target
+        return node
+
+    def build(self, path):
+        logical = self._directories(self.root)
+        physical_root = self.root
+        if self.relocate:
+            self._apply_relocation()
+        directories = self._directories(physical_root)
+
+        lba = 16
+        layout = {'pvd': lba}
+        lba += 1
+        if self.boot:
+            layout['boot_record'] = lba
+            lba += 1
+        if self.joliet:
+            layout['svd'] = lba
+            lba += 1
+        layout['terminator'] = lba
+        lba += 1
+        layout['l_table'], layout['m_table'] = lba, lba + 1
+        lba += 2
+        if self.joliet:
+            layout['joliet_l_table'], layout['joliet_m_table'] = lba, lba + 1
+            lba += 2
+
+        for directory in directories:
+            directory.lba = lba
+            lba += 1
+        if self.joliet:
+            for directory in logical:
+                directory.joliet_lba = lba
+                lba += 1
+        if self.boot:
+            layout['catalog'] = lba
+            layout['boot_image'] = lba + 1
+            lba += 2
+
+        files = [child for directory in directories for child in directory.children
+                 if not child.directory and child.link is None]
+        for node in files:
+            node.lba = lba
+            lba += max(1, sum(-(-length // SECTOR_SIZE) + self.extent_gap for _, _, length in self._extents(node)))
+
+        image = bytearray(lba * SECTOR_SIZE)
+
+        def put(sector, data):
+            image[sector * SECTOR_SIZE:sector * SECTOR_SIZE + len(data)] = data
+
+        for directory in directories:
+            put(directory.lba, self._directory_sector(directory, False))
+        if self.joliet:
+            for directory in logical:
+                put(directory.joliet_lba, self._directory_sector(directory, True))
+        for node in files:
+            for sector, start, length in self._extents(node):
+                put(node.lba + sector, node.data[start:start + length])
+
+        l_table = self._path_table(directories, '<', False)
+        put(layout['l_table'], l_table)
+        put(layout['m_table'], self._path_table(directories, '>', False))
+        put(layout['pvd'], self._volume_descriptor(1, layout['l_table'], layout['m_table'], len(l_table),
+                                                   physical_root.lba, lba))
+        if self.joliet:
+            joliet_table = self._path_table(logical, '<', True)
+            put(layout['joliet_l_table'], joliet_table)
+            put(layout['joliet_m_table'], self._path_table(logical, '>', True))
+            put(layout['svd'], self._volume_descriptor(2, layout['joliet_l_table'], layout['joliet_m_table'],
+                                                       len(joliet_table), self.root.joliet_lba, lba))
+        if self.boot:
+            self._boot(put, layout)
+
+        terminator = bytearray(SECTOR_SIZE)
+        terminator[0:7] = b'\xFFCD001\x01'
+        put(layout['terminator'], terminator)
+
+        with open(path, 'wb') as f:
+            f.write(image)
+        return path
+
+    def _directories(self, root):
+        """Directories breadth-first, as the path table lists them"""
+        result = []
+        level = [root]
+        while level:
+            result.extend(level)
+            level = [child for directory in level for child in sorted(directory.children, key=lambda c: c.name)
+                     if child.directory and child.link is None]
+        return result
+
+    def _apply_relocation(self):
+        moved = Node('rr_moved')
+        moved.parent = self.root
+        self.root.children.append(moved)
+        for path in sorted(self.relocate):
+            node = self.root
+            for name in path.split('/'):
+                node = next(c for c in node.children if c.name == name)
+            placeholder = Node(node.name, b'')
+            placeholder.link = node
+            placeholder.parent = node.parent
+            node.parent.children[node.parent.children.index(node)] = placeholder
+            node.parent = moved
+            node.relocated = True
+            moved.children.append(node)
+
+    def _identifier(self, node, joliet):
+        if joliet:
+            return node.name.encode('utf-16-be') + (b'' if node.directory else ';1'.encode('utf-16-be'))
+        name = node.name.upper().replace('-', '_')
+        return (name if node.directory or node.link is not None else name + ';1').encode('ascii')
+
+    def _rock_ridge(self, node):
+        name = node.name.encode('utf-8')
+        if node.symlink is not None:
+            mode = 0o120777
+        elif node.directory or node.link is not None:
+            mode = 0o40755
+        else:
+            mode = 0o100644
+        entries = susp(b'NM', b'\x00' + name) + susp(b'PX', both32(mode) + both32(1) + both32(0) + both32(0))
+        if node.symlink is not None:
+            components = b''
+            for part in node.symlink.split('/'):
+                if not part:
+                    components += b'\x08\x00' if not components else b''
+                else:
+                    components += bytes([0, len(part)]) + part.encode('utf-8')
+            entries += susp(b'SL', b'\x00' + components)
+        if node.link is not None:
+            entries += susp(b'CL', both32(node.link.lba))
+        if node.relocated:
+            entries += susp(b'RE', b'')
+        return entries
+
+    def _extents(self, node):
+        """(sector offset from node.lba, data offset, length) of each extent of a file"""
+        size = len(node.data)
+        step = self.extent_size or max(size, 1)
+        extents = []
+        sector = 0
+        for start in range(0, size, step) or [0]:
+            length = min(step, size - start)
+            extents.append((sector, start, length))
+            sector += -(-length // SECTOR_SIZE) + self.extent_gap
+        return extents
+
+    def _directory_sector(self, directory, joliet):
+        parent = directory.parent or directory
+        own_lba = directory.joliet_lba if joliet else directory.lba
+        parent_lba = parent.joliet_lba if joliet else parent.lba
+
+        dot_system_use = b''
+        if self.rock_ridge and not joliet and directory.parent is None:
+            dot_system_use = b'SP\x07\x01\xBE\xEF\x00'
+        records = [directory_record(b'\x00', own_lba, SECTOR_SIZE, 2, dot_system_use),
+                   directory_record(b'\x01', parent_lba, SECTOR_SIZE, 2)]
+
+        for child in sorted(directory.children, key=lambda c: self._identifier(c, joliet)):
+            identifier = self._identifier(child, joliet)
+            system_use = self._rock_ridge(child) if self.rock_ridge and not joliet else b''
+
+            if child.directory:
+                lba = child.joliet_lba if joliet else child.lba
+                records.append(directory_record(identifier, lba, SECTOR_SIZE, 2, system_use))
+            elif child.link is not None:
+                records.append(directory_record(identifier, 0, 0, 0, system_use))
+            else:
+                extents = self._extents(child)
+                for number, (sector, _, length) in enumerate(extents):
+                    flags = 0x80 if number < len(extents) - 1 else 0
+                    records.append(directory_record(identifier, child.lba + sector, length, flags, system_use))
+
+        data = b''.join(records)
+        assert len(data) <= SECTOR_SIZE, "directory too large for the test builder"
+        return data
+
+    def _path_table(self, directories, endian, joliet):
+        numbers = {id(directory): number for number, directory in enumerate(directories, 1)}
+        table = b''
+        for directory in directories:
+            identifier = b'\x00' if directory.parent is None else self._identifier(directory, joliet)
+            lba = directory.joliet_lba if joliet else directory.lba
+            parent = numbers[id(directory.parent or directory)]
+            entry = bytes([len(identifier), 0]) + struct.pack(endian + 'IH', lba, parent) + identifier
+            table += entry + (b'\x00' if len(identifier) % 2 else b'')
+        return table
+
+    def _volume_descriptor(self, kind, l_table, m_table, table_size, root_lba, total):
+        descriptor = bytearray(SECTOR_SIZE)
+        descriptor[0:7] = bytes([kind]) + b'CD001\x01'
+        if kind == 2:
+            descriptor[40:72] = 'TESTVOL'.encode('utf-16-be').ljust(32, b'\x00')
+            descriptor[88:91] = b'%/E'
+        else:
+            descriptor[40:72] = b'TESTVOL'.ljust(32)
+        descriptor[80:88] = both32(total)
+        descriptor[120:124] = both16(1)
+        descriptor[124:128] = both16(1)
+        descriptor[128:132] = both16(SECTOR_SIZE)
+        descriptor[132:140] = both32(table_size)
+        descriptor[140:144] = struct.pack('<I', l_table)
+        descriptor[148:152] = struct.pack('>I', m_table)
+        descriptor[156:190] = directory_record(b'\x00', root_lba, SECTOR_SIZE, 2)
+        descriptor[813:830] = b'2024010112000000\x00'
+        descriptor[881] = 1
+        return bytes(descriptor)
+
+    def _boot(self, put, layout):
+        record = bytearray(SECTOR_SIZE)
+        record[0:7] = b'\x00CD001\x01'
+        record[7:39] = b'EL TORITO SPECIFICATION'.ljust(32, b'\x00')
+        record[71:75] = struct.pack('<I', layout['catalog'])
+        put(layout['boot_record'], record)
+
+        platforms = {"bios": 0, "uefi": 0xEF}
+        validation = bytearray(32)
+        validation[0] = 1
+        validation[1] = platforms[self.boot[0]]
+        validation[30:32] = b'\x55\xAA'
+        checksum = sum(struct.unpack('<16H', bytes(validation))) & 0xFFFF
+        validation[28:30] = struct.pack('<H', -checksum & 0xFFFF)
+
+        def entry(sectors):
+            return struct.pack('<BBHBBHI20x', 0x88, 0, 0, 0, 0, sectors, layout['boot_image'])
+
+        catalog = bytes(validation) + entry(4)
+        for number, platform in enumerate(self.boot[1:], 1):
+            last = number == len(self.boot) - 1
+            catalog += struct.pack('<BBH28x', 0x91 if last else 0x90, platforms[platform], 1) + entry(1)
+        put(layout['catalog'], catalog)
+        put(layout['boot_image'], b'\xEB\x3C\x90'.ljust(510, b'\x00') + b'\x55\xAA')
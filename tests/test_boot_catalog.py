@@ -0,0 +1,109 @@
+import struct
+
+import pytest
+
+from core.boot_catalog import PLATFORM_EFI, PLATFORM_X86, BootInfo
+from core.iso_handler import ISOHandler
+from core.metadata_cache import MetadataCache
+from core.volume_descriptors import SECTOR_SIZE, VolumeDescriptorSet
+from iso_builder import ISOBuilder
+
+
+def build(tmp_path, boot, name='boot.iso'):
+    builder = ISOBuilder(boot=boot)
+    builder.add('BOOT/ETFSBOOT.COM', b'e' * 100)
+    return builder.build(str(tmp_path / name))
+
+
+def read_boot_info(iso_path):
+    with open(iso_path, 'rb') as iso_file:
+        descriptors = VolumeDescriptorSet.from_file(iso_file)
+        return BootInfo.from_file(iso_file, descriptors.boot_record.boot_catalog_lba)
+
+
+def patch(iso_path, offset, data):
+    with open(iso_path, 'r+b') as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def test_bios_and_uefi_entries(tmp_path):
+    info = read_boot_info(build(tmp_path, ["bios", "uefi"]))
+
+    assert info.catalog_valid
+    assert [entry.platform_id for entry in info.entries] == [PLATFORM_X86, PLATFORM_EFI]
+    assert [entry.platform for entry in info.entries] == ["x86 BIOS", "UEFI"]
+    assert all(entry.bootable for entry in info.entries)
+    assert info.entries[0].emulation_type == "no emulation"
+    assert info.entries[0].size == 4 * 512
+    assert info.bios and info.uefi and not info.hybrid
+    assert info.recommended_target_system() == "BIOS or UEFI"
+    assert info.recommended_partition_scheme() == "MBR"
+
+
+def test_several_sections(tmp_path):
+    info = read_boot_info(build(tmp_path, ["bios", "uefi", "bios"]))
+
+    assert [entry.platform_id for entry in info.entries] == [PLATFORM_X86, PLATFORM_EFI, PLATFORM_X86]
+
+
+@pytest.mark.parametrize("boot, target, scheme, file_system", [
+    (["bios"], "BIOS (Legacy)", "MBR", None),
+    (["uefi"], "UEFI", "GPT", "FAT32"),
+    (["bios", "uefi"], "BIOS or UEFI", "MBR", "FAT32"),
+])
+def test_recommendations(tmp_path, boot, target, scheme, file_system):
+    handler = ISOHandler(MetadataCache(str(tmp_path / 'cache.json')))
+    boot_info = handler.get_boot_info(build(tmp_path, boot))
+
+    assert boot_info['target_system'] == target
+    assert boot_info['partition_scheme'] == scheme
+    # Everything but a BIOS-only drive must be FAT32; the UI preselects this
+    assert boot_info['file_system'] == file_system
+    assert boot_info['write_mode'] == "copy"
+
+
+def test_bad_validation_checksum_is_rejected(tmp_path):
+    iso_path = build(tmp_path, ["bios", "uefi"])
+    with open(iso_path, 'rb') as iso_file:
+        catalog_lba = VolumeDescriptorSet.from_file(iso_file).boot_record.boot_catalog_lba
+    patch(iso_path, catalog_lba * SECTOR_SIZE + 28, b'\x00\x00')
+
+    info = read_boot_info(iso_path)
+    assert not info.catalog_valid
+    assert info.entries == []
+    assert not info.bootable
+
+
+def test_isohybrid_mbr(tmp_path):
+    iso_path = build(tmp_path, ["bios"])
+    # One bootable partition of type 0x17 spanning the image
+    patch(iso_path, 446, struct.pack('<B3sB3sII', 0x80, bytes(3), 0x17, bytes(3), 0, 1000))
+    patch(iso_path, 510, b'\x55\xAA')
+
+    info = read_boot_info(iso_path)
+    assert info.hybrid_mbr and not info.hybrid_gpt
+    assert info.recommended_write_mode() == "raw"
+
+
+def test_isohybrid_gpt(tmp_path):
+    iso_path = build(tmp_path, ["bios", "uefi"])
+    patch(iso_path, 510, b'\x55\xAA')
+    patch(iso_path, 512, b'EFI PART')
+
+    info = read_boot_info(iso_path)
+    # A protective MBR alone (no partition entries) is not a hybrid MBR
+    assert info.hybrid_gpt and not info.hybrid_mbr
+    assert info.uefi
+    assert info.to_dict()['write_mode'] == "raw"
+
+
+def test_no_boot_catalog(tmp_path):
+    builder = ISOBuilder()
+    builder.add('README.TXT', b'hello\n')
+    handler = ISOHandler(MetadataCache(str(tmp_path / 'cache.json')))
+    boot_info = handler.get_boot_info(builder.build(str(tmp_path / 'data.iso')))
+
+    assert not boot_info['catalog_valid']
+    assert boot_info['entries'] == []
+    assert not boot_info['bios'] and not boot_info['uefi']
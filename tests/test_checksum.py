@@ -0,0 +1,106 @@
+import hashlib
+
+import pytest
+
+from core.checksum import find_checksum_file, hash_file, parse_checksum_file
+import core.iso_handler
+from core.iso_handler import ISOHandler
+from core.metadata_cache import MetadataCache
+
+DATA = b'not really an ISO\n' * 5000
+
+
+@pytest.fixture
+def handler(tmp_path):
+    return ISOHandler(MetadataCache(str(tmp_path / 'cache.json')))
+
+
+@pytest.fixture
+def iso(tmp_path):
+    path = tmp_path / 'win.iso'
+    path.write_bytes(DATA)
+    return path
+
+
+def digest(algorithm, data=DATA):
+    return hashlib.new(algorithm, data).hexdigest()
+
+
+def test_sha256sums(iso, tmp_path):
+    sums = tmp_path / 'SHA256SUMS'
+    sums.write_text(f"# release checksums\n{digest('sha256', b'x')}  other.iso\n"
+                    f"{digest('sha256').upper()} *win.iso\n")
+
+    assert find_checksum_file(str(iso)) == str(sums)
+    assert parse_checksum_file(str(sums), 'win.iso') == ('sha256', digest('sha256'))
+    assert parse_checksum_file(str(sums), 'missing.iso') is None
+
+
+@pytest.mark.parametrize("content", [
+    "{sha256}\n",
+    "{sha256}  win.iso\n",
+    "SHA256 (win.iso) = {sha256}\n",
+])
+def test_sha256_sidecar(iso, tmp_path, content):
+    sidecar = tmp_path / 'win.iso.sha256'
+    sidecar.write_text(content.format(sha256=digest('sha256')))
+
+    assert find_checksum_file(str(iso)) == str(sidecar)
+    assert parse_checksum_file(str(sidecar), 'win.iso') == ('sha256', digest('sha256'))
+
+
+def test_md5_sidecar(iso, tmp_path):
+    sidecar = tmp_path / 'win.iso.md5'
+    sidecar.write_text(f"{digest('md5')}  /mnt/downloads/win.iso\n")
+
+    assert parse_checksum_file(str(sidecar), 'win.iso') == ('md5', digest('md5'))
+
+
+def test_sidecar_preferred_over_sums_file(iso, tmp_path):
+    (tmp_path / 'MD5SUMS').write_text(f"{digest('md5')}  win.iso\n")
+    (tmp_path / 'win.iso.sha256').write_text(digest('sha256'))
+
+    assert find_checksum_file(str(iso)) == str(tmp_path / 'win.iso.sha256')
+
+
+def test_verify_reports_match_and_mismatch(handler, iso, tmp_path):
+    (tmp_path / 'win.iso.sha256').write_text(digest('sha256'))
+
+    result = handler.verify_checksum(str(iso))
+    assert result['match']
+    assert result['algorithm'] == 'sha256'
+    assert result['actual'] == result['expected'] == digest('sha256')
+
+    wrong = tmp_path / 'wrong.md5'
+    wrong.write_text(f"{digest('md5', b'other')}  win.iso\n")
+    result = handler.verify_checksum(str(iso), str(wrong))
+    assert not result['match']
+    assert result['checksum_file'] == str(wrong)
+    assert result['expected'] == digest('md5', b'other')
+    assert result['actual'] == digest('md5')
+
+
+def test_no_checksum_file(handler, iso):
+    assert handler.verify_checksum(str(iso)) is None
+
+
+def test_digests_are_cached_with_the_metadata(handler, iso, tmp_path, monkeypatch):
+    (tmp_path / 'win.iso.sha256').write_text(digest('sha256'))
+    assert handler.verify_checksum(str(iso))['match']
+
+    def hash_again(*args, **kwargs):
+        pytest.fail("hashed an unchanged file again")
+    monkeypatch.setattr(core.iso_handler, 'hash_file', hash_again)
+
+    # Also from a fresh handler reading the cache file back
+    for check in (handler, ISOHandler(MetadataCache(str(tmp_path / 'cache.json')))):
+        assert check.verify_checksum(str(iso))['match']
+
+
+def test_hash_file_several_algorithms(iso):
+    reports = []
+    digests = hash_file(str(iso), ('sha256', 'md5'), buffer_size=4096,
+                        progress_callback=lambda progress, status: reports.append(progress))
+
+    assert digests == {'sha256': digest('sha256'), 'md5': digest('md5')}
+    assert reports[-1] == 100
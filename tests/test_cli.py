@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from core.cli import drive_letter, load_manifest, main
+
+KIB = 1024
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # Checksum digests and write journals stay out of the user's cache
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+
+
+def json_events(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_raw_flash_to_image_files(tmp_path, capsys):
+    data = os.urandom(300 * KIB + 5)
+    source = tmp_path / 'image.img'
+    source.write_bytes(data)
+    targets = [str(tmp_path / 'a.bin'), str(tmp_path / 'b.bin')]
+
+    status = main(['flash', str(source), *targets, '--mode', 'raw', '--verify', 'full',
+                   '--buffer-size', '1', '--no-direct', '--no-resume', '--json'])
+
+    assert status == 0
+    for target in targets:
+        assert open(target, 'rb').read() == data
+    events = json_events(capsys)
+    assert events[0]['event'] == 'start' and events[-1]['event'] == 'result'
+    assert events[-1]['ok'] and events[-1]['results'] == {target: None for target in targets}
+    assert {event['phase'] for event in events if event['event'] == 'progress'} >= {'write', 'verify', 'done'}
+
+
+def test_checksum_is_checked_before_writing(tmp_path, capsys):
+    source = tmp_path / 'image.img'
+    source.write_bytes(b'image' * 1000)
+    target = tmp_path / 'out.bin'
+    digest = hashlib.sha256(source.read_bytes()).hexdigest()
+    sums = tmp_path / 'SHA256SUMS'
+
+    sums.write_text(f"{digest}  image.img\n")
+    assert main(['flash', str(source), str(target), '--mode', 'raw', '--no-resume', '--checksum']) == 0
+    assert target.read_bytes() == source.read_bytes()
+
+    target.unlink()
+    sums.write_text(f"{'0' * 64}  image.img\n")
+    assert main(['flash', str(source), str(target), '--mode', 'raw', '--no-resume', '--json',
+                 '--checksum', str(sums)]) == 1
+    assert not target.exists()
+    [error] = json_events(capsys)[-1]['results'].values()
+    assert error.startswith("SHA256 mismatch")
+
+
+def test_batch_manifest(tmp_path, capsys):
+    source = tmp_path / 'image.img'
+    source.write_bytes(os.urandom(64 * KIB))
+    manifest = tmp_path / 'jobs.json'
+    manifest.write_text(json.dumps([
+        {'source': str(source), 'target': str(tmp_path / 'ok.bin')},
+        {'source': str(source), 'targets': ['E', str(tmp_path / 'mixed.bin')]},
+    ]))
+
+    assert main(['batch', str(manifest), '--mode', 'raw', '--no-resume', '--json']) == 1
+    results = [event for event in json_events(capsys) if event['event'] == 'result']
+    assert [(event['job'], event['ok']) for event in results] == [(0, True), (1, False)]
+    assert "can't mix" in results[1]['results']['E']
+
+
+def test_manifest_errors(tmp_path, capsys):
+    manifest = tmp_path / 'jobs.json'
+    manifest.write_text(json.dumps([{'source': 'a.iso', 'targets': ['E'], 'speed': 'max'}]))
+
+    assert main(['batch', str(manifest)]) == 2
+    assert "unknown settings speed" in capsys.readouterr().err
+
+    manifest.write_text(json.dumps({'source': 'a.iso'}))
+    with pytest.raises(Exception, match="JSON list"):
+        load_manifest(str(manifest), {'mode': 'copy'})
+
+
+def test_drive_letters():
+    assert drive_letter('e') == 'E'
+    assert drive_letter('F:') == 'F'
+    assert drive_letter('/dev/sdb') is None
+    assert drive_letter('\\\\.\\PhysicalDrive2') is None
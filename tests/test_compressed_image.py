@@ -0,0 +1,100 @@
+import bz2
+import gzip
+import lzma
+import os
+
+import pytest
+
+from core.compressed_image import CompressedImage, open_image, read_prefix, strip_compression
+from core.flasher import ISOFlasher
+from core.iso_handler import ISOHandler
+from core.metadata_cache import MetadataCache
+from core.verifier import VERIFY_MODES, ImageVerifier
+from iso_builder import ISOBuilder
+
+KIB = 1024
+
+COMPRESSORS = {'.gz': gzip.compress, '.xz': lzma.compress, '.bz2': bz2.compress}
+
+
+def compress(path, suffix):
+    compressed = path + suffix
+    with open(path, 'rb') as f, open(compressed, 'wb') as out:
+        out.write(COMPRESSORS[suffix](f.read()))
+    return compressed
+
+
+@pytest.mark.parametrize("suffix", sorted(COMPRESSORS))
+def test_raw_write_and_verify_round_trip(tmp_path, suffix):
+    # Mostly zeros, so the compressed file is far smaller than the image
+    plain = tmp_path / 'image.img'
+    data = os.urandom(100 * KIB + 7) + bytes(900 * KIB)
+    plain.write_bytes(data)
+    source = compress(str(plain), suffix)
+    assert os.path.getsize(source) < len(data) // 2
+    target = str(tmp_path / 'device.bin')
+
+    flasher = ISOFlasher()
+    flasher.raw_buffer_size = 64 * KIB
+    writer = flasher.write_raw_image(source, target)
+    assert writer.bytes_done == len(data)
+    assert open(target, 'rb').read() == data
+
+    # The decompressed size comes from the writer, not the file on disk
+    for mode in VERIFY_MODES:
+        check = ImageVerifier(mode=mode, block_size=64 * KIB, sample_percent=100)
+        assert check.verify_raw(source, target, size=writer.bytes_done)
+        assert check.bytes_verified == len(data)
+
+    with open(target, 'r+b') as f:
+        f.seek(500 * KIB)
+        f.write(b'\x01')
+    check = ImageVerifier(block_size=64 * KIB)
+    assert not check.verify_raw(source, target, size=writer.bytes_done)
+    assert check.mismatches == [(os.path.basename(source), 448 * KIB)]
+
+
+def test_verify_needs_the_decompressed_size(tmp_path):
+    plain = tmp_path / 'image.img'
+    plain.write_bytes(b'abc' * 1000)
+    source = compress(str(plain), '.gz')
+
+    with pytest.raises(Exception):
+        ImageVerifier().verify_raw(source, str(plain))
+
+
+def test_forward_seek_and_restart(tmp_path):
+    plain = tmp_path / 'image.img'
+    data = os.urandom(300 * KIB)
+    plain.write_bytes(data)
+    source = compress(str(plain), '.xz')
+
+    with open_image(source) as f:
+        assert isinstance(f, CompressedImage)
+        f.seek(200 * KIB)
+        assert f.read(10) == data[200 * KIB:200 * KIB + 10]
+        # Backwards seeks start the stream over
+        f.seek(KIB)
+        assert f.read(10) == data[KIB:KIB + 10]
+    assert read_prefix(source, 5) == data[:5]
+
+
+def test_compressed_iso_metadata(tmp_path):
+    builder = ISOBuilder(boot=["bios", "uefi"])
+    builder.add('README.TXT', b'hello\n')
+    source = compress(builder.build(str(tmp_path / 'win.iso')), '.gz')
+    handler = ISOHandler(MetadataCache(str(tmp_path / 'cache.json')))
+
+    assert strip_compression(source) == str(tmp_path / 'win.iso')
+    assert handler.validate_iso(source)
+    assert handler.get_volume_name(source) == 'TESTVOL'
+    assert handler.get_boot_info(source)['uefi']
+
+
+def test_file_copy_refuses_compressed_images(tmp_path):
+    builder = ISOBuilder()
+    builder.add('README.TXT', b'hello\n')
+    source = compress(builder.build(str(tmp_path / 'win.iso')), '.xz')
+
+    with pytest.raises(Exception, match="raw"):
+        ISOFlasher().flash_iso(source, 'E', 'WIN', 'GPT', 'UEFI', 'FAT32')
@@ -0,0 +1,67 @@
+import errno
+import os
+
+import pytest
+
+from core.flasher import COPY_METHODS, ISOFlasher
+
+KIB = 1024
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'source.bin'
+    path.write_bytes(os.urandom(300 * KIB))
+    return path
+
+
+def copy(flasher, source, target, offset, size):
+    with open(source, 'rb') as iso_file, open(target, 'wb') as output_file:
+        flasher._copy_range(iso_file, output_file, offset, size)
+    return target.read_bytes()
+
+
+@pytest.mark.parametrize("method", COPY_METHODS)
+def test_copy_methods(source, tmp_path, method):
+    if method != 'readinto' and not hasattr(os, method):
+        pytest.skip(f"os.{method} is not available")
+    flasher = ISOFlasher()
+    flasher._copy_method = method
+    flasher.copy_buffer_size = 64 * KIB
+
+    data = source.read_bytes()
+    assert copy(flasher, source, tmp_path / 'out.bin', 5000, 200 * KIB) == data[5000:5000 + 200 * KIB]
+
+
+def test_unsupported_method_falls_back(source, tmp_path, monkeypatch):
+    flasher = ISOFlasher()
+
+    def unsupported(iso_file, output_file, offset, size):
+        error = OSError(errno.EXDEV, "cross-device")
+        error.copied = 0
+        raise error
+    monkeypatch.setattr(flasher, '_copy_range_kernel', unsupported)
+
+    assert copy(flasher, source, tmp_path / 'out.bin', 0, 100 * KIB) == source.read_bytes()[:100 * KIB]
+    assert flasher._copy_method == 'readinto'
+
+
+def test_write_errors_are_raised(source, tmp_path, monkeypatch):
+    flasher = ISOFlasher()
+
+    def full(iso_file, output_file, offset, size):
+        raise OSError(errno.ENOSPC, "No space left on device")
+    monkeypatch.setattr(flasher, '_copy_range_kernel', full)
+
+    with pytest.raises(OSError) as raised:
+        copy(flasher, source, tmp_path / 'out.bin', 0, 100 * KIB)
+    assert raised.value.errno == errno.ENOSPC
+    assert flasher._copy_method == COPY_METHODS[0]
+
+
+def test_truncated_iso_is_an_error(source, tmp_path):
+    flasher = ISOFlasher()
+    flasher._copy_method = 'readinto'
+
+    with pytest.raises(OSError, match="Unexpected end"):
+        copy(flasher, source, tmp_path / 'out.bin', 200 * KIB, 200 * KIB)
@@ -0,0 +1,100 @@
+import struct
+
+import pytest
+
+from core.fat32 import (
+    MIN_CLUSTERS, SECTOR_SIZE, FAT32Formatter, FAT32Layout, default_cluster_size, volume_label
+)
+from fat_reader import FATVolume
+
+MIB = 1024 * 1024
+
+
+def sparse_image(path, size):
+    with open(path, 'wb') as f:
+        f.truncate(size)
+    return str(path)
+
+
+def test_default_cluster_size():
+    assert default_cluster_size(64 * MIB) == 512
+    assert default_cluster_size(200 * MIB) == 2048
+    assert default_cluster_size(4 * 1024 * MIB) == 4096
+    assert default_cluster_size(64 * 1024 * MIB) == 32768
+
+
+def test_volume_label():
+    assert volume_label("Win 11") == b'WIN 11     '
+    assert volume_label("a.b/c:d") == b'A_B_C_D    '
+    assert volume_label("") == b'NO NAME    '
+    assert len(volume_label("a much too long label")) == 11
+
+
+@pytest.mark.parametrize("size, cluster_size", [(40 * MIB, 512), (300 * MIB, 4096), (2048 * MIB, 16384)])
+def test_layout(size, cluster_size):
+    layout = FAT32Layout(size, cluster_size)
+
+    assert layout.data_start % cluster_size == 0
+    assert layout.cluster_count >= MIN_CLUSTERS
+    # Each FAT holds an entry for every cluster plus the two reserved ones
+    assert layout.fat_size // 4 >= layout.cluster_count + 2
+    assert layout.data_start + layout.cluster_count * cluster_size <= size
+    assert layout.cluster_offset(2) == layout.data_start
+    assert layout.fat_offset(1) == layout.fat_offset(0) + layout.fat_size
+
+
+def test_layout_limits():
+    with pytest.raises(Exception):
+        FAT32Layout(40 * MIB, 3000)
+    with pytest.raises(Exception):
+        # Too few clusters: this would be FAT16
+        FAT32Layout(16 * MIB, 512)
+
+
+def test_format(tmp_path):
+    image = sparse_image(tmp_path / 'volume.img', 41 * MIB)
+    offset = 1 * MIB
+    layout = FAT32Formatter("Test Stick", cluster_size=512, volume_id=0x1234ABCD).format(image, offset=offset)
+
+    volume = FATVolume(image, offset)
+    assert volume.boot[510:512] == b'\x55\xAA'
+    assert volume.boot[82:90] == b'FAT32   '
+    assert volume.label == b'TEST STICK '
+    assert struct.unpack_from('<I', volume.boot, 67)[0] == 0x1234ABCD
+    assert (volume.bytes_per_sector, volume.sectors_per_cluster) == (SECTOR_SIZE, 1)
+    assert volume.reserved_sectors == layout.reserved_sectors
+    assert volume.total_sectors == 40 * MIB // SECTOR_SIZE
+    assert volume.hidden_sectors == offset // SECTOR_SIZE
+    assert volume.root_cluster == 2
+
+    # Backup boot sector, FSInfo and its backup
+    assert volume.sector(6) == volume.boot
+    fsinfo = volume.sector(1)
+    assert fsinfo[0:4] == b'RRaA' and fsinfo[484:488] == b'rrAa'
+    assert struct.unpack_from('<II', fsinfo, 488) == (layout.cluster_count - 1, 3)
+    assert volume.sector(7) == fsinfo
+
+    assert volume.fats[0] == volume.fats[1]
+    assert volume.fat_entry(0) == 0x0FFFFFF8
+    assert volume.chain(2) == [2]
+    assert not any(volume.fats[0][12:])
+
+    name, _, attributes, _, _ = next(volume.entries(2))
+    assert attributes == 0x08 and name == 'TEST STI.CK'
+    assert volume.walk() == {}
+
+
+def test_format_hidden_sectors(tmp_path):
+    image = sparse_image(tmp_path / 'volume.img', 40 * MIB)
+    FAT32Formatter(cluster_size=512).format(image, hidden_sectors=2048)
+    assert FATVolume(image).hidden_sectors == 2048
+
+
+def test_format_leaves_the_rest_of_the_disk(tmp_path):
+    image = tmp_path / 'disk.img'
+    image.write_bytes(b'\xAA' * MIB + bytes(40 * MIB) + b'\xBB' * MIB)
+    FAT32Formatter(cluster_size=512).format(str(image), size=40 * MIB, offset=MIB)
+
+    data = image.read_bytes()
+    assert data[:MIB] == b'\xAA' * MIB
+    assert data[41 * MIB:] == b'\xBB' * MIB
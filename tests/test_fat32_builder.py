@@ -0,0 +1,176 @@
+import os
+
+import pytest
+
+import core.fat32_builder
+from core.fat32_builder import FAT32ImageBuilder, lfn_checksum, short_name_basis
+from core.flasher import ISOFlasher
+from core.iso_catalog import ISOCatalog
+from core.partition_table import PartitionTable
+from fat_reader import FATVolume
+from iso_builder import ISOBuilder
+from udf_builder import FILES as UDF_FILES, build_udf
+
+MIB = 1024 * 1024
+
+TREE = {
+    'bootmgr': b'm' * 5000,
+    'efi/boot/bootx64.efi': bytes(range(256)) * 30,
+    'sources/install.wim': b'w' * 70000,
+    'sources/A Long Setup Name.txt': b'long\n',
+    'sources/LONGNAME.TXT': b'1',
+    'sources/longname2.txt': b'2',
+    'empty.txt': b'',
+}
+
+
+@pytest.fixture
+def iso_path(tmp_path):
+    builder = ISOBuilder(rock_ridge=True)
+    for path, data in TREE.items():
+        builder.add(path, data)
+    builder.add('empty-dir')
+    return builder.build(str(tmp_path / 'tree.iso'))
+
+
+def build(iso_path, target, **kwargs):
+    catalog = ISOCatalog.from_path(iso_path)
+    builder = FAT32ImageBuilder(catalog, label="TESTVOL", cluster_size=kwargs.pop('cluster_size', 512))
+    with open(iso_path, 'rb') as iso_file:
+        builder.build(iso_file, target, **kwargs)
+    return builder
+
+
+def test_short_names():
+    assert short_name_basis("A Long Setup Name.txt") == ('ALONGSETUPNAME', 'TXT')
+    assert short_name_basis(".hidden") == ('HIDDEN', '')
+    assert short_name_basis("archive.tar.gz") == ('ARCHIVETAR', 'GZ')
+
+
+def test_tree_round_trip(iso_path, tmp_path):
+    image = str(tmp_path / 'volume.img')
+    builder = build(iso_path, image, size=40 * MIB)
+
+    volume = FATVolume(image)
+    tree = volume.walk()
+    files = {path: data for path, (_, data) in tree.items() if data is not None}
+    directories = sorted(path for path, (_, data) in tree.items() if data is None)
+
+    assert files == TREE
+    assert directories == ['efi', 'efi/boot', 'empty-dir', 'sources']
+    assert volume.label == b'TESTVOL    '
+    assert volume.fats[0] == volume.fats[1]
+    assert builder.split_files == {}
+
+    # Short names in one directory stay unique; exact 8.3 names get no LFN
+    sources = volume.read_chain(next(first for name, _, _, first, _ in volume.entries(2) if name == 'sources'))
+    entries = [sources[offset:offset + 32] for offset in range(0, len(sources), 32) if sources[offset]]
+    short_names = [entry[0:11] for entry in entries if entry[11] != 0x0F]
+    assert len(short_names) == len(set(short_names))
+    exact = next(number for number, entry in enumerate(entries) if entry[0:11] == b'LONGNAMETXT')
+    assert entries[exact - 1][11] != 0x0F
+
+    # Every LFN entry carries the checksum of the short entry that follows it
+    for number, entry in enumerate(entries):
+        if entry[11] == 0x0F:
+            short = next(e for e in entries[number:] if e[11] != 0x0F)
+            assert entry[13] == lfn_checksum(short[0:11])
+
+
+def test_files_are_contiguous(iso_path, tmp_path):
+    image = str(tmp_path / 'volume.img')
+    build(iso_path, image, size=40 * MIB)
+
+    volume = FATVolume(image)
+    for name, _, attributes, first, size in volume.entries(2):
+        if attributes & 0x10 or not first:
+            continue
+        chain = volume.chain(first)
+        assert chain == list(range(first, first + len(chain)))
+        assert len(chain) == -(-size // volume.cluster_size)
+
+
+def test_new_image_is_sized_to_fit(iso_path, tmp_path):
+    image = str(tmp_path / 'fit.img')
+    catalog = ISOCatalog.from_path(iso_path)
+    builder = FAT32ImageBuilder(catalog)
+    with open(iso_path, 'rb') as iso_file:
+        builder.build(iso_file, image)
+
+    assert os.path.getsize(image) == builder.required_size()
+    assert builder.layout.cluster_size == 4096
+    assert FATVolume(image).walk()['sources/install.wim'][1] == TREE['sources/install.wim']
+
+
+def test_oversized_files_are_split(iso_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(core.fat32_builder, 'FAT32_MAX_FILE_SIZE', 32 * 1024)
+    image = str(tmp_path / 'split.img')
+    catalog = ISOCatalog.from_path(iso_path)
+    builder = FAT32ImageBuilder(catalog, cluster_size=512, chunk_size=30000)
+    with open(iso_path, 'rb') as iso_file:
+        builder.build(iso_file, image, size=40 * MIB)
+
+    index = catalog.find('sources/install.wim')
+    assert builder.split_files == {index: [
+        ('sources/install.wim.001', 0, 30000),
+        ('sources/install.wim.002', 30000, 30000),
+        ('sources/install.wim.003', 60000, 10000),
+    ]}
+    tree = FATVolume(image).walk()
+    assert 'sources/install.wim' not in tree
+    data = b''.join(tree[f'sources/install.wim.00{n}'][1] for n in (1, 2, 3))
+    assert data == TREE['sources/install.wim']
+
+
+def test_udf_extents_and_hidden_files(tmp_path):
+    iso_path = build_udf(str(tmp_path / 'udf.iso'))
+    image = str(tmp_path / 'volume.img')
+    build(iso_path, image, size=40 * MIB)
+
+    tree = FATVolume(image).walk()
+    assert {path: data for path, (_, data) in tree.items() if data is not None} == UDF_FILES
+    assert tree['tiny.cfg'][0] & 0x02
+    # Symbolic links have no FAT32 equivalent
+    assert 'link' not in tree
+
+
+def test_volume_at_an_offset(iso_path, tmp_path):
+    disk = tmp_path / 'disk.img'
+    disk.write_bytes(b'\xAA' * MIB + bytes(40 * MIB))
+
+    ISOFlasher().build_fat32_image(iso_path, str(disk), "WIN", 40 * MIB, cluster_size=512,
+                                   offset=MIB, hidden_sectors=2048)
+
+    volume = FATVolume(str(disk), MIB)
+    assert volume.hidden_sectors == 2048
+    assert volume.walk()['bootmgr'][1] == TREE['bootmgr']
+    with open(disk, 'rb') as f:
+        assert f.read(MIB) == b'\xAA' * MIB
+
+
+def test_partitioned_disk(iso_path, tmp_path):
+    disk = tmp_path / 'disk.img'
+    with open(disk, 'wb') as f:
+        f.truncate(48 * MIB)
+
+    table = PartitionTable(48 * MIB, "MBR")
+    partition = table.add(bootable=True)
+    table.write(str(disk))
+
+    ISOFlasher().build_fat32_image(iso_path, str(disk), "WIN", partition.size, cluster_size=512,
+                                   offset=partition.offset, hidden_sectors=partition.start_lba)
+
+    volume = FATVolume(str(disk), partition.offset)
+    assert volume.hidden_sectors == partition.start_lba == 2048
+    assert volume.total_sectors == partition.sector_count
+    assert volume.walk()['bootmgr'][1] == TREE['bootmgr']
+    with open(disk, 'rb') as f:
+        assert f.read(512)[446] == 0x80
+
+
+def test_too_small(iso_path, tmp_path):
+    catalog = ISOCatalog.from_path(iso_path)
+    builder = FAT32ImageBuilder(catalog, cluster_size=512)
+    with open(iso_path, 'rb') as iso_file:
+        with pytest.raises(Exception):
+            builder.build(iso_file, str(tmp_path / 'small.img'), size=8 * MIB)
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from core.file_splitter import FileSplitter, chunk_paths, oversized_files, slice_extents
+from core.flasher import ISOFlasher
+from core.iso_catalog import ISOCatalog
+from core.verifier import ImageVerifier
+from iso_builder import ISOBuilder, SECTOR_SIZE
+
+
+def test_slice_extents():
+    extents = [(1000, 10), (None, 5), (5000, 10)]
+
+    assert slice_extents(extents, 0, 25) == extents
+    assert slice_extents(extents, 8, 4) == [(1008, 2), (None, 2)]
+    assert slice_extents(extents, 12, 10) == [(None, 3), (5000, 7)]
+    assert slice_extents(extents, 25, 5) == []
+
+
+def test_chunk_paths():
+    assert chunk_paths('/usb/big.iso', 3) == ['/usb/big.iso.001', '/usb/big.iso.002', '/usb/big.iso.003']
+    assert chunk_paths('/usb/sources/install.wim', 3, swm=True) == [
+        '/usb/sources/install.swm', '/usb/sources/install2.swm', '/usb/sources/install3.swm']
+
+
+def test_chunk_size_must_fit_fat32():
+    with pytest.raises(Exception):
+        FileSplitter(chunk_size=4 * 1024 * 1024 * 1024)
+
+
+def test_split_and_verify_fragmented_file(tmp_path):
+    # BIG.BIN is stored as three extents with a free sector after each
+    builder = ISOBuilder(extent_size=2 * SECTOR_SIZE, extent_gap=1)
+    data = os.urandom(5 * SECTOR_SIZE + 300)
+    builder.add('SOURCES/BIG.BIN', data)
+    builder.add('README.TXT', b'hello\n')
+    iso_path = builder.build(str(tmp_path / 'split.iso'))
+
+    flasher = ISOFlasher()
+    flasher.catalog = ISOCatalog.from_path(iso_path)
+    flasher.split_chunk_size = 3000
+    big = flasher.catalog.find('SOURCES/BIG.BIN')
+    assert oversized_files(flasher.catalog, limit=4096) == [big]
+
+    usb = tmp_path / 'usb'
+    reports = []
+    flasher.progress_callback = lambda progress, status: reports.append(progress)
+    flasher._plan(("copy", len(data)))
+    flasher._begin_phase("copy", "Splitting large files...")
+    flasher._split_large_files(iso_path, [big], str(usb))
+    (usb / 'README.TXT').write_bytes(b'hello\n')
+
+    pieces = flasher.split_files[big]
+    assert [(os.path.basename(path), start, size) for path, start, size in pieces] == [
+        ('BIG.BIN.001', 0, 3000), ('BIG.BIN.002', 3000, 3000),
+        ('BIG.BIN.003', 6000, 3000), ('BIG.BIN.004', 9000, len(data) - 9000)]
+    assert b''.join(open(path, 'rb').read() for path, _, _ in pieces) == data
+    # The pieces' bytes drive the copy phase, which is the whole plan here
+    assert reports == sorted(reports) and reports[-1] == 100
+
+    check = ImageVerifier()
+    assert check.verify_tree(iso_path, flasher.catalog, str(usb), split_files=flasher.split_files)
+
+    # A damaged piece is reported under its own name
+    with open(pieces[2][0], 'r+b') as f:
+        f.seek(100)
+        f.write(b'X')
+    assert not check.verify_tree(iso_path, flasher.catalog, str(usb), split_files=flasher.split_files)
+    assert check.mismatches == [(os.path.join('SOURCES', 'BIG.BIN.003'), 0)]
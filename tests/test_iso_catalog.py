@@ -0,0 +1,233 @@
+import os
+
+import pytest
+
+from core.flasher import ISOFlasher
+from core.iso_catalog import ISOCatalog, PathTableIndex, SECTOR_SIZE
+from iso_builder import ISOBuilder
+
+
+def read_file(iso_path, catalog, path):
+    index = catalog.find(path)
+    with open(iso_path, 'rb') as iso_file:
+        data = b''
+        for offset, length in catalog.file_extents(index):
+            iso_file.seek(offset)
+            data += iso_file.read(length)
+    return data
+
+
+@pytest.fixture
+def plain_iso(tmp_path):
+    builder = ISOBuilder()
+    builder.add('README.TXT', b'hello\n')
+    builder.add('BOOT/BCD', b'b' * 3000)
+    builder.add('SOURCES/BOOT.WIM', b'w' * 5000)
+    builder.add('EMPTY')
+    return builder.build(str(tmp_path / 'plain.iso'))
+
+
+def children(catalog, index):
+    return sorted(catalog.paths[i] for i in range(len(catalog)) if catalog.parents[i] == index)
+
+
+def test_plain_tree(plain_iso):
+    catalog = ISOCatalog.from_path(plain_iso)
+
+    assert catalog.name_source == "iso9660"
+    assert catalog.paths[0] == ''
+    assert sorted(catalog.paths[1:]) == ['BOOT', 'BOOT/BCD', 'EMPTY', 'README.TXT', 'SOURCES', 'SOURCES/BOOT.WIM']
+    assert [catalog.paths[i] for i in catalog.directories()] == ['BOOT', 'EMPTY', 'SOURCES']
+    assert catalog.file_count() == 3
+    assert catalog.total_size() == 6 + 3000 + 5000
+
+    bcd = catalog.find('BOOT/BCD')
+    assert catalog.paths[catalog.parents[bcd]] == 'BOOT'
+    assert catalog.is_directory(catalog.find('EMPTY'))
+    assert not catalog.is_directory(bcd)
+
+
+def test_file_data_and_lookup(plain_iso):
+    catalog = ISOCatalog.from_path(plain_iso)
+
+    assert read_file(plain_iso, catalog, 'README.TXT') == b'hello\n'
+    assert read_file(plain_iso, catalog, 'sources/boot.wim') == b'w' * 5000
+    assert catalog.find('\\Boot\\Bcd') == catalog.find('BOOT/BCD')
+    assert catalog.find('/boot/') == catalog.find('BOOT')
+    assert not catalog.exists('missing.txt')
+    assert not catalog.is_fragmented(catalog.find('BOOT/BCD'))
+
+
+def test_multi_extent_file_is_one_entry(tmp_path):
+    builder = ISOBuilder(extent_size=2 * SECTOR_SIZE)
+    data = bytes(range(256)) * 40
+    builder.add('BIG.BIN', data)
+    builder.add('SMALL.BIN', b's')
+    iso_path = builder.build(str(tmp_path / 'multi.iso'))
+
+    catalog = ISOCatalog.from_path(iso_path)
+    assert catalog.paths[1:] == ['BIG.BIN', 'SMALL.BIN']
+    assert catalog.sizes[catalog.find('BIG.BIN')] == len(data)
+    assert not catalog.is_fragmented(catalog.find('BIG.BIN'))
+    assert read_file(iso_path, catalog, 'BIG.BIN') == data
+
+
+def test_multi_extent_file_with_gaps(tmp_path):
+    builder = ISOBuilder(extent_size=2 * SECTOR_SIZE, extent_gap=1)
+    data = bytes(range(256)) * 40
+    builder.add('BIG.BIN', data)
+    builder.add('SMALL.BIN', b's')
+    iso_path = builder.build(str(tmp_path / 'gaps.iso'))
+
+    catalog = ISOCatalog.from_path(iso_path)
+    big = catalog.find('BIG.BIN')
+    start = catalog.lbas[big] * SECTOR_SIZE
+    assert catalog.is_fragmented(big)
+    assert catalog.file_extents(big) == [(start, 4096), (start + 6144, 4096), (start + 12288, 2048)]
+    assert catalog.sizes[big] == len(data)
+    assert read_file(iso_path, catalog, 'BIG.BIN') == data
+    assert not catalog.is_fragmented(catalog.find('SMALL.BIN'))
+
+    # Fragmented files are extracted on their own, outside the LBA-ordered runs
+    assert [index for _, _, run in catalog.extent_runs() for _, _, index in run] == [catalog.find('SMALL.BIN')]
+    for sequential in (True, False):
+        flasher = ISOFlasher()
+        flasher.sequential_extract = sequential
+        flasher.temp_dir = str(tmp_path / f'out-{sequential}')
+        os.makedirs(flasher.temp_dir)
+        assert flasher._extract_iso_manual(iso_path)
+        assert (tmp_path / f'out-{sequential}' / 'BIG.BIN').read_bytes() == data
+
+
+def test_extent_runs_are_in_lba_order(plain_iso):
+    catalog = ISOCatalog.from_path(plain_iso)
+    runs = catalog.extent_runs(max_gap=SECTOR_SIZE)
+
+    extents = [extent for _, _, run in runs for extent in run]
+    assert [offset for offset, _, _ in extents] == sorted(offset for offset, _, _ in extents)
+    assert sorted(catalog.paths[index] for _, _, index in extents) == ['BOOT/BCD', 'README.TXT', 'SOURCES/BOOT.WIM']
+    for start, end, run in runs:
+        assert start == run[0][0]
+        assert end == run[-1][0] + run[-1][1]
+    # The sector padding after each file is read through, not seeked over
+    assert len(runs) == 1
+    assert len(catalog.extent_runs(max_gap=0)) == 3
+
+
+@pytest.mark.parametrize("sequential", [True, False])
+def test_manual_extraction(plain_iso, tmp_path, sequential):
+    flasher = ISOFlasher()
+    flasher.sequential_extract = sequential
+    flasher.temp_dir = str(tmp_path / 'out')
+
+    assert flasher._extract_iso_manual(plain_iso)
+    out = tmp_path / 'out'
+    assert (out / 'README.TXT').read_bytes() == b'hello\n'
+    assert (out / 'BOOT' / 'BCD').read_bytes() == b'b' * 3000
+    assert (out / 'SOURCES' / 'BOOT.WIM').read_bytes() == b'w' * 5000
+    assert (out / 'EMPTY').is_dir()
+
+
+def test_rejects_non_iso(tmp_path):
+    path = tmp_path / 'junk.iso'
+    path.write_bytes(bytes(64 * 1024))
+    with pytest.raises(Exception):
+        ISOCatalog.from_path(str(path))
+
+
+@pytest.fixture
+def named_iso(tmp_path):
+    builder = ISOBuilder(rock_ridge=True, joliet=True)
+    builder.add('efi/boot/bootx64.efi', b'e' * 2100)
+    builder.add('sources/install-long-name.wim', b'i' * 100)
+    builder.add('Mixed Case.txt', b'm')
+    builder.add_symlink('efi/current', '/efi/boot')
+    return builder.build(str(tmp_path / 'named.iso'))
+
+
+def test_rock_ridge_names(named_iso):
+    catalog = ISOCatalog.from_path(named_iso)
+
+    assert catalog.name_source == "rockridge"
+    assert sorted(catalog.paths[1:]) == [
+        'Mixed Case.txt', 'efi', 'efi/boot', 'efi/boot/bootx64.efi', 'efi/current',
+        'sources', 'sources/install-long-name.wim'
+    ]
+    link = catalog.find('efi/current')
+    assert catalog.is_symlink(link)
+    assert catalog.links[link] == '/efi/boot'
+    assert link not in catalog.files()
+    assert catalog.file_count() == 3
+
+
+def test_rock_ridge_lookups_keep_case(tmp_path):
+    builder = ISOBuilder(rock_ridge=True)
+    builder.add('readme', b'lower')
+    builder.add('README', b'upper')
+    builder.add('Makefile', b'make')
+    iso_path = builder.build(str(tmp_path / 'case.iso'))
+
+    catalog = ISOCatalog.from_path(iso_path)
+    assert read_file(iso_path, catalog, 'readme') == b'lower'
+    assert read_file(iso_path, catalog, 'README') == b'upper'
+    assert catalog.find('\\Makefile') == catalog.find('Makefile')
+    assert not catalog.exists('makefile')
+
+
+def test_joliet_names(named_iso):
+    catalog = ISOCatalog.from_path(named_iso, names="joliet")
+
+    assert catalog.name_source == "joliet"
+    assert catalog.exists('sources/install-long-name.wim')
+    assert catalog.paths[catalog.find('mixed case.txt')] == 'Mixed Case.txt'
+    assert read_file(named_iso, catalog, 'efi/boot/bootx64.efi') == b'e' * 2100
+
+
+def test_iso9660_names_when_forced(named_iso):
+    catalog = ISOCatalog.from_path(named_iso, names="iso9660")
+
+    assert catalog.name_source == "iso9660"
+    assert catalog.exists('SOURCES/INSTALL_LONG_NAME.WIM')
+    assert catalog.exists('sources/install_long_name.wim')
+    assert not catalog.links
+
+
+def test_relocated_directory_is_listed_once(tmp_path):
+    # Nine levels deep: mkisofs moves the deepest directory to rr_moved
+    deep = 'a/b/c/d/e/f/g/h'
+    builder = ISOBuilder(rock_ridge=True, relocate=[deep])
+    builder.add(f'{deep}/deep.txt', b'x' * 5000)
+    builder.add(f'{deep}/i/more.txt', b'yz')
+    iso_path = builder.build(str(tmp_path / 'deep.iso'))
+
+    catalog = ISOCatalog.from_path(iso_path)
+    index = catalog.find(deep)
+    assert catalog.is_directory(index)
+    assert children(catalog, index) == [f'{deep}/deep.txt', f'{deep}/i']
+    assert read_file(iso_path, catalog, f'{deep}/deep.txt') == b'x' * 5000
+    assert read_file(iso_path, catalog, f'{deep}/i/more.txt') == b'yz'
+    assert children(catalog, catalog.find('rr_moved')) == []
+    assert sum(1 for path in catalog.paths if path.endswith('/h')) == 1
+
+
+def test_path_table_lookup(named_iso):
+    catalog = ISOCatalog.from_path(named_iso, names="joliet")
+    with open(named_iso, 'rb') as iso_file:
+        index = PathTableIndex.from_file(iso_file)
+
+        lba, size, is_directory = index.lookup('/EFI/Boot/bootx64.efi')
+        assert (lba, size, is_directory) == (catalog.lbas[catalog.find('efi/boot/bootx64.efi')], 2100, False)
+        assert index.lookup('efi\\boot')[2] is True
+        assert index.lookup('')[2] is True
+        assert index.lookup('efi/missing.efi') is None
+        assert index.lookup('nope/bootx64.efi') is None
+
+
+def test_extract_paths(named_iso, tmp_path):
+    out = tmp_path / 'out'
+    flasher = ISOFlasher()
+
+    assert flasher.extract_paths(named_iso, ['efi/missing.efi'], str(out)) is False
+    assert flasher.extract_paths(named_iso, ['EFI/BOOT/BOOTX64.EFI', 'Mixed Case.txt'], str(out))
+    assert (out / 'EFI' / 'BOOT' / 'BOOTX64.EFI').read_bytes() == b'e' * 2100
+    assert (out / 'Mixed Case.txt').read_bytes() == b'm'
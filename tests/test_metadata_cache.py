@@ -0,0 +1,98 @@
+import json
+import os
+
+import pytest
+
+from core.iso_handler import ISOHandler
+from core.metadata_cache import MetadataCache
+from iso_builder import ISOBuilder
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / 'cache' / 'iso_metadata.json')
+
+
+@pytest.fixture
+def iso_path(tmp_path):
+    builder = ISOBuilder()
+    builder.add('README.TXT', b'hello\n')
+    return builder.build(str(tmp_path / 'test.iso'))
+
+
+def test_entries_survive_a_restart(cache_path, iso_path):
+    MetadataCache(cache_path).put(iso_path, {'answer': 42})
+
+    assert MetadataCache(cache_path).get(iso_path) == {'answer': 42}
+    with open(cache_path, encoding='utf-8') as f:
+        assert list(json.load(f)['entries']) == [os.path.abspath(iso_path)]
+
+
+def test_changed_file_is_a_miss(cache_path, iso_path):
+    cache = MetadataCache(cache_path)
+    cache.put(iso_path, {'answer': 42})
+
+    info = os.stat(iso_path)
+    os.utime(iso_path, ns=(info.st_atime_ns, info.st_mtime_ns + 1_000_000_000))
+    assert cache.get(iso_path) is None
+
+    cache.put(iso_path, {'answer': 43})
+    with open(iso_path, 'ab') as f:
+        f.write(b'\x00')
+    os.utime(iso_path, ns=(info.st_atime_ns, info.st_mtime_ns + 1_000_000_000))
+    assert cache.get(iso_path) is None
+
+
+def test_least_recently_used_entries_are_dropped(cache_path, tmp_path):
+    paths = []
+    for number in range(3):
+        path = tmp_path / f'{number}.iso'
+        path.write_bytes(b'x')
+        paths.append(str(path))
+
+    cache = MetadataCache(cache_path, max_entries=2)
+    cache.put(paths[0], {'n': 0})
+    cache.put(paths[1], {'n': 1})
+    assert cache.get(paths[0]) == {'n': 0}
+    cache.put(paths[2], {'n': 2})
+
+    assert cache.get(paths[1]) is None
+    assert cache.get(paths[0]) == {'n': 0}
+    assert cache.get(paths[2]) == {'n': 2}
+
+
+def test_unreadable_store_is_ignored(cache_path, iso_path):
+    os.makedirs(os.path.dirname(cache_path))
+    with open(cache_path, 'w') as f:
+        f.write('{not json')
+
+    cache = MetadataCache(cache_path)
+    assert cache.get(iso_path) is None
+    cache.put(iso_path, {'answer': 42})
+    assert MetadataCache(cache_path).get(iso_path) == {'answer': 42}
+
+
+def test_memory_only_cache_writes_nothing(cache_path, iso_path):
+    cache = MetadataCache(cache_path, persistent=False)
+    cache.put(iso_path, {'answer': 42})
+
+    assert cache.get(iso_path) == {'answer': 42}
+    assert not os.path.exists(cache_path)
+
+
+def test_handler_reads_the_image_once(cache_path, iso_path, monkeypatch):
+    handler = ISOHandler(MetadataCache(cache_path))
+    reads = []
+    read_metadata = handler._read_metadata
+    monkeypatch.setattr(handler, '_read_metadata', lambda path: reads.append(path) or read_metadata(path))
+
+    assert handler.validate_iso(iso_path)
+    assert handler.get_volume_name(iso_path) == 'TESTVOL'
+    assert not handler.is_bootable(iso_path)
+    assert handler.get_iso_info(iso_path)['volume_name'] == 'TESTVOL'
+    assert reads == [iso_path]
+
+    # A fresh handler answers from the store on disk
+    fresh = ISOHandler(MetadataCache(cache_path))
+    monkeypatch.setattr(fresh, '_read_metadata', lambda path: pytest.fail("image read again"))
+    assert fresh.get_volume_name(iso_path) == 'TESTVOL'
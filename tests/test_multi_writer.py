@@ -0,0 +1,104 @@
+import errno
+import os
+import threading
+
+import core.multi_writer
+from core.multi_writer import MultiTargetWriter, TargetWriter
+
+KIB = 1024
+BLOCK = 16 * KIB
+
+
+class Images:
+    """A source image and the target paths to write it to"""
+
+    def __init__(self, tmp_path, size=10 * BLOCK + 123):
+        self.data = os.urandom(size)
+        self.source = str(tmp_path / 'image.bin')
+        with open(self.source, 'wb') as f:
+            f.write(self.data)
+        self.targets = [str(tmp_path / f'usb{n}.bin') for n in range(3)]
+
+    def written(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def test_every_target_gets_the_image(tmp_path):
+    images = Images(tmp_path)
+    writer = MultiTargetWriter(buffer_size=BLOCK, buffer_count=2)
+
+    assert writer.write(images.source, images.targets) == images.targets
+    for path in images.targets:
+        assert images.written(path) == images.data
+    assert writer.bytes_read == len(images.data)
+    assert [stats['bytes_written'] for stats in writer.target_stats()] == [len(images.data)] * 3
+
+
+def test_target_that_cannot_be_opened(tmp_path):
+    images = Images(tmp_path)
+    missing = str(tmp_path / 'no-such-dir' / 'usb.bin')
+    writer = MultiTargetWriter(buffer_size=BLOCK, buffer_count=2)
+
+    assert writer.write(images.source, [images.targets[0], missing, images.targets[1]]) == images.targets[:2]
+    assert images.written(images.targets[0]) == images.written(images.targets[1]) == images.data
+    errors = {stats['target']: stats['error'] for stats in writer.target_stats()}
+    assert errors[missing] and errors[images.targets[0]] is None
+
+
+def test_target_failing_mid_write(tmp_path, monkeypatch):
+    images = Images(tmp_path)
+    bad = images.targets[1]
+    write_block = TargetWriter._write_block
+
+    def full_after_three_blocks(self, fd, data, read, aligned, skip):
+        if self.target_path == bad and self.bytes_written >= 3 * BLOCK:
+            raise OSError(errno.ENOSPC, "No space left on device")
+        write_block(self, fd, data, read, aligned, skip)
+    monkeypatch.setattr(TargetWriter, '_write_block', full_after_three_blocks)
+
+    writer = MultiTargetWriter(buffer_size=BLOCK, buffer_count=2)
+    assert writer.write(images.source, images.targets) == [images.targets[0], images.targets[2]]
+    assert images.written(images.targets[0]) == images.written(images.targets[2]) == images.data
+    assert len(images.written(bad)) == 3 * BLOCK
+    assert 'No space' in writer.target_stats()[1]['error']
+
+
+def test_hung_target_is_dropped(tmp_path, monkeypatch):
+    images = Images(tmp_path)
+    hung = images.targets[2]
+    stuck = threading.Event()
+    resume = threading.Event()
+    seen = {}
+    write_block = TargetWriter._write_block
+
+    def hang_on_second_block(self, fd, data, read, aligned, skip):
+        if self.target_path == hung and self.bytes_written == BLOCK:
+            seen['before'] = bytes(data[:read])
+            stuck.set()
+            resume.wait(10)
+            # The ring went on without this buffer, so its data is untouched
+            seen['after'] = bytes(data[:read])
+        write_block(self, fd, data, read, aligned, skip)
+    monkeypatch.setattr(TargetWriter, '_write_block', hang_on_second_block)
+    monkeypatch.setattr(core.multi_writer, 'STALL_CHECK_INTERVAL', 0.02)
+
+    writer = MultiTargetWriter(buffer_size=BLOCK, buffer_count=2, stall_timeout=0.2)
+    try:
+        assert writer.write(images.source, images.targets) == images.targets[:2]
+        assert stuck.is_set()
+        for path in images.targets[:2]:
+            assert images.written(path) == images.data
+        assert 'stopped responding' in writer.target_stats()[2]['error']
+
+        # The hung write still owns its fd; the writer didn't close it
+        target = writer.targets[2]
+        assert target._fd is not None
+        os.fstat(target._fd)
+    finally:
+        resume.set()
+
+    target.thread.join(5)
+    assert not target.thread.is_alive()
+    assert target._fd is None
+    assert seen['after'] == seen['before'] == images.data[BLOCK:2 * BLOCK]
@@ -0,0 +1,142 @@
+import io
+import struct
+import uuid
+import zlib
+
+import pytest
+
+from core.partition_table import (
+    GPT_TYPE_BASIC_DATA, GPT_TYPE_ESP, MBR_TYPE_FAT32_LBA, MBR_TYPE_GPT_PROTECTIVE, PartitionTable,
+    set_active_partition
+)
+
+MIB = 1024 * 1024
+SECTOR = 512
+
+
+class SectorDisk(io.BytesIO):
+    """An in-memory disk that, like a raw Windows device, only reads whole sectors"""
+
+    def read(self, size=-1):
+        assert size > 0 and size % SECTOR == 0 and self.tell() % SECTOR == 0
+        return super().read(size)
+
+
+def mbr_entries(sector):
+    return [struct.unpack_from('<B3sB3sII', sector, 446 + 16 * n) for n in range(4)]
+
+
+def gpt_header(disk, lba):
+    header = disk[lba * SECTOR:(lba + 1) * SECTOR]
+    fields = struct.unpack_from('<8sIIIIQQQQ16sQIII', header)
+    size = fields[2]
+    blank = bytearray(header[:size])
+    blank[16:20] = bytes(4)
+    assert zlib.crc32(blank) & 0xFFFFFFFF == fields[3]
+    return fields
+
+
+def test_mbr(tmp_path):
+    path = tmp_path / 'disk.img'
+    path.write_bytes(b'\xAB' * (64 * MIB))
+
+    table = PartitionTable(64 * MIB, "MBR")
+    first = table.add(16 * MIB, bootable=True)
+    second = table.add()
+    table.write(str(path), boot_code=b'\xFA' * 440)
+
+    disk = path.read_bytes()
+    assert disk[0:440] == b'\xFA' * 440
+    assert disk[510:512] == b'\x55\xAA'
+    assert disk[440:444] == table.disk_guid.bytes[:4]
+
+    entries = mbr_entries(disk)
+    assert entries[0][0] == 0x80 and entries[1][0] == 0
+    assert entries[0][2] == entries[1][2] == MBR_TYPE_FAT32_LBA
+    assert entries[0][4:] == (2048, 16 * MIB // SECTOR)
+    assert entries[1][4:] == (second.start_lba, 64 * MIB // SECTOR - second.start_lba)
+    assert entries[2] == entries[3] == (0, b'\x00\x00\x00', 0, b'\x00\x00\x00', 0, 0)
+    assert second.start_lba % 2048 == 0 and second.start_lba > first.end_lba
+
+    # The first and last MiB are wiped, the rest is left alone
+    assert not any(disk[SECTOR:MIB])
+    assert not any(disk[63 * MIB:])
+    assert disk[MIB:MIB + 16] == b'\xAB' * 16
+
+
+def test_gpt(tmp_path):
+    path = tmp_path / 'disk.img'
+    with open(path, 'wb') as f:
+        f.truncate(64 * MIB)
+
+    table = PartitionTable(64 * MIB, "GPT")
+    esp = table.add(32 * MIB, esp=True, name="EFI system")
+    data = table.add(name="Data")
+    table.write(str(path))
+    disk = path.read_bytes()
+    last = 64 * MIB // SECTOR - 1
+
+    # Protective MBR covering the whole disk
+    entry = mbr_entries(disk)[0]
+    assert entry[2] == MBR_TYPE_GPT_PROTECTIVE and entry[4:] == (1, last)
+
+    primary = gpt_header(disk, 1)
+    backup = gpt_header(disk, last)
+    assert primary[0] == b'EFI PART'
+    assert (primary[5], primary[6], primary[10]) == (1, last, 2)
+    assert (backup[5], backup[6], backup[10]) == (last, 1, last - 32)
+    assert primary[7] == 34 and primary[8] == last - 33
+    assert uuid.UUID(bytes_le=primary[9]) == table.disk_guid
+
+    entries = disk[2 * SECTOR:34 * SECTOR]
+    assert disk[(last - 32) * SECTOR:last * SECTOR] == entries
+    assert zlib.crc32(entries) & 0xFFFFFFFF == primary[13] == backup[13]
+
+    for number, partition, type_guid, name in ((0, esp, GPT_TYPE_ESP, "EFI system"), (1, data, GPT_TYPE_BASIC_DATA, "Data")):
+        fields = struct.unpack_from('<16s16sQQQ72s', entries, number * 128)
+        assert uuid.UUID(bytes_le=fields[0]) == uuid.UUID(type_guid)
+        assert uuid.UUID(bytes_le=fields[1]) == partition.guid
+        assert fields[2:4] == (partition.start_lba, partition.end_lba)
+        assert fields[5].decode('utf-16-le').rstrip('\x00') == name
+    assert data.end_lba == primary[8]
+
+
+def test_keeps_boot_code_reading_whole_sectors():
+    disk = SectorDisk(bytes(8 * MIB))
+    disk.write(b'\xEB' * 446)
+
+    PartitionTable(8 * MIB, "MBR").write(disk)
+    sector = disk.getvalue()[:SECTOR]
+    assert sector[:440] == b'\xEB' * 440
+    assert sector[440:446] != b'\xEB' * 6
+
+
+def test_limits():
+    table = PartitionTable(16 * MIB, "MBR")
+    for _ in range(4):
+        table.add(2 * MIB)
+    with pytest.raises(Exception):
+        table.add(MIB)
+
+    with pytest.raises(Exception):
+        PartitionTable(16 * MIB, "MBR").add(32 * MIB)
+    with pytest.raises(Exception):
+        PartitionTable(16 * MIB, "APM")
+    with pytest.raises(Exception):
+        PartitionTable(3 * 1024 ** 4, "MBR")
+
+
+def test_set_active_partition():
+    disk = io.BytesIO(bytes(8 * MIB))
+    table = PartitionTable(8 * MIB, "MBR")
+    table.add(2 * MIB, bootable=True)
+    table.add()
+    table.write(disk)
+
+    assert set_active_partition(disk, 1)
+    assert [entry[0] for entry in mbr_entries(disk.getvalue())] == [0, 0x80, 0, 0]
+
+    gpt = io.BytesIO(bytes(8 * MIB))
+    PartitionTable(8 * MIB, "GPT").write(gpt)
+    assert not set_active_partition(gpt, 0)
+    assert not set_active_partition(io.BytesIO(bytes(SECTOR)), 0)
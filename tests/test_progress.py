@@ -0,0 +1,75 @@
+import gzip
+import os
+
+from core.flasher import ISOFlasher
+from core.progress import ProgressChannel, ProgressModel, format_eta
+
+KIB = 1024
+
+
+def test_phases_are_weighted_by_bytes():
+    model = ProgressModel([("format", 100), ("copy", 300)])
+
+    model.begin("format")
+    model.update(50)
+    assert model.progress == 12.5
+
+    # Starting a phase counts the ones before it as done
+    model.begin("copy")
+    model.update(150)
+    assert model.progress == 62.5
+
+    # Phases that weren't planned go at the end, sized when they start
+    model.begin("bootable", 100)
+    assert model.total == 500 and model.progress == 80.0
+
+
+def test_resize_a_later_phase():
+    model = ProgressModel([("write", 100), ("verify", 100)])
+    model.begin("write")
+    model.update(100)
+    assert model.progress == 50.0
+
+    model.resize("verify", 300)
+    assert model.progress == 25.0
+
+
+def test_format_eta():
+    assert format_eta(59.6) == "1:00"
+    assert format_eta(3 * 3600 + 62) == "3:01:02"
+
+
+def test_channel_hands_over_the_newest_event():
+    channel = ProgressChannel(max_pending=2)
+    for percent in (10, 20, 30):
+        channel(percent, f"{percent}%", phase="copy", path=f"file{percent}")
+
+    event = channel.latest()
+    assert (event.progress, event.phase, event.path) == (30, "copy", "file30")
+    assert channel.latest() is None
+
+    channel.close("done")
+    assert channel.closed and channel.result == "done"
+
+
+def test_compressed_write_replans_verify(tmp_path):
+    data = os.urandom(64 * KIB) + bytes(960 * KIB)
+    source = tmp_path / 'image.img.gz'
+    source.write_bytes(gzip.compress(data))
+    compressed_size = os.path.getsize(source)
+
+    events = ProgressChannel()
+    flasher = ISOFlasher()
+    flasher.progress_callback = events
+    flasher.verify_mode = "full"
+    flasher._plan(("write", compressed_size), ("verify", flasher._verify_size(compressed_size)))
+    flasher._begin_phase("write", "Dismounting USB drive...")
+
+    writer = flasher.write_raw_image(str(source), str(tmp_path / 'device.bin'))
+    flasher._plan_verify(writer.bytes_done)
+
+    # Writing reports compressed bytes against the compressed size ...
+    write_events = [event for event in events.drain() if event.phase == "write"]
+    assert write_events[-1].bytes_done == write_events[-1].bytes_total == compressed_size
+    # ... while verify reads back every byte the write produced
+    assert flasher.progress_model.phases == [["write", compressed_size], ["verify", len(data)]]
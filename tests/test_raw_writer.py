@@ -0,0 +1,181 @@
+import errno
+import os
+
+import pytest
+
+from core.raw_writer import SECTOR_ALIGNMENT, RawImageWriter
+
+KIB = 1024
+
+
+def image(tmp_path, size, name='image.bin'):
+    path = tmp_path / name
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+
+@pytest.mark.parametrize("size", [0, 1000, 64 * KIB, 64 * KIB + 1, 200 * KIB + 3])
+def test_file_target_is_byte_identical(tmp_path, size):
+    source = image(tmp_path, size)
+    target = str(tmp_path / 'target.bin')
+
+    writer = RawImageWriter(buffer_size=64 * KIB)
+    assert writer.write(source, target) == size
+    assert open(target, 'rb').read() == open(source, 'rb').read()
+
+
+def test_padded_final_block_is_trimmed(tmp_path, monkeypatch):
+    # Write as if to a raw device, which gets whole sectors only
+    source = image(tmp_path, 100 * KIB + 5)
+    target = str(tmp_path / 'target.bin')
+    open_target = RawImageWriter._open_target
+    monkeypatch.setattr(RawImageWriter, '_open_target',
+                        lambda self, path: (open_target(self, path)[0], True))
+    writes = []
+    write = os.write
+    monkeypatch.setattr(os, 'write', lambda fd, data: writes.append(len(data)) or write(fd, data))
+
+    RawImageWriter(buffer_size=64 * KIB).write(source, target)
+    assert all(length % SECTOR_ALIGNMENT == 0 for length in writes)
+    assert open(target, 'rb').read() == open(source, 'rb').read()
+
+
+def test_longer_target_keeps_its_tail(tmp_path):
+    source = image(tmp_path, 10 * KIB + 1)
+    target = tmp_path / 'target.bin'
+    target.write_bytes(b'\xEE' * (64 * KIB))
+
+    RawImageWriter(buffer_size=16 * KIB).write(source, str(target))
+    data = target.read_bytes()
+    assert data[:10 * KIB + 1] == open(source, 'rb').read()
+    assert data[10 * KIB + 1:] == b'\xEE' * (54 * KIB - 1)
+
+
+def test_direct_falls_back_to_buffered_writes(tmp_path, monkeypatch):
+    if not hasattr(os, 'O_DIRECT'):
+        pytest.skip("no O_DIRECT on this platform")
+    source = image(tmp_path, 100 * KIB + 5)
+    target = str(tmp_path / 'target.bin')
+    real_open = os.open
+
+    def refuse_direct(path, flags, mode=0o777):
+        if flags & os.O_DIRECT:
+            raise OSError(errno.EINVAL, "O_DIRECT refused")
+        return real_open(path, flags, mode)
+    monkeypatch.setattr(os, 'open', refuse_direct)
+
+    RawImageWriter(buffer_size=64 * KIB, direct=True).write(source, target)
+    assert open(target, 'rb').read() == open(source, 'rb').read()
+
+
+@pytest.mark.parametrize("buffer_count", [1, 2, 3, 8])
+def test_buffer_counts(tmp_path, buffer_count):
+    source = image(tmp_path, 500 * KIB + 17)
+    target = str(tmp_path / 'target.bin')
+
+    writer = RawImageWriter(buffer_size=16 * KIB, buffer_count=buffer_count)
+    writer.write(source, target)
+    assert open(target, 'rb').read() == open(source, 'rb').read()
+
+    stats = writer.stats()
+    assert stats['bytes_read'] == stats['bytes_written'] == 500 * KIB + 17
+
+
+def test_other_open_errors_are_raised(tmp_path, monkeypatch):
+    if not hasattr(os, 'O_DIRECT'):
+        pytest.skip("no O_DIRECT on this platform")
+    source = image(tmp_path, 10 * KIB)
+    real_open = os.open
+
+    def busy(path, flags, mode=0o777):
+        if flags & os.O_DIRECT:
+            raise OSError(errno.EBUSY, "device busy")
+        return real_open(path, flags, mode)
+    monkeypatch.setattr(os, 'open', busy)
+
+    with pytest.raises(OSError):
+        RawImageWriter(buffer_size=64 * KIB, direct=True).write(source, str(tmp_path / 'target.bin'))
+
+
+def test_progress_reaches_the_end(tmp_path):
+    source = image(tmp_path, 300 * KIB)
+    reports = []
+
+    RawImageWriter(buffer_size=64 * KIB).write(source, str(tmp_path / 'target.bin'),
+                                               lambda progress, status: reports.append(progress))
+    assert reports == sorted(reports)
+    assert reports[-1] == 100
+
+
+def test_buffer_size_must_be_aligned():
+    with pytest.raises(Exception):
+        RawImageWriter(buffer_size=1000)
+
+
+def test_zero_chunks_are_skipped_on_an_empty_target(tmp_path):
+    data = os.urandom(64 * KIB) + bytes(128 * KIB) + os.urandom(64 * KIB) + bytes(64 * KIB)
+    source = tmp_path / 'image.bin'
+    source.write_bytes(data)
+    target = tmp_path / 'target.bin'
+
+    writer = RawImageWriter(buffer_size=64 * KIB, skip_zeros=True)
+    assert writer.write(str(source), str(target)) == len(data)
+    # The zero tail was seeked over too, and the file still ends at the image size
+    assert target.read_bytes() == data
+
+    stats = writer.stats()
+    assert stats['bytes_skipped'] == 192 * KIB
+    assert stats['bytes_written'] == len(data) - stats['bytes_skipped']
+
+
+def test_zero_chunks_are_written_over_old_data(tmp_path):
+    data = os.urandom(64 * KIB) + bytes(128 * KIB)
+    source = tmp_path / 'image.bin'
+    source.write_bytes(data)
+    target = tmp_path / 'target.bin'
+    target.write_bytes(b'\xEE' * len(data))
+
+    writer = RawImageWriter(buffer_size=64 * KIB, skip_zeros=True)
+    writer.write(str(source), str(target))
+    assert target.read_bytes() == data
+    assert writer.bytes_skipped == 0
+
+
+def sparse_image(tmp_path):
+    """64 KiB of data, a 1 MiB hole and 64 KiB more, or None without hole reporting"""
+    path = tmp_path / 'sparse.bin'
+    head, tail = os.urandom(64 * KIB), os.urandom(64 * KIB)
+    with open(path, 'wb') as f:
+        f.write(head)
+        f.seek(1024 * KIB, os.SEEK_CUR)
+        f.write(tail)
+    with open(path, 'rb') as f:
+        if not hasattr(os, 'SEEK_DATA') or os.lseek(f.fileno(), 64 * KIB, os.SEEK_DATA) == 64 * KIB:
+            return None
+    return str(path), head, tail
+
+
+@pytest.mark.parametrize("target_zeroed", [False, True])
+def test_source_holes_on_a_used_target(tmp_path, target_zeroed):
+    sparse = sparse_image(tmp_path)
+    if sparse is None:
+        pytest.skip("file system does not report holes")
+    source, head, tail = sparse
+    target = tmp_path / 'device.bin'
+    target.write_bytes(b'\xEE' * (1200 * KIB))
+
+    writer = RawImageWriter(buffer_size=64 * KIB, skip_zeros=True, target_zeroed=target_zeroed)
+    writer.write(source, str(target))
+    written = target.read_bytes()
+    assert written[:64 * KIB] == head
+    assert written[1088 * KIB:1152 * KIB] == tail
+
+    if target_zeroed:
+        # Trusted to read as zeros already: the hole is neither read nor written
+        assert writer.bytes_read == 128 * KIB
+        assert writer.bytes_skipped == 1024 * KIB
+        assert written[64 * KIB:1088 * KIB] == b'\xEE' * (1024 * KIB)
+    else:
+        # Old data on the target must be overwritten with the hole's zeros
+        assert writer.bytes_skipped == 0
+        assert written[64 * KIB:1088 * KIB] == bytes(1024 * KIB)
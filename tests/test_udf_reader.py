@@ -0,0 +1,80 @@
+import pytest
+
+from core.iso_catalog import FLAG_HIDDEN, ISOCatalog
+from core.udf_reader import UDFReader, decode_dchars
+from udf_builder import FILES, SYMLINKS, VOLUME_ID, build_udf
+
+
+def read_file(reader, catalog, path):
+    return reader.read_extents(catalog.file_extents(catalog.find(path)))
+
+
+@pytest.fixture
+def udf_image(tmp_path):
+    return build_udf(str(tmp_path / 'udf.iso'))
+
+
+def test_reader_volume(udf_image):
+    with open(udf_image, 'rb') as iso_file:
+        reader = UDFReader(iso_file)
+        assert reader.volume_id == VOLUME_ID
+        assert reader.root_icb == (0, 1)
+
+        file_type, size, extents = reader.read_entry(reader.root_icb)
+        names = [name for name, _, _ in reader.iter_directory(reader.read_extents(extents))]
+        assert names == ['sources', 'readme.txt', 'tiny.cfg', 'link']
+
+
+def test_catalog_from_udf(udf_image):
+    catalog = ISOCatalog.from_path(udf_image)
+
+    assert catalog.name_source == "udf"
+    assert sorted(catalog.paths[1:]) == ['link', 'readme.txt', 'sources', 'sources/boot.wim',
+                                         'sources/install.wim', 'tiny.cfg']
+    assert catalog.is_symlink(catalog.find('link'))
+    assert catalog.links[catalog.find('link')] == SYMLINKS['link']
+    assert catalog.file_count() == len(FILES)
+    assert catalog.total_size() == sum(len(data) for data in FILES.values())
+
+    with open(udf_image, 'rb') as iso_file:
+        reader = UDFReader(iso_file)
+        for path, data in FILES.items():
+            assert read_file(reader, catalog, path) == data, path
+
+
+def test_extents(udf_image):
+    catalog = ISOCatalog.from_path(udf_image)
+
+    # Adjacent extents are merged into one plain LBA entry
+    assert not catalog.is_fragmented(catalog.find('readme.txt'))
+
+    extents = catalog.file_extents(catalog.find('sources/install.wim'))
+    assert [length for _, length in extents] == [2048, 2048, 2148, 500]
+    assert extents[1][0] is None
+
+    # Embedded data sits inside the file entry, not on a sector boundary
+    offset, length = catalog.file_extents(catalog.find('tiny.cfg'))[0]
+    assert offset % 2048 and length == len(FILES['tiny.cfg'])
+    assert catalog.flags[catalog.find('tiny.cfg')] & FLAG_HIDDEN
+
+
+def test_bridge_image(tmp_path):
+    path = build_udf(str(tmp_path / 'bridge.iso'), bridge=True)
+
+    assert ISOCatalog.from_path(path).name_source == "udf"
+    # The ISO 9660 side of this image is empty
+    assert ISOCatalog.from_path(path, names="iso9660").paths == ['']
+
+
+def test_decode_dchars():
+    assert decode_dchars(b'\x08abc') == 'abc'
+    assert decode_dchars(b'\x10' + 'Wimé'.encode('utf-16-be')) == 'Wimé'
+    assert decode_dchars(b'') == ''
+
+
+def test_not_udf(tmp_path):
+    path = tmp_path / 'blank.iso'
+    path.write_bytes(bytes(300 * 2048))
+    with open(path, 'rb') as iso_file:
+        with pytest.raises(Exception):
+            UDFReader(iso_file)
@@ -0,0 +1,135 @@
+import threading
+import time
+
+from core.usb_handler import FakeDriveBackend, USBHandler
+
+GIB = 1024 ** 3
+
+
+def drive(letter, label="STICK"):
+    return {'letter': letter, 'label': label, 'size': "8.0 GB", 'total_bytes': 8 * GIB,
+            'free_bytes': 4 * GIB, 'device': f"{letter}:\\"}
+
+
+class CountingBackend(FakeDriveBackend):
+    def __init__(self, drives=(), delay=0.0):
+        super().__init__(drives, delay)
+        self.scans = 0
+
+    def list_drives(self):
+        self.scans += 1
+        return super().list_drives()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_scans_are_cached():
+    backend = CountingBackend([drive('E')])
+    handler = USBHandler(backend, cache_ttl=60)
+
+    assert handler.get_usb_drives() == [drive('E')]
+    backend.drives.append(drive('F'))
+    assert handler.get_usb_drives() == [drive('E')]
+    assert backend.scans == 1
+
+    assert handler.get_usb_drives(max_age=0) == [drive('E'), drive('F')]
+    handler.invalidate()
+    handler.get_usb_drives()
+    assert backend.scans == 3
+
+
+def test_cached_list_is_a_copy():
+    handler = USBHandler(FakeDriveBackend([drive('E')]), cache_ttl=60)
+    handler.get_usb_drives().clear()
+    assert handler.get_usb_drives() == [drive('E')]
+
+
+def test_async_scan_does_not_block_and_is_shared():
+    backend = CountingBackend([drive('E')], delay=0.3)
+    handler = USBHandler(backend)
+    results = []
+    done = threading.Event()
+
+    def callback(drives):
+        results.append((threading.current_thread() is threading.main_thread(), drives))
+        if len(results) == 3:
+            done.set()
+
+    start = time.monotonic()
+    for _ in range(3):
+        handler.get_usb_drives_async(callback)
+    assert time.monotonic() - start < 0.2
+
+    assert done.wait(5)
+    assert results == [(False, [drive('E')])] * 3
+    assert backend.scans == 1
+
+
+def test_async_scan_reports_errors_as_no_drives():
+    class BrokenBackend(FakeDriveBackend):
+        def list_drives(self):
+            raise OSError("device not ready")
+
+    results = []
+    USBHandler(BrokenBackend()).get_usb_drives_async(results.append)
+    wait_for(lambda: results)
+    assert results == [[]]
+
+
+def test_monitor_reports_plug_and_unplug():
+    backend = FakeDriveBackend([drive('E')])
+    handler = USBHandler(backend, cache_ttl=60)
+    reports = []
+    monitor = handler.start_monitor(reports.append, interval=0.02)
+    try:
+        wait_for(lambda: len(reports) == 1)
+        assert reports[0] == [drive('E')]
+
+        backend.drives = [drive('E'), drive('F')]
+        wait_for(lambda: len(reports) == 2)
+        assert reports[1] == [drive('E'), drive('F')]
+
+        backend.drives = [drive('F')]
+        wait_for(lambda: len(reports) == 3)
+        assert reports[2] == [drive('F')]
+
+        # A relabelled drive keeps the signature and isn't reported until the next change
+        backend.drives = [drive('F', "RENAMED")]
+        time.sleep(0.1)
+        assert len(reports) == 3
+    finally:
+        monitor.stop()
+        monitor.join(2)
+    assert not monitor.is_alive()
+
+
+def test_drive_info():
+    handler = USBHandler(FakeDriveBackend([drive('E'), drive('F', "DATA")]))
+    assert handler.get_drive_info('F')['label'] == "DATA"
+    assert handler.get_drive_info('Z') is None
+
+
+def test_monitor_event_refreshes_the_cache():
+    backend = CountingBackend([drive('E')])
+    handler = USBHandler(backend, cache_ttl=60)
+    assert handler.get_usb_drives() == [drive('E')]
+
+    reports = []
+    monitor = handler.start_monitor(reports.append, interval=0.02)
+    try:
+        wait_for(lambda: len(reports) == 1)
+        backend.drives = [drive('E'), drive('F')]
+        wait_for(lambda: len(reports) == 2)
+        scans = backend.scans
+
+        # The plug-in dropped the 60 s cache; callers get the rescanned list from it
+        assert handler.get_usb_drives() == [drive('E'), drive('F')]
+        assert backend.scans == scans
+    finally:
+        monitor.stop()
+        monitor.join(2)
@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from core.flasher import ISOFlasher
+from core.iso_catalog import ISOCatalog
+from core.verifier import VERIFY_MODES, ImageVerifier
+from iso_builder import ISOBuilder
+
+KIB = 1024
+BLOCK = 16 * KIB
+
+
+def corrupt(path, offset):
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+@pytest.fixture
+def written(tmp_path):
+    """An image and a larger target that starts with it, like a device"""
+    source = tmp_path / 'image.bin'
+    source.write_bytes(os.urandom(200 * KIB + 100))
+    target = tmp_path / 'device.bin'
+    target.write_bytes(source.read_bytes() + bytes(64 * KIB))
+    return str(source), str(target)
+
+
+def verifier(mode):
+    # Sample every block so the sampled mode is sure to see the damage
+    return ImageVerifier(mode=mode, block_size=BLOCK, sample_percent=100, seed=1)
+
+
+@pytest.mark.parametrize("mode", VERIFY_MODES)
+def test_identical_target_passes(written, mode):
+    check = verifier(mode)
+    assert check.verify_raw(*written)
+    assert check.mismatches == []
+    assert check.bytes_verified == os.path.getsize(written[0])
+
+
+@pytest.mark.parametrize("mode", VERIFY_MODES)
+def test_corrupt_byte_is_reported_with_its_block(written, mode):
+    source, target = written
+    corrupt(target, 5 * BLOCK + 123)
+
+    check = verifier(mode)
+    assert not check.verify_raw(source, target)
+    assert check.mismatches == [('image.bin', 5 * BLOCK)]
+
+
+@pytest.mark.parametrize("mode", VERIFY_MODES)
+def test_short_target(written, mode):
+    source, target = written
+    with open(target, 'r+b') as f:
+        f.truncate(7 * BLOCK + 10)
+
+    check = verifier(mode)
+    assert not check.verify_raw(source, target)
+    assert check.mismatches[0] == ('image.bin', 7 * BLOCK)
+
+
+def test_sampled_mode_reads_a_sample(written):
+    check = ImageVerifier(mode="sampled", block_size=BLOCK, sample_percent=25, seed=1)
+    assert check.verify_raw(*written)
+    blocks = -(-os.path.getsize(written[0]) // BLOCK)
+    assert check.bytes_verified <= (blocks // 4) * BLOCK
+
+
+@pytest.fixture
+def extracted(tmp_path):
+    builder = ISOBuilder()
+    builder.add('BOOT/BCD', os.urandom(40 * KIB))
+    builder.add('README.TXT', b'hello\n')
+    builder.add('EMPTY.TXT', b'')
+    iso_path = builder.build(str(tmp_path / 'tree.iso'))
+
+    flasher = ISOFlasher()
+    flasher.temp_dir = str(tmp_path / 'drive')
+    assert flasher._extract_iso_manual(iso_path)
+    return iso_path, ISOCatalog.from_path(iso_path), flasher.temp_dir
+
+
+@pytest.mark.parametrize("mode", VERIFY_MODES)
+def test_tree(extracted, mode):
+    iso_path, catalog, root = extracted
+    assert verifier(mode).verify_tree(iso_path, catalog, root)
+
+    corrupt(os.path.join(root, 'BOOT', 'BCD'), 20 * KIB)
+    with open(os.path.join(root, 'README.TXT'), 'ab') as f:
+        f.write(b'more')
+    os.unlink(os.path.join(root, 'EMPTY.TXT'))
+
+    check = verifier(mode)
+    assert not check.verify_tree(iso_path, catalog, root)
+    assert sorted(check.mismatches) == [('BOOT/BCD', BLOCK), ('EMPTY.TXT', 0), ('README.TXT', 6)]
+
+
+def test_verify_failure_names_the_offset(written):
+    source, target = written
+    corrupt(target, 100)
+    flasher = ISOFlasher()
+    flasher.verify_mode = "full"
+
+    with pytest.raises(Exception, match="first in image.bin at byte 0"):
+        flasher._verify(lambda check, report: check.verify_raw(source, target, report), 0, 100)
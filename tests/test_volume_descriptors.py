@@ -0,0 +1,109 @@
+import io
+import struct
+
+import core.iso_handler
+from core.iso_handler import METADATA_FORMAT, ISOHandler
+from core.metadata_cache import MetadataCache
+from core.volume_descriptors import READ_AHEAD_SECTORS, SECTOR_SIZE, VolumeDescriptorSet
+from iso_builder import ISOBuilder
+
+
+def volume_descriptor(kind, volume_id, escape=b'', root_lba=20):
+    sector = bytearray(SECTOR_SIZE)
+    sector[0:7] = bytes([kind]) + b'CD001\x01'
+    if escape:
+        sector[40:72] = volume_id.encode('utf-16-be').ljust(32, b'\x00')
+        sector[88:91] = escape
+    else:
+        sector[40:72] = volume_id.encode('ascii').ljust(32)
+    sector[80:84] = struct.pack('<I', 1000)
+    sector[128:130] = struct.pack('<H', SECTOR_SIZE)
+    sector[158:162] = struct.pack('<I', root_lba)
+    sector[166:170] = struct.pack('<I', SECTOR_SIZE)
+    sector[813:830] = b'2024010112000000\x00'
+    return bytes(sector)
+
+
+def boot_record(catalog_lba):
+    sector = bytearray(SECTOR_SIZE)
+    sector[0:7] = b'\x00CD001\x01'
+    sector[7:30] = b'EL TORITO SPECIFICATION'
+    sector[71:75] = struct.pack('<I', catalog_lba)
+    return bytes(sector)
+
+
+def terminator():
+    return b'\xFFCD001\x01'.ljust(SECTOR_SIZE, b'\x00')
+
+
+def image(*descriptors):
+    return io.BytesIO(bytes(16 * SECTOR_SIZE) + b''.join(descriptors) + bytes(SECTOR_SIZE))
+
+
+def test_full_set():
+    descriptors = VolumeDescriptorSet.from_file(image(
+        boot_record(42),
+        volume_descriptor(1, 'WIN11'),
+        volume_descriptor(2, 'OTHER'),
+        volume_descriptor(2, 'Win 11 Joliet', escape=b'%/E', root_lba=30),
+        terminator(),
+        volume_descriptor(1, 'AFTER'),
+    ))
+
+    assert descriptors.valid and descriptors.terminated
+    assert descriptors.primary.sector == 17
+    assert descriptors.primary.volume_id == 'WIN11'
+    assert descriptors.primary.root_lba == 20
+    assert descriptors.primary.root_size == SECTOR_SIZE
+    assert descriptors.primary.creation_date == '2024010112000000\x00'
+
+    assert [d.volume_id for d in descriptors.supplementary] == ['OTHER', 'Win 11 Joliet']
+    assert descriptors.joliet.joliet_level == 3
+    assert descriptors.joliet.root_lba == 30
+
+    assert descriptors.el_torito
+    assert descriptors.boot_record.sector == 16
+    assert descriptors.boot_record.boot_catalog_lba == 42
+
+
+def test_plain_set():
+    descriptors = VolumeDescriptorSet.from_file(image(volume_descriptor(1, 'PLAIN'), terminator()))
+
+    assert descriptors.valid
+    assert descriptors.joliet is None
+    assert not descriptors.el_torito
+
+
+def test_set_longer_than_one_read():
+    extra = [volume_descriptor(2, f'SVD{n}') for n in range(READ_AHEAD_SECTORS + 3)]
+    descriptors = VolumeDescriptorSet.from_file(image(volume_descriptor(1, 'LONG'), *extra, terminator()))
+
+    assert len(descriptors.supplementary) == READ_AHEAD_SECTORS + 3
+    assert descriptors.terminated
+
+
+def test_not_an_iso():
+    descriptors = VolumeDescriptorSet.from_file(io.BytesIO(bytes(40 * SECTOR_SIZE)))
+
+    assert not descriptors.valid
+    assert descriptors.primary is None
+
+
+def test_metadata_format_bump_reparses(tmp_path, monkeypatch):
+    builder = ISOBuilder()
+    builder.add('README.TXT', b'hello\n')
+    iso_path = builder.build(str(tmp_path / 'test.iso'))
+    cache = MetadataCache(str(tmp_path / 'cache.json'))
+
+    # An entry written by an older version, with a checksum worth keeping
+    cache.put(iso_path, {'format': METADATA_FORMAT - 1, 'valid': True, 'volume_name': 'STALE',
+                         'digests': {'sha256': 'abc'}})
+    metadata = ISOHandler(cache).get_metadata(iso_path)
+    assert metadata['format'] == METADATA_FORMAT
+    assert metadata['volume_name'] == 'TESTVOL'
+    assert metadata['digests'] == {'sha256': 'abc'}
+
+    def read_again(path):
+        raise AssertionError("image read again")
+    monkeypatch.setattr(core.iso_handler.VolumeDescriptorSet, 'from_path', read_again)
+    assert ISOHandler(cache).get_metadata(iso_path)['volume_name'] == 'TESTVOL'
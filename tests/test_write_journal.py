@@ -0,0 +1,155 @@
+import os
+import sys
+
+import pytest
+
+from core.flasher import ISOFlasher
+from core.raw_writer import RawImageWriter
+from core.write_journal import WriteJournal
+from iso_builder import ISOBuilder
+
+KIB = 1024
+
+
+class Unplugged(Exception):
+    pass
+
+
+def unplug_after(limit):
+    """A progress callback that fails once the write passed limit percent"""
+    def report(progress, status):
+        if progress >= limit:
+            raise Unplugged()
+    return report
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / 'image.bin'
+    path.write_bytes(os.urandom(3 * 1024 * KIB + 1000))
+    return str(path)
+
+
+def journal(source, target, tmp_path, mode="raw", settings=None):
+    return WriteJournal(source, target, mode, settings or [False, False],
+                        journal_dir=str(tmp_path / 'journals'), checkpoint_interval=512 * KIB)
+
+
+def test_journal_belongs_to_one_job(image, tmp_path):
+    first = journal(image, 'target', tmp_path)
+    first.checkpoint(512 * KIB, b'x')
+    assert journal(image, 'target', tmp_path).resuming
+
+    assert not journal(image, 'other', tmp_path).resuming
+    assert not journal(image, 'target', tmp_path, settings=[True, False]).resuming
+    assert not journal(image, 'target', tmp_path, mode="copy").resuming
+
+    os.utime(image, ns=(0, 0))
+    assert not journal(image, 'target', tmp_path).resuming
+
+
+def test_raw_write_resumes(image, tmp_path):
+    target = str(tmp_path / 'target.bin')
+    writer = RawImageWriter(buffer_size=256 * KIB, buffer_count=2)
+
+    with pytest.raises(Unplugged):
+        writer.write(image, target, unplug_after(60), journal(image, target, tmp_path))
+    saved = journal(image, target, tmp_path)
+    assert saved.resuming
+    last_checkpoint = saved.checkpoints[-1][0]
+    assert last_checkpoint >= 1024 * KIB
+
+    writer = RawImageWriter(buffer_size=256 * KIB, buffer_count=2)
+    resumed = journal(image, target, tmp_path)
+    writer.write(image, target, journal=resumed)
+
+    assert writer.bytes_resumed == last_checkpoint
+    assert writer.bytes_read == os.path.getsize(image) - last_checkpoint
+    with open(image, 'rb') as a, open(target, 'rb') as b:
+        assert a.read() == b.read()
+    # A finished write leaves no journal behind
+    assert not journal(image, target, tmp_path).resuming
+
+
+def test_raw_write_drops_damaged_checkpoints(image, tmp_path):
+    target = str(tmp_path / 'target.bin')
+    with pytest.raises(Unplugged):
+        RawImageWriter(buffer_size=256 * KIB, buffer_count=2).write(
+            image, target, unplug_after(60), journal(image, target, tmp_path))
+
+    saved = journal(image, target, tmp_path)
+    checkpoints = [position for position, _, _ in saved.checkpoints]
+    assert len(checkpoints) >= 2
+
+    # The data before the newest checkpoint never reached the stick
+    with open(image, 'rb') as f:
+        last_byte = f.read()[checkpoints[-1] - 1]
+    with open(target, 'r+b') as f:
+        f.seek(checkpoints[-1] - 1)
+        f.write(bytes([last_byte ^ 0xFF]))
+    assert saved.verified_offset(target) == checkpoints[-2]
+
+    os.remove(target)
+    assert journal(image, target, tmp_path).verified_offset(target) == 0
+
+
+def test_file_batches(tmp_path):
+    source = tmp_path / 'source.iso'
+    source.write_bytes(b'iso')
+    root = tmp_path / 'usb'
+    root.mkdir()
+    files = {'old.txt': b'a' * 100, 'new.txt': b'b' * 200, 'gone.txt': b'c'}
+
+    copy = journal(str(source), 'E:', tmp_path, mode="copy")
+    for number, (name, data) in enumerate(files.items()):
+        (root / name).write_bytes(data)
+        copy.add_file(name, len(data), data)
+        if number == 0:
+            copy.commit()
+    copy.commit()
+
+    # Files of the newest batch are read back; older ones only checked by size
+    (root / 'old.txt').write_bytes(b'z' * 100)
+    (root / 'new.txt').write_bytes(b'z' * 200)
+    (root / 'gone.txt').unlink()
+    assert journal(str(source), 'E:', tmp_path, mode="copy").verified_files(str(root)) == {'old.txt'}
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="copies to a directory named like a drive root")
+def test_copy_resumes(tmp_path, monkeypatch):
+    builder = ISOBuilder(rock_ridge=True)
+    tree = {f'dir{n % 3}/file{n}.bin': os.urandom(100 * KIB + n) for n in range(12)}
+    for path, data in tree.items():
+        builder.add(path, data)
+    iso_path = builder.build(str(tmp_path / 'tree.iso'))
+
+    # The copy writes below "E:\"; on Linux that is a plain directory in the cwd
+    monkeypatch.chdir(tmp_path)
+    root = tmp_path / 'E:\\'
+
+    def copy(stop_after=None):
+        flasher = ISOFlasher()
+        copied = []
+
+        def progress(value, status, path=None, **details):
+            if path is not None:
+                copied.append(path)
+                if stop_after is not None and len(copied) > stop_after:
+                    raise Unplugged()
+        progress.structured = True
+
+        flasher.progress_callback = progress
+        copy_journal = journal(iso_path, 'E:', tmp_path, mode="copy")
+        copy_journal.checkpoint_interval = 300 * KIB
+        return flasher._copy_iso_files(iso_path, 'E', journal=copy_journal), copied
+
+    finished, copied = copy(stop_after=7)
+    assert not finished and len(copied) == 8
+
+    finished, copied = copy()
+    assert finished
+    # Batches of three files were committed; the two files after the
+    # second commit are copied again with the rest
+    assert len(copied) == len(tree) - 6
+    for path, data in tree.items():
+        assert (root / path).read_bytes() == data
@@ -0,0 +1,161 @@
+"""Builds a small fixed UDF image for the tests
+
+The tree covers what Windows install media and the reader care about:
+short, long and embedded allocation descriptors, file and extended file
+entries, a hidden file, a symbolic link, and a fragmented file with an
+unrecorded (all-zero) extent and an allocation extent continuation.
+"""
+import struct
+
+SECTOR_SIZE = 2048
+IMAGE_SECTORS = 400
+PARTITION_START = 300
+PARTITION_LENGTH = 90
+VOLUME_ID = 'UDFVOL'
+
+README = b'hello udf\n' * 300
+TINY = b'timeout=5\n'
+BOOT = bytes(range(256)) * 16
+INSTALL = b'A' * SECTOR_SIZE + bytes(SECTOR_SIZE) + b'B' * (SECTOR_SIZE + 100) + b'C' * 500
+
+# Expected contents by path, for the tests
+FILES = {
+    'readme.txt': README,
+    'tiny.cfg': TINY,
+    'sources/boot.wim': BOOT,
+    'sources/install.wim': INSTALL,
+}
+SYMLINKS = {'link': '/efi/boot'}
+
+# Descriptor tags and file types
+TAG_ANCHOR, TAG_PARTITION, TAG_LOGICAL_VOLUME, TAG_TERMINATING = 2, 5, 6, 8
+TAG_FILE_SET, TAG_FILE_IDENTIFIER, TAG_ALLOCATION_EXTENT = 256, 257, 258
+TAG_FILE_ENTRY, TAG_EXTENDED_FILE_ENTRY = 261, 266
+DIRECTORY, REGULAR, SYMLINK = 4, 5, 12
+SHORT, LONG, EMBEDDED = 0, 1, 3
+
+
+def tag(identifier, location, body):
+    """A descriptor with its 16-byte tag and tag checksum"""
+    data = bytearray(struct.pack('<HHBxHHHI', identifier, 2, 0, 1, 0, 0, location)) + body
+    data[4] = (sum(data[0:4]) + sum(data[5:16])) & 0xFF
+    return bytes(data)
+
+
+def long_ad(length, block):
+    return struct.pack('<IIH6x', length, block, 0)
+
+
+def short_ad(length, block, extent_type=0):
+    return struct.pack('<II', (extent_type << 30) | length, block)
+
+
+def file_identifier(name, characteristics, block):
+    encoded = b'\x08' + name.encode('latin-1') if name else b''
+    data = struct.pack('<HBB', 1, characteristics, len(encoded)) + long_ad(SECTOR_SIZE, block) + b'\x00\x00' + encoded
+    data += bytes(-(len(data) + 16) % 4)
+    return tag(TAG_FILE_IDENTIFIER, 0, data)
+
+
+def build_udf(path, bridge=False):
+    """Write the image to path; bridge adds an (empty) ISO 9660 tree in front"""
+    image = bytearray(SECTOR_SIZE * IMAGE_SECTORS)
+
+    def put(sector, data):
+        image[sector * SECTOR_SIZE:sector * SECTOR_SIZE + len(data)] = data
+
+    def block(number, data):
+        put(PARTITION_START + number, data)
+
+    def file_entry(number, file_type, size, ad_type, ads, extended=False):
+        start = 216 if extended else 176
+        body = bytearray(SECTOR_SIZE - 16)
+        body[27 - 16] = file_type
+        struct.pack_into('<H', body, 34 - 16, ad_type)
+        struct.pack_into('<Q', body, 56 - 16, size)
+        struct.pack_into('<II', body, start - 8 - 16, 0, len(ads))
+        body[start - 16:start - 16 + len(ads)] = ads
+        block(number, tag(TAG_EXTENDED_FILE_ENTRY if extended else TAG_FILE_ENTRY, number, bytes(body)))
+
+    sector = 16
+    if bridge:
+        root = bytearray(34)
+        root[0] = 34
+        struct.pack_into('<I', root, 2, 22)
+        struct.pack_into('<I', root, 10, SECTOR_SIZE)
+        root[25], root[32] = 2, 1
+        pvd = bytearray(SECTOR_SIZE)
+        pvd[0:7] = b'\x01CD001\x01'
+        pvd[40:72] = b'BRIDGE'.ljust(32)
+        struct.pack_into('<I', pvd, 80, IMAGE_SECTORS)
+        struct.pack_into('<H', pvd, 128, SECTOR_SIZE)
+        pvd[156:190] = root
+        put(16, pvd)
+        put(17, b'\xFFCD001\x01')
+        parent = bytearray(root)
+        parent[33] = 1
+        put(22, bytes(root) + bytes(parent))
+        sector = 18
+
+    for number, identifier in enumerate((b'BEA01', b'NSR02', b'TEA01')):
+        put(sector + number, b'\x00' + identifier + b'\x01')
+
+    # Anchor, then the volume descriptor sequence it points to
+    put(256, tag(TAG_ANCHOR, 256, struct.pack('<II', 4 * SECTOR_SIZE, 257)))
+    partition = bytearray(SECTOR_SIZE - 16)
+    struct.pack_into('<II', partition, 188 - 16, PARTITION_START, PARTITION_LENGTH)
+    put(257, tag(TAG_PARTITION, 257, bytes(partition)))
+
+    volume = bytearray(SECTOR_SIZE - 16)
+    name = b'\x08' + VOLUME_ID.encode('ascii')
+    volume[84 - 16:84 - 16 + len(name)] = name
+    volume[211 - 16] = len(name)
+    struct.pack_into('<I', volume, 212 - 16, SECTOR_SIZE)
+    volume[248 - 16:264 - 16] = long_ad(SECTOR_SIZE, 0)
+    struct.pack_into('<II', volume, 264 - 16, 6, 1)
+    volume[440 - 16:446 - 16] = struct.pack('<BBHH', 1, 6, 1, 0)
+    put(258, tag(TAG_LOGICAL_VOLUME, 258, bytes(volume)))
+    put(259, tag(TAG_TERMINATING, 259, b''))
+
+    # File set descriptor pointing at the root directory's entry in block 1
+    file_set = bytearray(SECTOR_SIZE - 16)
+    file_set[400 - 16:416 - 16] = long_ad(SECTOR_SIZE, 1)
+    block(0, tag(TAG_FILE_SET, 0, bytes(file_set)))
+
+    root = (file_identifier('', 0x0A, 1) + file_identifier('sources', 0x02, 3)
+            + file_identifier('readme.txt', 0, 5) + file_identifier('tiny.cfg', 0x01, 8)
+            + file_identifier('link', 0, 9))
+    file_entry(1, DIRECTORY, len(root), SHORT, short_ad(len(root), 2))
+    block(2, root)
+
+    sources = (file_identifier('', 0x0A, 1) + file_identifier('install.wim', 0, 13)
+               + file_identifier('boot.wim', 0, 10))
+    file_entry(3, DIRECTORY, len(sources), LONG, long_ad(len(sources), 4), extended=True)
+    block(4, sources)
+
+    # Two adjacent short extents, which the reader merges
+    file_entry(5, REGULAR, len(README), SHORT, short_ad(SECTOR_SIZE, 6) + short_ad(len(README) - SECTOR_SIZE, 7))
+    block(6, README)
+
+    file_entry(8, REGULAR, len(TINY), EMBEDDED, TINY)
+
+    link = (struct.pack('<BBH', 2, 0, 0) + struct.pack('<BBH', 5, 4, 0) + b'\x08efi'
+            + struct.pack('<BBH', 5, 5, 0) + b'\x08boot')
+    file_entry(9, SYMLINK, len(link), EMBEDDED, link)
+
+    file_entry(10, REGULAR, len(BOOT), SHORT, short_ad(len(BOOT), 11))
+    block(11, BOOT)
+
+    # Recorded, unrecorded, then the rest behind an allocation extent
+    # descriptor; the last extent is longer than the file
+    ads = short_ad(SECTOR_SIZE, 20) + short_ad(SECTOR_SIZE, 0, 1) + short_ad(SECTOR_SIZE, 14, 3)
+    file_entry(13, REGULAR, len(INSTALL), SHORT, ads, extended=True)
+    continued = short_ad(SECTOR_SIZE + 100, 16) + short_ad(600, 30)
+    block(14, tag(TAG_ALLOCATION_EXTENT, 14, struct.pack('<II', 0, len(continued)) + continued))
+    block(20, INSTALL[:SECTOR_SIZE])
+    block(16, INSTALL[2 * SECTOR_SIZE:3 * SECTOR_SIZE + 100])
+    block(30, INSTALL[3 * SECTOR_SIZE + 100:] + b'X' * 100)
+
+    with open(path, 'wb') as f:
+        f.write(image)
+    return path
@@ -1,17 +1,26 @@
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox
+import collections
 import threading
 import os
-import tempfile
-import shutil
 import sys
-from pathlib import Path
-from PIL import Image
 
-from core.iso_handler import ISOHandler
+# ISO parsing and flashing are imported on first use (see the iso_handler
+# and flasher properties), keeping them off the path to the first window
+from core.progress import ProgressChannel, format_eta
 from core.usb_handler import USBHandler
-from core.flasher import ISOFlasher
+
+# How often the progress display drains the flash thread's events (~15 Hz)
+PROGRESS_TICK_MS = 66
+
+# How often drive lists found by the scan and hotplug threads are picked up
+DRIVE_POLL_MS = 250
+
+# Header icon, shipped pre-resized (for up to 200% display scaling) so
+# startup doesn't decode and resample the 1920px icon.png
+HEADER_ICON = "ui/icon_96.png"
+HEADER_ICON_SIZE = (48, 48)
 
 class MainWindow(ctk.CTk):
     def __init__(self):
@@ -59,19 +68,25 @@ class MainWindow(ctk.CTk):
         self.text_color = self.dark_theme["text_color"]
         
         # Initialize handlers
-        self.iso_handler = ISOHandler()
+        self._iso_handler = None
         self.usb_handler = USBHandler()
-        self.flasher = ISOFlasher()
+        self._flasher = None
         
         # Application state
         self.selected_drive = None
+        self.selected_drives = []  # Every drive to flash; more than one when "All USB drives" is picked
+        self.usb_drives = []
         self.selected_iso = None
         self.boot_method = "Disk or ISO (Please Select)"  # Boot method selection
         self.volume_name = ""
         self.partition_scheme = "MBR"
         self.target_system = "BIOS or UEFI"
         self.file_system = "FAT32"
+        self.write_mode = "copy"  # "copy" (file copy) or "raw" (block-for-block)
         self.original_drive_letter = None  # Store original drive letter
+        self.progress_channel = None  # Progress events from the flash thread
+        self.drive_updates = collections.deque(maxlen=1)  # Newest drive list from a scan thread
+        self.drive_monitor = None
         
         # Layer completion status
         self.layer_completed = {
@@ -83,8 +98,24 @@ class MainWindow(ctk.CTk):
         
         self.setup_menu()
         self.setup_ui()
-        self.refresh_drives()
         self.update_layer_states()
+
+        # Enumerating drives can take a while; show the window first
+        self.after_idle(self.start_drive_monitor)
+
+    @property
+    def iso_handler(self):
+        if self._iso_handler is None:
+            from core.iso_handler import ISOHandler
+            self._iso_handler = ISOHandler()
+        return self._iso_handler
+
+    @property
+    def flasher(self):
+        if self._flasher is None:
+            from core.flasher import ISOFlasher
+            self._flasher = ISOFlasher()
+        return self._flasher
         
     def get_resource_path(self, relative_path):
         """Get absolute path to resource, works for dev and for PyInstaller"""
@@ -119,6 +150,11 @@ class MainWindow(ctk.CTk):
             command=lambda: self.switch_theme("light")
         )
 
+        # Tools menu
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Tools", menu=tools_menu)
+        tools_menu.add_command(label="Verify ISO Checksum...", command=self.verify_iso_checksum)
+
         # GitHub menu
         menubar.add_command(label="GitHub", command=self.open_github)
 
@@ -147,9 +183,63 @@ class MainWindow(ctk.CTk):
         # Recreate UI with new colors
         self.main_frame.destroy()
         self.setup_ui()
-        self.refresh_drives()
+        self.show_drives(self.usb_drives)
         self.update_layer_states()
 
+    def verify_iso_checksum(self):
+        """Check the selected ISO against its SHA256SUMS/.sha256/.md5 file"""
+        if not self.selected_iso:
+            messagebox.showinfo("Verify Checksum", "Select an ISO file first.")
+            return
+
+        from core.checksum import find_checksum_file
+
+        # Ask for the checksum file when there is none next to the ISO
+        checksum_path = find_checksum_file(self.selected_iso)
+        if checksum_path is None:
+            checksum_path = filedialog.askopenfilename(
+                title="Select Checksum File",
+                filetypes=[("Checksum files", "*.sha256 *.sha512 *.sha1 *.md5 *SUMS *.txt"), ("All files", "*.*")]
+            )
+            if not checksum_path:
+                return
+
+        # Hashing a large ISO takes a while; keep Tk responsive meanwhile
+        iso_path = self.selected_iso
+        result = {}
+        worker = threading.Thread(
+            target=lambda: result.update(value=self.iso_handler.verify_checksum(iso_path, checksum_path)),
+            daemon=True
+        )
+        worker.start()
+        self.configure(cursor="watch")
+        self.after(200, self.show_checksum_result, worker, result, iso_path)
+
+    def show_checksum_result(self, worker, result, iso_path):
+        """Wait for the hashing thread, then report the outcome"""
+        if worker.is_alive():
+            self.after(200, self.show_checksum_result, worker, result, iso_path)
+            return
+
+        self.configure(cursor="")
+        name = os.path.basename(iso_path)
+        checksum = result.get('value')
+        if checksum is None:
+            messagebox.showwarning("Verify Checksum", f"No usable checksum for {name} was found.")
+        elif checksum['match']:
+            messagebox.showinfo(
+                "Verify Checksum",
+                f"{name} matches its {checksum['algorithm'].upper()} checksum in "
+                f"{os.path.basename(checksum['checksum_file'])}."
+            )
+        else:
+            messagebox.showerror(
+                "Verify Checksum",
+                f"{name} does NOT match its {checksum['algorithm'].upper()} checksum.\n\n"
+                f"Expected: {checksum['expected']}\nActual:   {checksum['actual']}\n\n"
+                "The file is corrupt or incomplete; download it again before flashing."
+            )
+
     def open_github(self):
         """Open GitHub link"""
         try:
@@ -194,13 +284,8 @@ class MainWindow(ctk.CTk):
         
         # Try to load and display the icon
         try:
-            # Get the correct path for the icon
-            icon_path = self.get_resource_path("ui/icon.png")
-            
-            # Load and resize the icon
-            icon_image = Image.open(icon_path)
-            icon_image = icon_image.resize((48, 48), Image.Resampling.LANCZOS)
-            self.icon_photo = ctk.CTkImage(light_image=icon_image, dark_image=icon_image, size=(48, 48))
+            icon_image = self.load_header_icon()
+            self.icon_photo = ctk.CTkImage(light_image=icon_image, dark_image=icon_image, size=HEADER_ICON_SIZE)
                 
             # Icon label
             icon_label = ctk.CTkLabel(
@@ -222,6 +307,17 @@ class MainWindow(ctk.CTk):
         )
         title_label.pack(side="left")
         
+    def load_header_icon(self):
+        """The header icon, from the pre-resized copy unless it is missing"""
+        from PIL import Image
+
+        icon_path = self.get_resource_path(HEADER_ICON)
+        if os.path.exists(icon_path):
+            return Image.open(icon_path)
+
+        icon_image = Image.open(self.get_resource_path("ui/icon.png"))
+        return icon_image.resize(HEADER_ICON_SIZE, Image.Resampling.LANCZOS)
+
     def setup_drive_selection(self):
         # Drive selection frame
         self.drive_frame = ctk.CTkFrame(self.main_frame, fg_color=self.card_color)
@@ -267,7 +363,7 @@ class MainWindow(ctk.CTk):
             drive_container,
             text="Refresh",
             width=100,
-            command=self.refresh_drives,
+            command=lambda: self.refresh_drives(max_age=0),
             fg_color=self.primary_color,
             hover_color=self.hover_color,
             text_color="black"
@@ -654,26 +750,56 @@ class MainWindow(ctk.CTk):
                 text_color="gray"
             )
         
-    def refresh_drives(self):
-        """Refresh the list of available USB drives"""
-        drives = self.usb_handler.get_usb_drives()
-        if drives:
-            drive_list = [f"{drive['letter']} - {drive['label']} ({drive['size']})" for drive in drives]
-            self.drive_dropdown.configure(values=drive_list)
-            self.drive_var.set("Select a USB drive...")
-        else:
-            self.drive_dropdown.configure(values=["No USB drives found"])
-            self.drive_var.set("No USB drives found")
+    def start_drive_monitor(self):
+        """List the drives, and keep listing them as they are plugged in or removed"""
+        self.drive_var.set("Searching for USB drives...")
+        self.drive_monitor = self.usb_handler.start_monitor(self.drive_updates.append)
+        self.after(DRIVE_POLL_MS, self.poll_drives)
+
+    def refresh_drives(self, max_age=None):
+        """Refresh the list of available USB drives; scans on a worker thread"""
+        self.usb_handler.get_usb_drives_async(self.drive_updates.append, max_age)
+
+    def poll_drives(self):
+        """Show the newest drive list from the scan threads; Tk thread only"""
+        # Drives vanish and return while one is being formatted; wait until the flash is over
+        flashing = self.progress_channel is not None and not self.progress_channel.closed
+        if self.drive_updates and not flashing:
+            self.show_drives(self.drive_updates.popleft())
+        self.after(DRIVE_POLL_MS, self.poll_drives)
+
+    def show_drives(self, drives):
+        """Fill the drive dropdown, keeping the selection if its drives are still there"""
+        self.usb_drives = drives
+        drive_list = [f"{drive['letter']} - {drive['label']} ({drive['size']})" for drive in drives]
+        if len(drives) > 1:
+            drive_list.append(f"All USB drives ({len(drives)})")
+        self.drive_dropdown.configure(values=drive_list or ["No USB drives found"])
+
+        if self.drive_var.get() in drive_list:
+            return
+
+        self.drive_var.set("Select a USB drive..." if drives else "No USB drives found")
+        if self.selected_drives:
+            # The selected drive was removed
+            self.on_drive_selected(None)
             
     def on_drive_selected(self, selection):
         """Handle drive selection"""
-        if selection and "No" not in selection and "Select" not in selection:
+        if selection and selection.startswith("All USB drives"):
+            self.selected_drives = [drive['letter'] for drive in self.usb_drives]
+            self.selected_drive = self.selected_drives[0] if self.selected_drives else None
+            self.original_drive_letter = self.selected_drive
+            self.layer_completed[1] = bool(self.selected_drives)
+        elif selection and "No" not in selection and "Select" not in selection:
             drive_letter = selection.split(" - ")[0]
             self.selected_drive = drive_letter
+            self.selected_drives = [drive_letter]
             self.original_drive_letter = drive_letter  # Store original drive letter
             self.layer_completed[1] = True
         else:
             self.selected_drive = None
+            self.selected_drives = []
             self.original_drive_letter = None
             self.layer_completed[1] = False
             
@@ -728,10 +854,15 @@ class MainWindow(ctk.CTk):
 
         file_path = filedialog.askopenfilename(
             title="Select ISO File",
-            filetypes=[("ISO files", "*.iso"), ("All files", "*.*")]
+            filetypes=[
+                ("ISO files", "*.iso *.iso.xz *.iso.gz *.iso.bz2 *.iso.zst"),
+                ("All files", "*.*")
+            ]
         )
 
         if file_path:
+            from core.compressed_image import is_compressed
+
             # Validate ISO file
             if self.iso_handler.validate_iso(file_path):
                 self.selected_iso = file_path
@@ -749,6 +880,9 @@ class MainWindow(ctk.CTk):
                         "The selected ISO file may not be bootable. "
                         "The flashing process will continue, but the USB drive may not boot properly."
                     )
+
+                # Preselect settings from the ISO's boot catalog
+                self.apply_boot_info(self.iso_handler.get_boot_info(file_path), is_compressed(file_path))
             else:
                 messagebox.showerror("Error", "Invalid ISO file selected.")
                 self.selected_iso = None
@@ -759,6 +893,9 @@ class MainWindow(ctk.CTk):
             self.iso_path_var.set("Disk or ISO (Please Select)")
             self.layer_completed[2] = False
 
+        if not self.layer_completed[2]:
+            self.write_mode = "copy"
+
         # Reset subsequent layers if ISO changes
         if not self.layer_completed[2]:
             self.layer_completed[3] = False
@@ -766,6 +903,33 @@ class MainWindow(ctk.CTk):
 
         self.update_layer_states()
         
+    def apply_boot_info(self, boot_info, compressed=False):
+        """Preselect partition scheme, target system, file system and write mode for the ISO"""
+        # Compressed images are streamed, which only raw mode can do
+        self.write_mode = "raw" if compressed else "copy"
+        if not boot_info:
+            return
+
+        self.partition_var.set(boot_info['partition_scheme'])
+        self.target_var.set(boot_info['target_system'])
+
+        # Only BIOS (Legacy) drives may be NTFS; keep the preselection a valid combination
+        if boot_info['file_system']:
+            self.system_var.set(boot_info['file_system'])
+
+        # Hybrid images boot best when written as-is, but that replaces
+        # the whole drive layout, so let the user decide
+        if boot_info['write_mode'] == "raw" and not compressed:
+            use_raw = messagebox.askyesno(
+                "Hybrid ISO Detected",
+                "The selected ISO is an isohybrid image. Writing it in raw (DD) mode "
+                "copies it block-for-block and is usually faster and more reliable.\n\n"
+                "Volume name, partition scheme and file system are then taken from the image.\n\n"
+                "Write in raw (DD) mode?"
+            )
+            if use_raw:
+                self.write_mode = "raw"
+
     def on_volume_change(self, *args):
         """Handle volume name changes with character limit"""
         current_value = self.volume_var.get()
@@ -813,9 +977,11 @@ class MainWindow(ctk.CTk):
 
         # Confirm action
         iso_info = f"ISO: {os.path.basename(self.selected_iso)}\n" if self.selected_iso else "Mode: Non Bootable (Format Only)\n"
+        if self.selected_iso and self.write_mode == "raw":
+            iso_info += "Write mode: Raw (DD) image\n"
         result = messagebox.askyesno(
             "Confirm Flash",
-            f"This will erase all data on drive {self.selected_drive}.\n"
+            f"This will erase all data on drive {', '.join(self.selected_drives) or self.selected_drive}.\n"
             f"{iso_info}"
             f"Volume: {self.volume_var.get()}\n"
             f"Partition: {self.partition_var.get()}\n"
@@ -839,69 +1005,138 @@ class MainWindow(ctk.CTk):
             
             # Reset percentage
             self.percentage_var.set("0%")
-            
-            # Start flashing in separate thread
-            flash_thread = threading.Thread(target=self.flash_iso)
-            flash_thread.daemon = True
-            flash_thread.start()
-            
-    def flash_iso(self):
-        """Flash ISO to USB drive"""
-        try:
-            # Update status
             self.status_var.set("Preparing to flash...")
             self.progress_bar.set(0.1)
-            
-            # Use original drive letter to maintain consistency
-            drive_letter = self.original_drive_letter if self.original_drive_letter else self.selected_drive
-            
-            # Flash the ISO
-            success = self.flasher.flash_iso(
+
+            # The flash thread only posts to the channel; this thread draws it
+            self.progress_channel = ProgressChannel()
+            self.after(PROGRESS_TICK_MS, self.poll_progress)
+
+            # Tk variables are read here; the flash thread only gets their values
+            settings = dict(
                 iso_path=self.selected_iso,
-                drive_letter=drive_letter,
                 volume_name=self.volume_var.get(),
                 partition_scheme=self.partition_var.get(),
                 target_system=self.target_var.get(),
                 file_system=self.system_var.get(),
-                progress_callback=self.update_progress
+                write_mode=self.write_mode
             )
+            # Use original drive letter to maintain consistency
+            drive_letter = self.original_drive_letter if self.original_drive_letter else self.selected_drive
+
+            # Start flashing in separate thread
+            flash_thread = threading.Thread(target=self.flash_iso, args=(drive_letter, list(self.selected_drives), settings))
+            flash_thread.daemon = True
+            flash_thread.start()
             
-            if success:
-                self.status_var.set("Flash completed successfully!")
-                self.progress_bar.set(1.0)
-                self.percentage_var.set("100%")
-                self.layer_completed[4] = True
-                self.flash_status.configure(
-                    text="✅ Complete",
-                    text_color=self.primary_color
-                )
-                messagebox.showinfo("Success", f"ISO has been successfully flashed to USB drive {drive_letter}!")
-            else:
-                self.status_var.set("Flash failed!")
-                self.percentage_var.set("0%")
-                self.flash_status.configure(
-                    text="❌ Failed",
-                    text_color="red"
-                )
-                messagebox.showerror("Error", "Failed to flash ISO to USB drive.")
-                
+    def flash_iso(self, drive_letter, drive_letters, settings):
+        """Flash ISO to USB drive; runs on the flash thread
+
+        Tk must only be touched from the main thread, so the settings are
+        read by start_flash, and this posts progress to
+        self.progress_channel and hands the outcome over by closing it.
+        """
+        channel = self.progress_channel
+
+        try:
+            if len(drive_letters) > 1:
+                # Every selected drive gets the same image; a failed drive doesn't stop the others
+                results = self.flasher.flash_multi(drive_letters=drive_letters, progress_callback=channel, **settings)
+                channel.close(lambda: self.show_multi_result(results))
+                return
+
+            # Flash the ISO
+            success = self.flasher.flash_iso(drive_letter=drive_letter, progress_callback=channel, **settings)
+            channel.close(lambda: self.show_flash_result(success, drive_letter))
+
         except Exception as e:
-            self.status_var.set(f"Error: {str(e)}")
+            channel.close(lambda error=e: self.show_flash_error(error))
+
+    def poll_progress(self):
+        """Draw the newest progress event and, once the flash thread is done, its result"""
+        channel = self.progress_channel
+        # Read closed first: events posted before close() are then already queued
+        closed = channel.closed
+
+        event = channel.latest()
+        if event is not None:
+            status = event.status
+            if event.eta is not None:
+                status += f" ({format_eta(event.eta)} left)"
+            self.update_progress(event.progress, status)
+
+        if not closed:
+            self.after(PROGRESS_TICK_MS, self.poll_progress)
+            return
+
+        try:
+            if channel.result is not None:
+                channel.result()
+        finally:
+            # Re-enable flash button
+            self.flash_btn.configure(state="normal", text="FLASH")
+
+    def show_flash_result(self, success, drive_letter):
+        """Report how a single-drive flash ended"""
+        if success:
+            self.status_var.set("Flash completed successfully!")
+            self.progress_bar.set(1.0)
+            self.percentage_var.set("100%")
+            self.layer_completed[4] = True
+            self.flash_status.configure(
+                text="✅ Complete",
+                text_color=self.primary_color
+            )
+            messagebox.showinfo("Success", f"ISO has been successfully flashed to USB drive {drive_letter}!")
+        else:
+            self.status_var.set("Flash failed!")
             self.percentage_var.set("0%")
             self.flash_status.configure(
-                text="❌ Error",
+                text="❌ Failed",
                 text_color="red"
             )
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
-            
-        finally:
-            # Re-enable flash button
-            self.flash_btn.configure(state="normal", text="FLASH")
-            
+            messagebox.showerror("Error", "Failed to flash ISO to USB drive.")
+
+    def show_flash_error(self, error):
+        """Report a flash that raised"""
+        self.status_var.set(f"Error: {str(error)}")
+        self.percentage_var.set("0%")
+        self.flash_status.configure(
+            text="❌ Error",
+            text_color="red"
+        )
+        messagebox.showerror("Error", f"An error occurred: {str(error)}")
+
+    def show_multi_result(self, results):
+        """Report how a multi-drive flash ended"""
+        failed = {letter: error for letter, error in results.items() if error}
+        flashed = len(results) - len(failed)
+        self.status_var.set(f"Flashed {flashed} of {len(results)} drives")
+
+        if flashed:
+            self.progress_bar.set(1.0)
+            self.percentage_var.set("100%")
+            self.layer_completed[4] = True
+            self.flash_status.configure(
+                text="✅ Complete" if not failed else "⚠️ Partial",
+                text_color=self.primary_color if not failed else "orange"
+            )
+        else:
+            self.percentage_var.set("0%")
+            self.flash_status.configure(
+                text="❌ Failed",
+                text_color="red"
+            )
+
+        summary = "\n".join(f"{letter}: {error}" for letter, error in failed.items())
+        if failed:
+            messagebox.showwarning("Flash Finished", f"Flashed {flashed} of {len(results)} drives.\n\nFailed:\n{summary}")
+        else:
+            messagebox.showinfo("Success", f"ISO has been successfully flashed to {flashed} USB drives!")
+
     def update_progress(self, progress, status):
-        """Update progress bar, status, and percentage"""
+        """Update progress bar, status, and percentage; Tk thread only"""
         self.progress_bar.set(progress / 100.0)
         self.flash_progress_bar.set(progress / 100.0)
         self.status_var.set(status)
         self.percentage_var.set(f"{int(progress)}%")
-        self.update()